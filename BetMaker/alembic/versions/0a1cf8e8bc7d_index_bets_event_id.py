@@ -0,0 +1,30 @@
+"""Index bets by event_id
+
+Revision ID: 0a1cf8e8bc7d
+Revises: fe4b3a0e3db5
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a1cf8e8bc7d'
+down_revision: Union[str, None] = 'fe4b3a0e3db5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Built concurrently, outside the migration's transaction, so bets can still be placed meanwhile.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            op.f('ix_bets_event_id'), 'bets', ['event_id'], unique=False, postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_bets_event_id'), table_name='bets', postgresql_concurrently=True)
@@ -0,0 +1,66 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+
+class MicroBatcher:
+    """Collects items for up to ``max_wait`` seconds and hands them to one ``process`` call.
+
+    A batch is sent early once it holds ``max_batch_size`` items. ``process``
+    returns one result per item, in order: an exception instance among them
+    fails only the caller of that item, an exception raised fails the whole
+    batch. Items submitted under the same ``key`` while a batch is pending
+    share one result.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_wait: float,
+        max_batch_size: int,
+    ):
+        self.process = process
+        self.max_wait = max_wait
+        self.max_batch_size = max_batch_size
+        self._pending: Dict[Hashable, Tuple[Any, asyncio.Future]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, item: Any, key: Optional[Hashable] = None) -> Any:
+        entry = self._pending.get(key) if key is not None else None
+        if entry is None:
+            loop = asyncio.get_running_loop()
+            entry = (item, loop.create_future())
+            self._pending[object() if key is None else key] = entry
+            if len(self._pending) >= self.max_batch_size:
+                self.flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.max_wait, self.flush)
+        # A cancelled caller must not cancel the batch for the others waiting on it.
+        return await asyncio.shield(entry[1])
+
+    def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = list(self._pending.values()), {}
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        try:
+            results = await self.process([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -1,19 +1,120 @@
 import os
+import zlib
+import asyncio
+from typing import Awaitable, Callable, List
+
 import aio_pika
 
 from app.bets.db import AsyncSessionLocal
-from app.bets.services import process_message
+from app.bets.replica import LINE_FEED_EXCHANGE
+from app.bets.serialization import loads
+from app.bets.services import process_closed_event, process_line_change, process_message, sync_line_replica
 
 
 RABBITMQ_URL = os.getenv("RABBITMQ_URL")
+SETTLEMENT_PREFETCH = int(os.getenv("BET_SETTLEMENT_PREFETCH", "100"))
+SETTLEMENT_WORKERS = int(os.getenv("BET_SETTLEMENT_WORKERS", "8"))
+CLOSED_EVENTS_QUEUE = os.getenv("BET_CLOSED_EVENTS_QUEUE", "events.closed")
+
+
+class ShardedWorkers:
+    """Handles messages on ``workers`` tasks, each with its own queue.
+
+    Messages with the same ``key`` always go to the same worker, so they are
+    handled one at a time in the order they were submitted, while messages
+    with other keys are handled in parallel. The queues are not bounded here:
+    the broker's prefetch limits the messages in flight.
+    """
+
+    def __init__(
+        self,
+        handle: Callable[[aio_pika.IncomingMessage], Awaitable[None]],
+        key: Callable[[aio_pika.IncomingMessage], str],
+        workers: int = SETTLEMENT_WORKERS,
+    ):
+        self.handle = handle
+        self.key = key
+        self.queues: List[asyncio.Queue] = [asyncio.Queue() for _ in range(max(workers, 1))]
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._work(queue)) for queue in self.queues]
+
+    async def stop(self) -> None:
+        # Unacknowledged messages are redelivered by the broker.
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def join(self) -> None:
+        for queue in self.queues:
+            await queue.join()
+
+    def submit(self, message: aio_pika.IncomingMessage) -> None:
+        shard = zlib.crc32(self.key(message).encode()) % len(self.queues)
+        self.queues[shard].put_nowait(message)
+
+    async def _work(self, queue: asyncio.Queue) -> None:
+        while True:
+            message = await queue.get()
+            try:
+                await self.handle(message)
+            except Exception as e:
+                print(f"Failed to process message: {e}")
+            finally:
+                queue.task_done()
+
+
+def message_event_id(message: aio_pika.IncomingMessage) -> str:
+    try:
+        return str(loads(message.body)["event_id"])
+    except Exception:
+        # Malformed messages are rejected by process_message, on any worker.
+        return ""
+
+
+async def settle_message(message: aio_pika.IncomingMessage) -> None:
+    async with AsyncSessionLocal() as db:
+        await process_message(message, db)
 
 
 async def consume_events():
     connection = await aio_pika.connect_robust(RABBITMQ_URL)
     async with connection:
         channel = await connection.channel()
+        await channel.set_qos(prefetch_count=SETTLEMENT_PREFETCH)
         queue = await channel.declare_queue("events", durable=True)
 
-        async with AsyncSessionLocal() as db:
+        workers = ShardedWorkers(settle_message, message_event_id)
+        workers.start()
+        try:
             async for message in queue.iterator():
-                await process_message(message, db)
+                workers.submit(message)
+        finally:
+            await workers.stop()
+
+
+async def consume_closed_events():
+    connection = await aio_pika.connect_robust(RABBITMQ_URL)
+    async with connection:
+        channel = await connection.channel()
+        # One process gets each closure; the others refuse bets on the event by its deadline already.
+        queue = await channel.declare_queue(CLOSED_EVENTS_QUEUE, durable=True)
+        async for message in queue.iterator():
+            await process_closed_event(message)
+
+
+async def consume_line_changes():
+    connection = await aio_pika.connect_robust(RABBITMQ_URL)
+    async with connection:
+        channel = await connection.channel()
+        # Every process keeps its own replica, so each binds a queue of its own to the feed;
+        # changes made while it is gone are resynced.
+        exchange = await channel.declare_exchange(LINE_FEED_EXCHANGE, aio_pika.ExchangeType.FANOUT, durable=True)
+        queue = await channel.declare_queue(exclusive=True)
+        await queue.bind(exchange)
+        # Synced after the queue exists, so no change made since is missed.
+        await sync_line_replica()
+        async for message in queue.iterator():
+            await process_line_change(message)
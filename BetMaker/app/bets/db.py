@@ -1,12 +1,51 @@
 import os
+import time
 from typing import AsyncGenerator
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import registry
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.bets.metrics import Gauge, Histogram
 
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+POOL_CHECKOUT_DURATION = Histogram(
+    "bet_db_pool_checkout_seconds", "Time to get a connection from the pool, including waiting for a free one",
+)
+POOL_HOLD_DURATION = Histogram("bet_db_pool_hold_seconds", "Time a connection stays checked out of the pool")
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_DURATION.observe(time.perf_counter() - started)
+
+
+engine = create_async_engine(DATABASE_URL, echo=False, poolclass=InstrumentedPool)
+
+
+@event.listens_for(engine.sync_engine.pool, "checkout")
+def on_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+    connection_record.info["checked_out_at"] = time.perf_counter()
+
+
+@event.listens_for(engine.sync_engine.pool, "checkin")
+def on_checkin(dbapi_connection, connection_record) -> None:
+    checked_out_at = connection_record.info.pop("checked_out_at", None)
+    if checked_out_at is not None:
+        POOL_HOLD_DURATION.observe(time.perf_counter() - checked_out_at)
+
+
+Gauge("bet_db_pool_checked_out", "Connections currently checked out", lambda: engine.sync_engine.pool.checkedout())
+Gauge(
+    "bet_db_pool_overflow", "Connections open beyond the pool size", lambda: max(engine.sync_engine.pool.overflow(), 0),
+)
+
 mapper_registry = registry()
 Base = mapper_registry.generate_base()
 
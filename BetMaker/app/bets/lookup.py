@@ -0,0 +1,80 @@
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.bets.batching import MicroBatcher
+
+
+LOOKUP_WINDOW = float(os.getenv("LINE_PROVIDER_LOOKUP_WINDOW", "0.002"))
+LOOKUP_BATCH_SIZE = int(os.getenv("LINE_PROVIDER_LOOKUP_BATCH_SIZE", "200"))
+EVENT_CACHE_TTL = float(os.getenv("EVENT_CACHE_TTL", "1"))
+EVENT_CACHE_SIZE = int(os.getenv("EVENT_CACHE_SIZE", "10000"))
+
+
+class LookupBatcher(MicroBatcher):
+    """Coalesces lookups made within ``window`` seconds into one ``fetch`` call.
+
+    ``fetch`` takes a list of keys and returns a dict of the values it found.
+    Concurrent lookups of the same key share one result. Lookups of keys
+    ``fetch`` did not return resolve to None; a failed ``fetch`` fails every
+    lookup of the batch.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[List[str]], Awaitable[Dict[str, dict]]],
+        window: float = LOOKUP_WINDOW,
+        max_batch_size: int = LOOKUP_BATCH_SIZE,
+    ):
+        super().__init__(self._fetch_batch, window, max_batch_size)
+        self.fetch = fetch
+
+    async def get(self, key: str) -> Optional[dict]:
+        return await self.submit(key, key)
+
+    async def _fetch_batch(self, keys: List[str]) -> List[Optional[dict]]:
+        values = await self.fetch(keys)
+        return [values.get(key) for key in keys]
+
+
+class TTLCache:
+    """Keeps values for ``ttl`` seconds, at most ``max_size`` of them, dropping the oldest first.
+
+    A caller filling the cache passes to ``put`` the ``version`` it read before
+    fetching the value. Any ``invalidate`` bumps the version, so a value fetched
+    before an invalidation is not stored after it.
+    """
+
+    def __init__(self, ttl: float = EVENT_CACHE_TTL, max_size: int = EVENT_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.version = 0
+        self._entries: Dict[str, Tuple[float, dict]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        return entry[1]
+
+    def put(self, key: str, value: dict, version: int) -> None:
+        if self.ttl <= 0 or version != self.version:
+            return
+        self._entries.pop(key, None)
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        if len(self._entries) > self.max_size:
+            del self._entries[next(iter(self._entries))]
+
+    def invalidate(self, key: str) -> None:
+        self.version += 1
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self.version += 1
+        self._entries.clear()
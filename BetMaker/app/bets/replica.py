@@ -0,0 +1,115 @@
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+
+LINE_FEED_EXCHANGE = os.getenv("LINE_FEED_EXCHANGE", "lines")
+LINE_REPLICA_MAX_STALENESS = float(os.getenv("LINE_REPLICA_MAX_STALENESS", "15"))
+
+
+class LineReplica:
+    """In-memory copy of LineProvider's line, kept current by its change feed.
+
+    ``fetch_changes(since)`` returns LineProvider's change log after version
+    ``since``: its ``version``, whether it is a ``snapshot`` of the whole line,
+    and the changed ``events``. Feed messages chain to the version published
+    before them, so a missed message shows up as a gap and ``handle`` asks for
+    a resync.
+
+    ``get`` answers only while the replica is fresh: synced, without a known
+    gap, and heard from LineProvider within ``max_staleness`` seconds. Otherwise
+    it returns None and callers ask LineProvider instead.
+    """
+
+    def __init__(
+        self,
+        fetch_changes: Callable[[int], Awaitable[dict]],
+        max_staleness: float = LINE_REPLICA_MAX_STALENESS,
+    ):
+        self.fetch_changes = fetch_changes
+        self.max_staleness = max_staleness
+        self.events: Dict[str, dict] = {}
+        # Every change up to this version has been applied.
+        self.version = 0
+        self.feed_id: Optional[str] = None
+        self.synced = False
+        self.gap = False
+        self.last_heard: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    @property
+    def is_fresh(self) -> bool:
+        return (
+            self.synced
+            and not self.gap
+            and self.last_heard is not None
+            and time.monotonic() - self.last_heard <= self.max_staleness
+        )
+
+    def get(self, event_id: str) -> Optional[dict]:
+        if not self.is_fresh:
+            return None
+        return self.events.get(event_id)
+
+    def apply(self, event: dict) -> None:
+        current = self.events.get(event["event_id"])
+        if current is None or current["version"] < event["version"]:
+            self.events[event["event_id"]] = event
+
+    def close(self, event_id: str) -> None:
+        """Mark an event closed ahead of the feed message carrying its closure, which replaces it."""
+        event = self.events.get(event_id)
+        if event is not None and event["state"] == 1:
+            self.events[event_id] = {**event, "state": 4}
+
+    def handle(self, message: dict) -> bool:
+        """Apply a feed message; return True when the replica must resync."""
+        self.last_heard = time.monotonic()
+        if self.feed_id != message["feed"]:
+            # LineProvider restarted and its versions may have started over.
+            restarted = self.feed_id is not None
+            self.feed_id = message["feed"]
+            if restarted:
+                self.reset()
+                return True
+
+        event = message.get("event")
+        if event is not None:
+            self.apply(event)
+        if message["previous"] > self.version:
+            self.gap = True
+        elif not self.gap:
+            self.version = max(self.version, event["version"] if event is not None else message["previous"])
+        if event is None:
+            self.prune(time.time())
+        return self.gap or not self.synced
+
+    async def sync(self) -> None:
+        changes = await self.fetch_changes(self.version)
+        if changes["snapshot"]:
+            current = {event["event_id"] for event in changes["events"]}
+            # Events missing from the snapshot left LineProvider's memory, unless they changed since.
+            for event_id in [
+                event_id for event_id, event in self.events.items()
+                if event_id not in current and event["version"] <= changes["version"]
+            ]:
+                del self.events[event_id]
+        for event in changes["events"]:
+            self.apply(event)
+        self.version = max(self.version, changes["version"])
+        self.synced = True
+        self.gap = False
+        self.last_heard = time.monotonic()
+
+    def prune(self, now: float) -> None:
+        """Drop events past their deadline: bets on them are refused either way, and a later change re-sends them."""
+        for event_id in [event_id for event_id, event in self.events.items() if event["deadline"] <= now]:
+            del self.events[event_id]
+
+    def reset(self) -> None:
+        self.events.clear()
+        self.version = 0
+        self.synced = False
+        self.gap = False
@@ -1,12 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends
+from typing import AsyncIterator
+
+from fastapi import APIRouter, HTTPException, Depends, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.bets.db import get_async_session
 from app.bets.schemas import BetCreate, BetResponse
+from app.bets.serialization import bets_adapter, dumps
 from app.bets.services import (
     create_bet_service,
     get_bets_history_service,
-    get_all_events_from_provider,
+    iter_event_pages,
 )
 
 router = APIRouter()
@@ -25,16 +29,36 @@ async def create_bet(bet: BetCreate, db: AsyncSession = Depends(get_async_sessio
 @router.get("/bets", response_model=list[BetResponse])
 async def get_bets_history(db: AsyncSession = Depends(get_async_session)):
     try:
-        return await get_bets_history_service(db)
+        bets = bets_adapter.validate_python(await get_bets_history_service(db))
+        return Response(content=bets_adapter.dump_json(bets), media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
 
 @router.get("/events")
 async def get_events():
+    pages = iter_event_pages()
     try:
-        return await get_all_events_from_provider()
+        # Fetch the first page up front so provider errors still become an error response.
+        first_page = await anext(pages, [])
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+    return StreamingResponse(json_array(first_page, pages), media_type="application/json")
+
+
+async def json_array(first_page: list, pages: AsyncIterator[list]) -> AsyncIterator[bytes]:
+    separator = b"["
+    try:
+        page = first_page
+        while True:
+            for event in page:
+                yield separator + dumps(event)
+                separator = b","
+            page = await anext(pages, None)
+            if page is None:
+                break
+    finally:
+        await pages.aclose()
+    yield b"[]" if separator == b"[" else b"]"
@@ -0,0 +1,43 @@
+import os
+import json
+from typing import Any, Type
+
+import httpx
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+from app.bets.schemas import BetResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Opt-in: orjson for AMQP bodies, LineProvider responses and as the default response class.
+FAST_JSON = os.getenv("FAST_JSON", "0") == "1" and orjson is not None
+
+# Validates ORM rows and encodes them to JSON bytes in pydantic-core, skipping jsonable_encoder.
+bets_adapter = TypeAdapter(list[BetResponse])
+
+
+def dumps(value: Any) -> bytes:
+    if FAST_JSON:
+        return orjson.dumps(value)
+    return json.dumps(value).encode()
+
+
+def loads(data: bytes) -> Any:
+    if FAST_JSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def parse_response(response: httpx.Response) -> Any:
+    if FAST_JSON:
+        return orjson.loads(response.content)
+    return response.json()
+
+
+def response_class() -> Type[JSONResponse]:
+    return ORJSONResponse if FAST_JSON else JSONResponse
@@ -1,26 +1,131 @@
+import os
 import httpx
 import time
-import json
+from typing import AsyncIterator, Optional
 
 from fastapi import HTTPException
+from sqlalchemy import insert, update
+from sqlalchemy.exc import DataError, IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
+from app.bets.db import AsyncSessionLocal
+from app.bets.lookup import LookupBatcher, TTLCache
+from app.bets.metrics import Counter, Gauge, Histogram
 from app.bets.models import Bet
+from app.bets.replica import LineReplica
 from app.bets.schemas import BetCreate
+from app.bets.serialization import dumps, loads, parse_response
+from app.bets.writer import BET_INSERT_BATCH_SIZE, InsertBatcher
 
 
 LINE_PROVIDER_URL = "http://line_provider:8001/events/"
+LINE_PROVIDER_PAGE_SIZE = int(os.getenv("LINE_PROVIDER_PAGE_SIZE", "500"))
+LINE_PROVIDER_MAX_CONNECTIONS = int(os.getenv("LINE_PROVIDER_MAX_CONNECTIONS", "100"))
+LINE_PROVIDER_MAX_KEEPALIVE = int(os.getenv("LINE_PROVIDER_MAX_KEEPALIVE", "20"))
+LINE_PROVIDER_TIMEOUT = float(os.getenv("LINE_PROVIDER_TIMEOUT", "5"))
+SETTLE_CHUNK_SIZE = int(os.getenv("BET_SETTLE_CHUNK_SIZE", "10000"))
+
+PROVIDER_REQUEST_DURATION = Histogram(
+    "bet_provider_request_duration_seconds", "Time spent on requests to LineProvider", ("request",),
+)
+MESSAGES = Counter("bet_messages_total", "Event status messages consumed", ("outcome",))
+MESSAGE_DURATION = Histogram("bet_message_duration_seconds", "Time to settle the bets of one event status message")
+CONSUMER_LAG = Histogram(
+    "bet_consumer_lag_seconds", "Time from publishing an event status message to settling its bets",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+SETTLED_BETS = Counter("bet_settled_total", "Bets settled", ("status",))
+EVENT_CACHE_LOOKUPS = Counter(
+    "bet_event_cache_lookups_total", "Event lookups by where they were answered: replica, hit or miss", ("result",),
+)
+LINE_REPLICA_SYNCS = Counter("bet_line_replica_syncs_total", "Resyncs of the line replica", ("outcome",))
+INSERT_BATCH_SIZES = Histogram(
+    "bet_insert_batch_size", "Bets written per group commit",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+LOOKUP_BATCH_SIZES = Histogram(
+    "bet_provider_lookup_batch_size", "Events fetched per coalesced lookup request",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+
+
+provider_client: Optional[httpx.AsyncClient] = None
+
+
+def get_provider_client() -> httpx.AsyncClient:
+    """Return the client shared by all requests to LineProvider, so connections are kept alive and reused."""
+    global provider_client
+    if provider_client is None or provider_client.is_closed:
+        provider_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LINE_PROVIDER_MAX_CONNECTIONS,
+                max_keepalive_connections=LINE_PROVIDER_MAX_KEEPALIVE,
+            ),
+            timeout=LINE_PROVIDER_TIMEOUT,
+        )
+    return provider_client
+
+
+async def close_provider_client() -> None:
+    global provider_client
+    if provider_client is not None:
+        await provider_client.aclose()
+        provider_client = None
+
+
+async def get_events_from_provider(event_ids: list[str]) -> dict:
+    """Fetch several events in one request, keyed by event_id; unknown events are left out."""
+    LOOKUP_BATCH_SIZES.observe(len(event_ids))
+    try:
+        with PROVIDER_REQUEST_DURATION.time(("lookup",)):
+            response = await get_provider_client().post(
+                f"{LINE_PROVIDER_URL}lookup",
+                content=dumps(event_ids),
+                headers={"Content-Type": "application/json"},
+            )
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=500, detail=f"Connection error: {str(e)}")
+    return {event["event_id"]: event for event in parse_response(response)}
+
+
+async def get_event_changes_from_provider(since: int) -> dict:
+    try:
+        with PROVIDER_REQUEST_DURATION.time(("changes",)):
+            response = await get_provider_client().get(LINE_PROVIDER_URL, params={"since": since})
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=500, detail=f"Connection error: {str(e)}")
+    return parse_response(response)
+
+
+event_lookups = LookupBatcher(get_events_from_provider)
+# Invalidated by the settlement messages of the event, see process_message.
+event_cache = TTLCache()
+line_replica = LineReplica(get_event_changes_from_provider)
+
+Gauge("bet_line_replica_events", "Events held in the line replica", lambda: len(line_replica))
+Gauge("bet_line_replica_fresh", "1 while bets are checked against the line replica", lambda: int(line_replica.is_fresh))
 
 
 async def get_event_from_provider(event_id: str) -> dict:
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(f"{LINE_PROVIDER_URL}{event_id}")
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(status_code=404, detail="Event not found") from e
+    event = line_replica.get(event_id)
+    if event is not None:
+        EVENT_CACHE_LOOKUPS.inc(labels=("replica",))
+        return event
+    event = event_cache.get(event_id)
+    if event is not None:
+        EVENT_CACHE_LOOKUPS.inc(labels=("hit",))
+        return event
+    EVENT_CACHE_LOOKUPS.inc(labels=("miss",))
+
+    cache_version = event_cache.version
+    event = await event_lookups.get(event_id)
+    if event is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    event_cache.put(event_id, event, cache_version)
+    return event
 
 
 async def validate_event(event: dict) -> None:
@@ -38,9 +143,26 @@ async def create_new_bet(bet_data: BetCreate, db: AsyncSession) -> Bet:
     return new_bet
 
 
+async def insert_bets(rows: list[dict]) -> list[Bet]:
+    """Insert the bets with one INSERT ... RETURNING and one commit, returning them in the order given."""
+    INSERT_BATCH_SIZES.observe(len(rows))
+    async with AsyncSessionLocal() as session:
+        result = await session.scalars(insert(Bet).returning(Bet, sort_by_parameter_order=True), rows)
+        bets = list(result.all())
+        await session.commit()
+    return bets
+
+
+bet_inserts = InsertBatcher(insert_bets, row_errors=(DataError, IntegrityError))
+
+
 async def create_bet_service(bet_data: BetCreate, db: AsyncSession) -> Bet:
     event = await get_event_from_provider(bet_data.event_id)
     await validate_event(event)
+    if BET_INSERT_BATCH_SIZE > 1:
+        return await bet_inserts.add(
+            {"event_id": bet_data.event_id, "amount": bet_data.amount, "status": "not_played"}
+        )
     return await create_new_bet(bet_data, db)
 
 
@@ -49,44 +171,109 @@ async def get_bets_history_service(db: AsyncSession) -> list[Bet]:
     return list(result.scalars().all())
 
 
-async def get_bet(event_id, db: AsyncSession) -> list[Bet]:
-    result = await db.execute(select(Bet).where(Bet.event_id == event_id))
-    bets = result.scalars().all()
-
-    if not bets:
-        raise ValueError(f"Bet with event_id {event_id} not found")
-    return list(bets)
-
-
-async def get_all_events_from_provider() -> list:
-    async with httpx.AsyncClient() as client:
+async def iter_event_pages(page_size: int = LINE_PROVIDER_PAGE_SIZE) -> AsyncIterator[list]:
+    """Yield the active events page by page, following the provider's X-Next-Cursor header."""
+    params = {"limit": page_size}
+    client = get_provider_client()
+    while True:
         try:
-            response = await client.get(LINE_PROVIDER_URL)
+            with PROVIDER_REQUEST_DURATION.time(("events_page",)):
+                response = await client.get(LINE_PROVIDER_URL, params=params)
             response.raise_for_status()
-            return response.json()
         except httpx.RequestError as e:
             raise HTTPException(status_code=500, detail=f"Connection error: {str(e)}")
+        page = parse_response(response)
+        yield page
 
+        if len(page) < page_size or "X-Next-Cursor" not in response.headers:
+            return
+        params["cursor"] = response.headers["X-Next-Cursor"]
+
+
+async def get_all_events_from_provider() -> list:
+    events = []
+    async for page in iter_event_pages():
+        events.extend(page)
+    return events
 
-async def update_status(bet: Bet, status: int) -> None:
+
+def settled_status(status: int) -> str:
     if status == 2:
-        bet.status = "won"
+        return "won"
     elif status == 3:
-        bet.status = "lost"
-    else:
-        raise ValueError(f"Unknown status: {status}")
+        return "lost"
+    raise ValueError(f"Unknown status: {status}")
+
+
+async def settle_bets(event_id: str, status: int, db: AsyncSession, chunk_size: int = SETTLE_CHUNK_SIZE) -> int:
+    """Settle the unsettled bets of an event in the database, ``chunk_size`` rows per transaction.
+
+    No bet is loaded into memory. Settled bets are skipped, so a settlement
+    interrupted between chunks is finished by handling the message again.
+    """
+    bet_status = settled_status(status)
+    unsettled = select(Bet.id).where(Bet.event_id == event_id, Bet.status == "not_played")
+    if chunk_size > 0:
+        unsettled = unsettled.limit(chunk_size)
+    statement = (
+        update(Bet)
+        .where(Bet.id.in_(unsettled.scalar_subquery()))
+        .values(status=bet_status)
+        .execution_options(synchronize_session=False)
+    )
+
+    settled = 0
+    while True:
+        result = await db.execute(statement)
+        await db.commit()
+        settled += result.rowcount
+        if chunk_size <= 0 or result.rowcount < chunk_size:
+            break
+
+    if not settled:
+        raise ValueError(f"Bet with event_id {event_id} not found")
+    SETTLED_BETS.inc(settled, (bet_status,))
+    return settled
 
 
 async def process_message(message, db: AsyncSession) -> None:
+    started = time.perf_counter()
     async with message.process():
-        event_data = json.loads(message.body)
+        event_data = loads(message.body)
         event_id = event_data["event_id"]
         status = event_data["status"]
+        event_cache.invalidate(event_id)
 
         try:
-            bets = await get_bet(event_id, db)
-            for bet in bets:
-                await update_status(bet, status)
-            await db.commit()
+            await settle_bets(event_id, status, db)
+            MESSAGES.inc(labels=("settled",))
         except ValueError as e:
+            MESSAGES.inc(labels=("skipped",))
             print(f"{e}")
+
+    MESSAGE_DURATION.observe(time.perf_counter() - started)
+    published_at = (message.headers or {}).get("x-published-at")
+    if isinstance(published_at, (int, float)):
+        CONSUMER_LAG.observe(time.time() - published_at)
+
+
+async def process_closed_event(message) -> None:
+    async with message.process():
+        event_id = loads(message.body)["event_id"]
+        event_cache.invalidate(event_id)
+        line_replica.close(event_id)
+
+
+async def sync_line_replica() -> None:
+    try:
+        await line_replica.sync()
+        LINE_REPLICA_SYNCS.inc(labels=("ok",))
+    except HTTPException as e:
+        LINE_REPLICA_SYNCS.inc(labels=("failed",))
+        print(f"Line replica sync failed: {e.detail}")
+
+
+async def process_line_change(message) -> None:
+    async with message.process():
+        if line_replica.handle(loads(message.body)):
+            await sync_line_replica()
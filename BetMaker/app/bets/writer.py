@@ -0,0 +1,47 @@
+import os
+from typing import Any, Awaitable, Callable, List, Tuple, Type
+
+from app.bets.batching import MicroBatcher
+
+
+BET_INSERT_MAX_WAIT = float(os.getenv("BET_INSERT_MAX_WAIT", "0.002"))
+BET_INSERT_BATCH_SIZE = int(os.getenv("BET_INSERT_BATCH_SIZE", "500"))
+
+
+class InsertBatcher(MicroBatcher):
+    """Group commit: rows added within ``max_wait`` seconds are written by one ``write`` call.
+
+    ``write`` takes a list of rows and returns what was stored for each, in the
+    same order; it is meant to run one multi-row INSERT ... RETURNING in one
+    transaction. When a batch fails with one of ``row_errors``, its rows are
+    written again one by one, so a bad row only fails its own caller; any
+    other error fails the whole batch.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[List[dict]], Awaitable[List[Any]]],
+        max_wait: float = BET_INSERT_MAX_WAIT,
+        max_batch_size: int = BET_INSERT_BATCH_SIZE,
+        row_errors: Tuple[Type[Exception], ...] = (),
+    ):
+        super().__init__(self._write_batch, max_wait, max_batch_size)
+        self.write = write
+        self.row_errors = row_errors
+
+    async def add(self, row: dict) -> Any:
+        return await self.submit(row)
+
+    async def _write_batch(self, rows: List[dict]) -> List[Any]:
+        try:
+            return await self.write(rows)
+        except self.row_errors:
+            if len(rows) == 1:
+                raise
+        results = []
+        for row in rows:
+            try:
+                results.extend(await self.write([row]))
+            except Exception as e:
+                results.append(e)
+        return results
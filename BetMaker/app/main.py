@@ -1,16 +1,32 @@
 import asyncio
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from contextlib import asynccontextmanager
 
-from app.bets import router
-from app.bets.consumer import consume_events
+from app.bets import metrics, router
+from app.bets.consumer import consume_closed_events, consume_events, consume_line_changes
+from app.bets.replica import LINE_REPLICA_MAX_STALENESS
+from app.bets.services import close_provider_client, get_provider_client
+from app.bets.serialization import response_class
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    get_provider_client()
     asyncio.create_task(consume_events())
+    asyncio.create_task(consume_closed_events())
+    if LINE_REPLICA_MAX_STALENESS > 0:
+        asyncio.create_task(consume_line_changes())
     yield
+    await close_provider_client()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=response_class())
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 
-app = FastAPI(lifespan=lifespan)
 app.include_router(router.router, tags=["Bets"])
@@ -0,0 +1,51 @@
+"""Measure settlement messages/s of the sharded consumer against one-at-a-time handling.
+
+Settling is simulated by awaiting a fixed latency, standing in for the database
+round trips; messages are spread over a number of events. Run from the BetMaker
+directory:
+
+    python -m benchmarks.bench_consumer [messages] [latency_ms]
+"""
+import asyncio
+import json
+import sys
+import time
+from types import SimpleNamespace
+
+from app.bets.consumer import ShardedWorkers, message_event_id
+
+
+DEFAULT_MESSAGES = 2000
+DEFAULT_LATENCY_MS = 5.0
+EVENTS = 500
+WORKERS = (1, 4, 8, 16, 32)
+
+
+async def run(messages: list, workers: int, latency: float) -> float:
+    async def handle(message):
+        await asyncio.sleep(latency)
+
+    pool = ShardedWorkers(handle, message_event_id, workers=workers)
+    pool.start()
+    started = time.perf_counter()
+    for message in messages:
+        pool.submit(message)
+    await pool.join()
+    elapsed = time.perf_counter() - started
+    await pool.stop()
+    return len(messages) / elapsed
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_MESSAGES
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_LATENCY_MS) / 1000
+    messages = [
+        SimpleNamespace(body=json.dumps({"event_id": f"event-{i % EVENTS}", "status": 2}).encode())
+        for i in range(count)
+    ]
+    for workers in WORKERS:
+        print(f"{workers:>3} workers: {await run(messages, workers, latency):>8.0f} messages/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+"""Compare bets/s of one transaction per bet with group commit, at several concurrency levels.
+
+Needs a PostgreSQL database in DATABASE_URL; the bets table is created if missing
+and the rows written are deleted afterwards. Run from the BetMaker directory:
+
+    python -m benchmarks.bench_inserts [bets]
+"""
+import asyncio
+import sys
+import time
+from decimal import Decimal
+
+from sqlalchemy import delete
+
+from app.bets.db import AsyncSessionLocal, Base, engine
+from app.bets.models import Bet
+from app.bets.schemas import BetCreate
+from app.bets.services import create_new_bet, insert_bets
+from app.bets.writer import InsertBatcher
+
+
+DEFAULT_BETS = 5000
+CONCURRENCY = (1, 10, 50, 200)
+EVENT_ID = "bench-inserts"
+
+
+async def per_bet(bet_data: BetCreate) -> Bet:
+    async with AsyncSessionLocal() as session:
+        return await create_new_bet(bet_data, session)
+
+
+async def run(create, bets: int, concurrency: int) -> float:
+    queue = iter(range(bets))
+
+    async def client():
+        for _ in queue:
+            await create(BetCreate(event_id=EVENT_ID, amount=Decimal("10.00")))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return bets / (time.perf_counter() - started)
+
+
+async def main():
+    bets = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BETS
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+    batcher = InsertBatcher(insert_bets)
+
+    async def grouped(bet_data: BetCreate) -> Bet:
+        return await batcher.add({"event_id": bet_data.event_id, "amount": bet_data.amount, "status": "not_played"})
+
+    print(f"{'clients':>8} {'per bet':>12} {'group commit':>14}")
+    for concurrency in CONCURRENCY:
+        single = await run(per_bet, bets, concurrency)
+        batched = await run(grouped, bets, concurrency)
+        print(f"{concurrency:>8} {single:>10.0f}/s {batched:>12.0f}/s")
+
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(Bet).where(Bet.event_id == EVENT_ID))
+        await session.commit()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
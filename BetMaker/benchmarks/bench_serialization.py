@@ -0,0 +1,66 @@
+"""Compare the response pipelines for GET /bets with 10k bets.
+
+Run from the BetMaker directory:
+
+    python -m benchmarks.bench_serialization
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+from fastapi import FastAPI, Response
+from fastapi.responses import ORJSONResponse
+
+from app.bets.schemas import BetResponse
+from app.bets.serialization import bets_adapter
+
+
+BETS = 10 ** 4
+REQUESTS = 50
+
+
+def build_apps(bets: list) -> dict:
+    default = FastAPI()
+
+    @default.get("/bets", response_model=list[BetResponse])
+    async def default_bets():
+        return bets
+
+    fast = FastAPI(default_response_class=ORJSONResponse)
+
+    @fast.get("/bets", response_model=list[BetResponse])
+    async def orjson_bets():
+        return bets
+
+    adapter = FastAPI()
+
+    @adapter.get("/bets", response_model=list[BetResponse])
+    async def adapter_bets():
+        return Response(content=bets_adapter.dump_json(bets_adapter.validate_python(bets)), media_type="application/json")
+
+    return {"response_model + json": default, "response_model + orjson": fast, "TypeAdapter": adapter}
+
+
+async def requests_per_second(app: FastAPI) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/bets")
+        started = time.perf_counter()
+        for _ in range(REQUESTS):
+            response = await client.get("/bets")
+            assert len(response.content) > BETS
+        return REQUESTS / (time.perf_counter() - started)
+
+
+async def main():
+    bets = [
+        SimpleNamespace(id=i, event_id=f"event{i % 100}", amount=10 + i % 90, status="not_played")
+        for i in range(BETS)
+    ]
+    for name, app in build_apps(bets).items():
+        print(f"{name:>26}: {await requests_per_second(app):8.1f} req/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
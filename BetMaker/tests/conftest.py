@@ -4,6 +4,7 @@ from fastapi.testclient import TestClient
 from app.main import app
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from app.bets.db import Base, AsyncSessionLocal
+from app.bets.services import event_cache
 
 
 TEST_DATABASE_URL = "postgresql+asyncpg://postgres:postgres@db:5432/bet_maker_test"
@@ -20,6 +21,11 @@ async def setup_database():
         await conn.run_sync(Base.metadata.drop_all)
 
 
+@pytest.fixture(autouse=True)
+def clear_event_cache():
+    event_cache.clear()
+
+
 @pytest.fixture
 def test_client():
     return TestClient(app)
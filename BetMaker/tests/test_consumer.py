@@ -0,0 +1,97 @@
+import json
+import asyncio
+
+import aio_pika
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.bets.consumer import ShardedWorkers, consume_closed_events, consume_line_changes, message_event_id
+from app.bets.services import event_cache, line_replica
+
+
+def make_message(event_id: str, status: int) -> MagicMock:
+    message = MagicMock()
+    message.body = json.dumps({"event_id": event_id, "status": status}).encode()
+    return message
+
+
+@pytest.mark.asyncio
+async def test_sharded_workers_keep_order_per_event_and_run_events_in_parallel():
+    handled = []
+    running = set()
+    overlapped = False
+
+    async def handle(message):
+        nonlocal overlapped
+        body = json.loads(message.body)
+        assert body["event_id"] not in running
+        running.add(body["event_id"])
+        overlapped = overlapped or len(running) > 1
+        await asyncio.sleep(0.01)
+        running.discard(body["event_id"])
+        if body["status"] == 0:
+            raise RuntimeError("broken message")
+        handled.append((body["event_id"], body["status"]))
+
+    workers = ShardedWorkers(handle, message_event_id, workers=4)
+    workers.start()
+    for status in (0, 2, 3):
+        for event_id in ("event1", "event2", "event3"):
+            workers.submit(make_message(event_id, status))
+    await asyncio.wait_for(workers.join(), 1)
+    await workers.stop()
+
+    for event_id in ("event1", "event2", "event3"):
+        assert [status for handled_id, status in handled if handled_id == event_id] == [2, 3]
+    assert overlapped
+
+
+def test_message_event_id_tolerates_malformed_messages():
+    message = MagicMock()
+    message.body = b"not json"
+    assert message_event_id(message) == ""
+    assert message_event_id(make_message("event1", 2)) == "event1"
+
+
+@pytest.mark.asyncio
+@patch("app.bets.consumer.sync_line_replica", new_callable=AsyncMock)
+@patch("app.bets.consumer.aio_pika.connect_robust", new_callable=AsyncMock)
+async def test_each_process_binds_its_own_queue_to_the_line_feed(mock_connect, mock_sync):
+    queue = MagicMock()
+    queue.bind = AsyncMock()
+    queue.iterator.return_value.__aiter__.return_value = []
+    channel = MagicMock()
+    channel.declare_exchange = AsyncMock()
+    channel.declare_queue = AsyncMock(return_value=queue)
+    connection = mock_connect.return_value
+    connection.channel = AsyncMock(return_value=channel)
+
+    await consume_line_changes()
+
+    channel.declare_exchange.assert_awaited_once_with("lines", aio_pika.ExchangeType.FANOUT, durable=True)
+    channel.declare_queue.assert_awaited_once_with(exclusive=True)
+    queue.bind.assert_awaited_once_with(channel.declare_exchange.return_value)
+    mock_sync.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+@patch("app.bets.consumer.aio_pika.connect_robust", new_callable=AsyncMock)
+async def test_closed_events_are_consumed_from_a_durable_queue(mock_connect):
+    message = make_message("event1", 4)
+    queue = MagicMock()
+    queue.iterator.return_value.__aiter__.return_value = [message]
+    channel = MagicMock()
+    channel.declare_queue = AsyncMock(return_value=queue)
+    mock_connect.return_value.channel = AsyncMock(return_value=channel)
+    event_cache.put("event1", {"event_id": "event1", "state": 1}, 1)
+    line_replica.events["event1"] = {"event_id": "event1", "state": 1, "version": 1, "deadline": 0}
+
+    try:
+        await consume_closed_events()
+    finally:
+        event = line_replica.events.pop("event1")
+
+    channel.declare_queue.assert_awaited_once_with("events.closed", durable=True)
+    message.process.assert_called_once()
+    assert event_cache.get("event1") is None
+    assert event["state"] == 4 and event["version"] == 1
@@ -121,28 +121,40 @@ async def test_get_bets_history_failure(mock_get_bets_history_service, test_clie
     assert "Unexpected error" in response.json()["detail"]
 
 
+async def event_pages(*pages):
+    for page in pages:
+        yield page
+
+
+async def failing_event_pages():
+    raise Exception("Unexpected error")
+    yield
+
+
 @pytest.mark.asyncio
-@patch("app.bets.router.get_all_events_from_provider", new_callable=AsyncMock)
-async def test_get_events_success(mock_get_all_events_from_provider, test_client):
+@patch("app.bets.router.iter_event_pages")
+async def test_get_events_success(mock_iter_event_pages, test_client):
     t = int(time.time())
-    mock_get_all_events_from_provider.return_value = [
-        {"event_id": "event1", "coefficient": 1.5, "deadline": t, "state": 1}
-    ]
+    mock_iter_event_pages.return_value = event_pages(
+        [{"event_id": "event1", "coefficient": 1.5, "deadline": t, "state": 1}],
+        [{"event_id": "event2", "coefficient": 1.7, "deadline": t, "state": 1}],
+    )
 
     response = test_client.get("/events")
 
     assert response.status_code == 200
     data = response.json()
-    assert len(data) == 1
+    assert len(data) == 2
     assert data[0]["event_id"] == "event1"
     assert data[0]["coefficient"] == 1.5
     assert data[0]["deadline"] == t
+    assert data[1]["event_id"] == "event2"
 
 
 @pytest.mark.asyncio
-@patch("app.bets.router.get_all_events_from_provider", new_callable=AsyncMock)
-async def test_get_events_no_events(mock_get_all_events_from_provider, test_client):
-    mock_get_all_events_from_provider.return_value = []
+@patch("app.bets.router.iter_event_pages")
+async def test_get_events_no_events(mock_iter_event_pages, test_client):
+    mock_iter_event_pages.return_value = event_pages([])
 
     response = test_client.get("/events")
 
@@ -152,11 +164,22 @@ async def test_get_events_no_events(mock_get_all_events_from_provider, test_clie
 
 
 @pytest.mark.asyncio
-@patch("app.bets.router.get_all_events_from_provider", new_callable=AsyncMock)
-async def test_get_events_failure(mock_get_all_events_from_provider, test_client):
-    mock_get_all_events_from_provider.side_effect = Exception("Unexpected error")
+@patch("app.bets.router.iter_event_pages")
+async def test_get_events_failure(mock_iter_event_pages, test_client):
+    mock_iter_event_pages.return_value = failing_event_pages()
 
     response = test_client.get("/events")
 
     assert response.status_code == 500
     assert "Unexpected error" in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_metrics(test_client):
+    test_client.get("/bets/missing")
+
+    response = test_client.get("/metrics")
+
+    assert response.status_code == 200
+    assert 'http_request_duration_seconds_count{method="GET",route="unmatched",status="404"}' in response.text
+    assert "bet_db_pool_checked_out " in response.text
@@ -1,32 +1,40 @@
+import json
+import asyncio
+
 import pytest
 import aio_pika
 from unittest.mock import AsyncMock, patch, MagicMock
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.sql import delete
+from sqlalchemy.sql import delete, select
+from app.bets.lookup import LookupBatcher, TTLCache
+from app.bets.replica import LineReplica
+from app.bets.writer import InsertBatcher
 from app.bets.schemas import BetCreate
 from app.bets.models import Bet
 from app.bets.services import (
+    event_cache,
     get_event_from_provider,
     validate_event,
     create_new_bet,
     create_bet_service,
     get_bets_history_service,
-    get_bet,
     get_all_events_from_provider,
-    update_status,
+    iter_event_pages,
+    settled_status,
+    settle_bets,
     process_message
 )
 from fastapi import HTTPException
 
 
 @pytest.mark.asyncio
-@patch("app.bets.services.httpx.AsyncClient.get", new_callable=AsyncMock)
-async def test_get_event_from_provider_success(mock_http_get):
+@patch("app.bets.services.httpx.AsyncClient.post", new_callable=AsyncMock)
+async def test_get_event_from_provider_success(mock_http_post):
     mock_response = AsyncMock()
     mock_response.status_code = 200
-    mock_response.json = lambda: {"event_id": "event1", "deadline": 9999999999, "state": 1}
-    mock_response.raise_for_status = AsyncMock()
-    mock_http_get.return_value = mock_response
+    mock_response.json = lambda: [{"event_id": "event1", "deadline": 9999999999, "state": 1}]
+    mock_response.raise_for_status = MagicMock()
+    mock_http_post.return_value = mock_response
 
     result = await get_event_from_provider("event1")
     assert result["event_id"] == "event1"
@@ -35,9 +43,11 @@ async def test_get_event_from_provider_success(mock_http_get):
 
 
 @pytest.mark.asyncio
-@patch("app.bets.services.httpx.AsyncClient.get", new_callable=AsyncMock)
-async def test_get_event_from_provider_failure(mock_http_get):
-    mock_http_get.side_effect = HTTPException(status_code=404, detail="Event not found")
+@patch("app.bets.services.httpx.AsyncClient.post", new_callable=AsyncMock)
+async def test_get_event_from_provider_failure(mock_http_post):
+    mock_response = MagicMock()
+    mock_response.json = lambda: []
+    mock_http_post.return_value = mock_response
 
     with pytest.raises(HTTPException) as e:
         await get_event_from_provider("empty")
@@ -45,6 +55,138 @@ async def test_get_event_from_provider_failure(mock_http_get):
     assert e.value.detail == "Event not found"
 
 
+@pytest.mark.asyncio
+@patch("app.bets.services.httpx.AsyncClient.post", new_callable=AsyncMock)
+async def test_get_event_from_provider_coalesces_lookups(mock_http_post):
+    mock_response = MagicMock()
+    mock_response.json = lambda: [{"event_id": "event1", "state": 1}, {"event_id": "event2", "state": 2}]
+    mock_http_post.return_value = mock_response
+
+    results = await asyncio.gather(
+        get_event_from_provider("event1"),
+        get_event_from_provider("event2"),
+        get_event_from_provider("event1"),
+        get_event_from_provider("missing"),
+        return_exceptions=True,
+    )
+
+    assert [result["state"] for result in results[:3]] == [1, 2, 1]
+    assert isinstance(results[3], HTTPException) and results[3].status_code == 404
+    mock_http_post.assert_awaited_once()
+    assert json.loads(mock_http_post.await_args.kwargs["content"]) == ["event1", "event2", "missing"]
+
+
+@pytest.mark.asyncio
+async def test_lookup_batcher_splits_full_batches_and_shares_failures():
+    batches = []
+
+    async def fetch(keys):
+        batches.append(keys)
+        if "broken" in keys:
+            raise RuntimeError("provider down")
+        return {key: {"event_id": key} for key in keys}
+
+    batcher = LookupBatcher(fetch, window=10, max_batch_size=2)
+    results = await asyncio.gather(batcher.get("a"), batcher.get("b"))
+    assert [result["event_id"] for result in results] == ["a", "b"]
+
+    results = await asyncio.gather(batcher.get("c"), batcher.get("broken"), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert batches == [["a", "b"], ["c", "broken"]]
+
+
+@pytest.mark.asyncio
+@patch("app.bets.services.settle_bets", new_callable=AsyncMock)
+@patch("app.bets.services.httpx.AsyncClient.post", new_callable=AsyncMock)
+async def test_get_event_from_provider_caches_until_settled(mock_http_post, mock_settle_bets):
+    mock_response = MagicMock()
+    mock_response.json = lambda: [{"event_id": "event1", "state": 1}]
+    mock_http_post.return_value = mock_response
+
+    await get_event_from_provider("event1")
+    await get_event_from_provider("event1")
+    assert mock_http_post.await_count == 1
+
+    message = MagicMock(spec=aio_pika.IncomingMessage)
+    message.body = b'{"event_id": "event1", "status": 2}'
+    await process_message(message, AsyncMock())
+    await get_event_from_provider("event1")
+    assert mock_http_post.await_count == 2
+    assert event_cache.get("event1") is not None
+
+
+def test_ttl_cache_expires_bounds_and_drops_stale_puts():
+    cache = TTLCache(ttl=60, max_size=2)
+    version = cache.version
+    cache.invalidate("a")
+    cache.put("a", {"state": 1}, version)
+    assert cache.get("a") is None
+
+    for key in ("a", "b", "c"):
+        cache.put(key, {"event_id": key}, cache.version)
+    assert cache.get("a") is None and len(cache) == 2
+
+    cache.ttl = 0
+    cache.put("d", {"event_id": "d"}, cache.version)
+    assert cache.get("d") is None
+
+    cache._entries["b"] = (0, {"event_id": "b"})
+    assert cache.get("b") is None
+
+
+def line_event(event_id, version, deadline=9999999999, state=1):
+    return {"event_id": event_id, "coefficient": 1.5, "deadline": deadline, "state": state, "version": version}
+
+
+@pytest.mark.asyncio
+async def test_line_replica_follows_feed_and_resyncs_on_gaps():
+    fetch_changes = AsyncMock(return_value={
+        "version": 2, "snapshot": True, "events": [line_event("event1", 1), line_event("event2", 2)],
+    })
+    replica = LineReplica(fetch_changes, max_staleness=60)
+    assert replica.handle({"feed": "a", "previous": 2})
+    assert replica.get("event1") is None
+
+    await replica.sync()
+    fetch_changes.assert_awaited_once_with(0)
+    assert replica.get("event1")["version"] == 1
+
+    assert not replica.handle({"feed": "a", "previous": 2, "event": line_event("event1", 3, state=2)})
+    assert not replica.handle({"feed": "a", "previous": 1, "event": line_event("event2", 1, state=3)})
+    assert replica.get("event1")["state"] == 2 and replica.get("event2")["state"] == 1
+    assert replica.version == 3
+
+    # A missed message: the change is applied, but nothing is served until the resync.
+    assert replica.handle({"feed": "a", "previous": 4, "event": line_event("event3", 5)})
+    assert replica.get("event3") is None
+    fetch_changes.return_value = {"version": 5, "snapshot": False, "events": [line_event("event4", 4)]}
+    await replica.sync()
+    fetch_changes.assert_awaited_with(3)
+    assert replica.get("event3") and replica.get("event4") and replica.version == 5
+
+    # Heartbeats prune expired events; silence makes the replica stale.
+    replica.events["event4"]["deadline"] = 0
+    assert not replica.handle({"feed": "a", "previous": 5})
+    assert replica.get("event4") is None
+    replica.last_heard -= 61
+    assert replica.get("event1") is None
+
+    # A restarted LineProvider starts a new feed, and the replica starts over.
+    assert replica.handle({"feed": "b", "previous": 1})
+    assert replica.version == 0 and len(replica) == 0
+
+
+@pytest.mark.asyncio
+@patch("app.bets.services.httpx.AsyncClient.post", new_callable=AsyncMock)
+async def test_get_event_from_provider_prefers_fresh_replica(mock_http_post):
+    replica = LineReplica(AsyncMock(return_value={"version": 1, "snapshot": True, "events": [line_event("event1", 1)]}))
+    await replica.sync()
+    with patch("app.bets.services.line_replica", replica):
+        event = await get_event_from_provider("event1")
+    assert event["version"] == 1
+    mock_http_post.assert_not_awaited()
+
+
 @pytest.mark.asyncio
 async def test_validate_event_success():
     event = {"event_id": "event1", "deadline": 9999999999, "state": 1}
@@ -87,51 +229,53 @@ async def test_create_new_bet(async_session: AsyncSession):
 async def test_create_bet_service(mock_get_event_from_provider, async_session: AsyncSession):
     mock_get_event_from_provider.return_value = {"event_id": "event1", "deadline": 9999999999, "state": 1}
     bet_data = BetCreate(event_id="event1", amount=100.0)
+    write = AsyncMock(side_effect=lambda rows: [Bet(id=i + 1, **row) for i, row in enumerate(rows)])
 
-    new_bet = await create_bet_service(bet_data, async_session)
+    with patch("app.bets.services.bet_inserts", InsertBatcher(write, max_wait=0.001)):
+        new_bet = await create_bet_service(bet_data, async_session)
 
+    assert new_bet.id == 1
     assert new_bet.event_id == bet_data.event_id
     assert new_bet.amount == bet_data.amount
     assert new_bet.status == "not_played"
 
 
 @pytest.mark.asyncio
-async def test_get_bets_history_service(async_session: AsyncSession):
-    await async_session.execute(delete(Bet))
-    await async_session.commit()
+async def test_insert_batcher_groups_rows_and_isolates_bad_ones():
+    batches = []
 
-    bet = Bet(event_id="event 1", amount=100.0, status="not_played")
-    async_session.add(bet)
-    await async_session.commit()
+    async def write(rows):
+        batches.append([row["id"] for row in rows])
+        if any(row["id"] == "bad" for row in rows):
+            raise ValueError("numeric field overflow")
+        return [row["id"].upper() for row in rows]
 
-    history = await get_bets_history_service(async_session)
+    batcher = InsertBatcher(write, max_wait=10, max_batch_size=3, row_errors=(ValueError,))
+    results = await asyncio.gather(*(batcher.add({"id": key}) for key in ("a", "bad", "c")), return_exceptions=True)
 
-    assert len(history) == 1
-    assert history[0].event_id == bet.event_id
+    assert results[0] == "A" and results[2] == "C"
+    assert isinstance(results[1], ValueError)
+    assert batches == [["a", "bad", "c"], ["a"], ["bad"], ["c"]]
+
+    batcher = InsertBatcher(AsyncMock(side_effect=ConnectionError("db down")), max_wait=0.001, row_errors=(ValueError,))
+    results = await asyncio.gather(batcher.add({"id": "a"}), batcher.add({"id": "b"}), return_exceptions=True)
+    assert all(isinstance(result, ConnectionError) for result in results)
+    batcher.write.assert_awaited_once()
 
 
 @pytest.mark.asyncio
-async def test_get_bet_success(async_session: AsyncSession):
+async def test_get_bets_history_service(async_session: AsyncSession):
     await async_session.execute(delete(Bet))
     await async_session.commit()
 
-    bet1 = Bet(event_id="event1", amount=100, status="not_played")
-    bet2 = Bet(event_id="event1", amount=50, status="not_played")
-    async_session.add_all([bet1, bet2])
+    bet = Bet(event_id="event 1", amount=100.0, status="not_played")
+    async_session.add(bet)
     await async_session.commit()
 
-    retrieved_bets = await get_bet("event1", async_session)
-
-    assert len(retrieved_bets) == 2
-    assert retrieved_bets[0].event_id == bet1.event_id
-    assert retrieved_bets[1].event_id == bet2.event_id
-
+    history = await get_bets_history_service(async_session)
 
-@pytest.mark.asyncio
-async def test_get_bet_failure(async_session: AsyncSession):
-    with pytest.raises(ValueError) as exc:
-        await get_bet("empty", async_session)
-    assert "Bet with event_id empty not found" in str(exc.value)
+    assert len(history) == 1
+    assert history[0].event_id == bet.event_id
 
 
 @pytest.mark.asyncio
@@ -149,6 +293,23 @@ async def test_get_all_events_from_provider_success(mock_http_get):
     assert events[0]["event_id"] == "event1"
 
 
+@pytest.mark.asyncio
+@patch("app.bets.services.httpx.AsyncClient.get", new_callable=AsyncMock)
+async def test_get_all_events_from_provider_follows_cursor(mock_http_get):
+    first_page = MagicMock()
+    first_page.json = lambda: [{"event_id": "event1"}, {"event_id": "event2"}]
+    first_page.headers = {"X-Next-Cursor": "cursor1"}
+    last_page = MagicMock()
+    last_page.json = lambda: [{"event_id": "event3"}]
+    last_page.headers = {}
+    mock_http_get.side_effect = [first_page, last_page]
+
+    events = [event async for page in iter_event_pages(2) for event in page]
+
+    assert [event["event_id"] for event in events] == ["event1", "event2", "event3"]
+    assert mock_http_get.await_args_list[1].kwargs["params"] == {"limit": 2, "cursor": "cursor1"}
+
+
 @pytest.mark.asyncio
 @patch("app.bets.services.httpx.AsyncClient.get", new_callable=AsyncMock)
 async def test_get_all_events_from_provider_failure(mock_http_get):
@@ -160,37 +321,46 @@ async def test_get_all_events_from_provider_failure(mock_http_get):
     assert "Connection error" in exc.value.detail
 
 
-@pytest.mark.asyncio
-async def test_update_status_success():
-    bet = Bet(event_id="event1", amount=100.0, status="not_played")
-
-    await update_status(bet, 2)
-    assert bet.status == "won"
+def test_settled_status():
+    assert settled_status(2) == "won"
+    assert settled_status(3) == "lost"
 
-    await update_status(bet, 3)
-    assert bet.status == "lost"
-
-
-@pytest.mark.asyncio
-async def test_update_status_failure():
-    bet = Bet(event_id="event1", amount=100.0, status="not_played")
 
+def test_settled_status_failure():
     with pytest.raises(ValueError) as exc:
-        await update_status(bet, 4)
+        settled_status(4)
     assert "Unknown status: 4" in str(exc.value)
 
 
 @pytest.mark.asyncio
-@patch("app.bets.services.get_bet", new_callable=AsyncMock)
-async def test_process_message_success(mock_get_bets, async_session: AsyncSession):
-    bet1 = Bet(event_id="event1", amount=100.0, status="not_played")
-    bet2 = Bet(event_id="event1", amount=50.0, status="not_played")
-    mock_get_bets.return_value = [bet1, bet2]
+async def test_process_message_success(async_session: AsyncSession):
+    await async_session.execute(delete(Bet))
+    async_session.add_all([
+        Bet(event_id="event1", amount=100.0, status="not_played"),
+        Bet(event_id="event1", amount=50.0, status="not_played"),
+        Bet(event_id="event2", amount=10.0, status="not_played"),
+    ])
+    await async_session.commit()
 
     message = MagicMock(spec=aio_pika.IncomingMessage)
     message.body = b'{"event_id": "event1", "status": 2}'
 
     await process_message(message, async_session)
 
-    assert bet1.status == "won"
-    assert bet2.status == "won"
+    result = await async_session.execute(select(Bet.event_id, Bet.status).order_by(Bet.id))
+    assert result.all() == [("event1", "won"), ("event1", "won"), ("event2", "not_played")]
+
+
+@pytest.mark.asyncio
+async def test_settle_bets_updates_in_chunks():
+    db = AsyncMock()
+    db.execute.side_effect = [MagicMock(rowcount=2), MagicMock(rowcount=2), MagicMock(rowcount=1)]
+
+    assert await settle_bets("event1", 3, db, chunk_size=2) == 5
+    assert db.execute.await_count == db.commit.await_count == 3
+    statement = str(db.execute.await_args.args[0])
+    assert statement.startswith("UPDATE bets SET status=") and "LIMIT" in statement
+
+    db.execute.side_effect = [MagicMock(rowcount=0)]
+    with pytest.raises(ValueError):
+        await settle_bets("event1", 2, db)
@@ -0,0 +1,214 @@
+import os
+import time
+import sqlite3
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from app.lines.data import EventRepository, Row
+from app.lines.metrics import Counter
+from app.lines.models import Event, EventState
+
+
+ARCHIVE_PATH = os.getenv("LINE_ARCHIVE_PATH")
+ARCHIVE_RETENTION = int(os.getenv("LINE_ARCHIVE_RETENTION", "86400"))
+MAX_HOT_EVENTS = int(os.getenv("LINE_MAX_HOT_EVENTS", "0"))
+ARCHIVE_INTERVAL = float(os.getenv("LINE_ARCHIVE_INTERVAL", "60"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("LINE_ARCHIVE_BATCH_SIZE", "10000"))
+# SQLite limits the number of parameters of one statement.
+LOOKUP_CHUNK_SIZE = 500
+
+ARCHIVED_EVENTS = Counter("line_archived_events_total", "Events moved from memory to the archive")
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    event_id TEXT PRIMARY KEY,
+    coefficient REAL NOT NULL,
+    deadline INTEGER NOT NULL,
+    state INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    finished_at INTEGER
+) WITHOUT ROWID
+"""
+COLUMNS = "event_id, coefficient, deadline, state, version, finished_at"
+
+
+def to_event(record: tuple) -> Event:
+    event_id, coefficient, deadline, state, version, finished_at = record
+    return Event.model_construct(
+        event_id=event_id,
+        coefficient=coefficient,
+        deadline=deadline,
+        state=EventState(state),
+        version=version,
+        finished_at=finished_at,
+    )
+
+
+class EventArchive:
+    """On-disk table of events evicted from memory, indexed by event_id.
+
+    Lookups are single-row reads made on the event loop thread. Writes come in
+    batches from a worker thread through a second connection; in WAL mode the
+    two do not block each other.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._reader = self._connect(path)
+        self._reader.execute(SCHEMA)
+        self._writer = self._connect(path)
+        self.count = self._reader.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        # Each connection is used by one thread at a time, not necessarily the one that opened it.
+        connection = sqlite3.connect(path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def __contains__(self, event_id: str) -> bool:
+        return self._reader.execute("SELECT 1 FROM events WHERE event_id = ?", (event_id,)).fetchone() is not None
+
+    def get(self, event_id: str) -> Optional[Event]:
+        record = self._reader.execute(f"SELECT {COLUMNS} FROM events WHERE event_id = ?", (event_id,)).fetchone()
+        return None if record is None else to_event(record)
+
+    def get_many(self, event_ids: List[str]) -> Dict[str, Event]:
+        events = {}
+        for start in range(0, len(event_ids), LOOKUP_CHUNK_SIZE):
+            chunk = event_ids[start:start + LOOKUP_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            for record in self._reader.execute(
+                f"SELECT {COLUMNS} FROM events WHERE event_id IN ({placeholders})", chunk,
+            ):
+                events[record[0]] = to_event(record)
+        return events
+
+    def write(self, rows: Iterable[Row]) -> None:
+        """Insert or update (version, event_id, coefficient, deadline, state, finished_at) rows; newer versions win."""
+        records = [
+            (event_id, coefficient, deadline, state, version, finished_at)
+            for version, event_id, coefficient, deadline, state, finished_at in rows
+        ]
+        with self._writer:
+            inserted = self._writer.executemany(
+                f"INSERT OR IGNORE INTO events ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)", records,
+            ).rowcount
+            self._writer.executemany(
+                "UPDATE events SET coefficient = ?, deadline = ?, state = ?, version = ?, finished_at = ? "
+                "WHERE event_id = ? AND version < ?",
+                [(record[1], record[2], record[3], record[4], record[5], record[0], record[4]) for record in records],
+            )
+        self.count += inserted
+
+    def close(self) -> None:
+        self._reader.close()
+        self._writer.close()
+
+
+class EventArchiver:
+    """Moves finished events from the repository to the archive.
+
+    A finished event is archived once both its deadline and its finish lie
+    more than ``retention`` seconds in the past. While more than
+    ``max_hot_events`` events are held in memory, finished events past their
+    deadline are archived sooner, earliest finish first. Events that are not
+    finished always stay in memory, since they can still be settled.
+    """
+
+    def __init__(
+        self,
+        repository: EventRepository,
+        archive: EventArchive,
+        retention: int = ARCHIVE_RETENTION,
+        max_hot_events: int = MAX_HOT_EVENTS,
+        batch_size: int = ARCHIVE_BATCH_SIZE,
+    ):
+        self.repository = repository
+        self.archive = archive
+        self.retention = retention
+        self.max_hot_events = max_hot_events
+        self.batch_size = batch_size
+        self.archived_count = 0
+        self.last_run_seconds: Optional[float] = None
+
+    def select(self, now: int) -> List[str]:
+        cutoff = now - self.retention
+        dump_row = self.repository.events.dump_row
+        selected = {}
+        for finished_at, event_id, row in self.repository.finished_index:
+            if finished_at > cutoff:
+                break
+            if dump_row(row)[2] <= cutoff:
+                selected[event_id] = None
+
+        excess = len(self.repository.events) - len(selected) - self.max_hot_events
+        if self.max_hot_events and excess > 0:
+            for _, event_id, row in self.repository.finished_index:
+                if excess <= 0:
+                    break
+                if event_id not in selected and dump_row(row)[2] <= now:
+                    selected[event_id] = None
+                    excess -= 1
+        return list(selected)
+
+    def drop_archived(self) -> int:
+        """Evict the events the archive already holds, e.g. ones a restore from the journal brought back."""
+        store = self.repository.events
+        event_ids = [event_id for _, event_id, _ in self.repository.finished_index]
+        current = []
+        for event_id, event in self.archive.get_many(event_ids).items():
+            version = store.dump_row(store.row(event_id))[4]
+            if event.version >= version:
+                current.append((event_id, version))
+        return self.repository.evict(current)
+
+    async def archive_once(self, now: Optional[int] = None) -> int:
+        """Archive the events due at ``now`` and drop them from memory."""
+        started = time.perf_counter()
+        event_ids = self.select(int(time.time()) if now is None else now)
+        store = self.repository.events
+        archived = 0
+        for start in range(0, len(event_ids), self.batch_size):
+            rows = []
+            for event_id in event_ids[start:start + self.batch_size]:
+                if event_id in store:
+                    event_id, coefficient, deadline, state, version, finished_at = store.dump_row(store.row(event_id))
+                    rows.append((version, event_id, coefficient, deadline, state, finished_at))
+            # Written before it is evicted, so an event can always be read from one or the other.
+            await asyncio.to_thread(self.archive.write, rows)
+            archived += self.repository.evict((row[1], row[0]) for row in rows)
+        self.archived_count += archived
+        self.last_run_seconds = time.perf_counter() - started
+        ARCHIVED_EVENTS.inc(archived)
+        return archived
+
+    async def run(self, interval: float = ARCHIVE_INTERVAL) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                archived = await self.archive_once()
+                if archived:
+                    logger.info("Archived %d events in %.2fs", archived, self.last_run_seconds)
+            except Exception as e:
+                logger.error("Archiving events failed: %s", e)
+
+    def stats(self) -> dict:
+        return {
+            "hot": len(self.repository.events),
+            "archived": self.archive.count,
+            "archived_since_start": self.archived_count,
+            "retention": self.retention,
+            "max_hot_events": self.max_hot_events,
+            "last_run_seconds": self.last_run_seconds,
+        }
+
+
+def create_archive() -> Optional[EventArchive]:
+    if not ARCHIVE_PATH:
+        return None
+    return EventArchive(ARCHIVE_PATH)
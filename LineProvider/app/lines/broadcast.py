@@ -0,0 +1,83 @@
+import os
+import asyncio
+from typing import AsyncIterator, List, Optional, Set, Tuple
+
+from app.lines.models import Event
+
+
+SUBSCRIBER_BUFFER_SIZE = int(os.getenv("LINE_STREAM_BUFFER_SIZE", "1000"))
+KEEPALIVE_INTERVAL = float(os.getenv("LINE_STREAM_KEEPALIVE_INTERVAL", "15"))
+
+
+class Subscription:
+    def __init__(self, buffer_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = False
+
+    async def get(self) -> Optional[Tuple[int, str]]:
+        """Return the next (version, event json) pair, or None once the subscription was dropped."""
+        return await self.queue.get()
+
+
+class EventBroadcaster:
+    def __init__(self, buffer_size: int = SUBSCRIBER_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self.subscribers: Set[Subscription] = set()
+        self.dropped_count = 0
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self.buffer_size)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.subscribers.discard(subscription)
+
+    def publish(self, event: Event) -> None:
+        if not self.subscribers:
+            return
+
+        # Serialized once, whatever the number of subscribers.
+        message = (event.version, event.model_dump_json())
+        for subscription in list(self.subscribers):
+            try:
+                subscription.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._drop(subscription)
+
+    def _drop(self, subscription: Subscription) -> None:
+        # A subscriber that can't keep up is disconnected instead of buffering without bound.
+        self.subscribers.discard(subscription)
+        subscription.dropped = True
+        self.dropped_count += 1
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+
+async def event_messages(
+    subscription: Subscription,
+    backlog: List[Event],
+    after_version: int,
+    keepalive_interval: float = KEEPALIVE_INTERVAL,
+) -> AsyncIterator[Optional[Tuple[int, str]]]:
+    """Yield (version, event json) pairs: the backlog first, then live changes newer than it.
+
+    None is yielded when nothing happened for ``keepalive_interval`` seconds.
+    """
+    for event in backlog:
+        yield event.version, event.model_dump_json()
+
+    while True:
+        try:
+            message = await asyncio.wait_for(subscription.get(), keepalive_interval)
+        except asyncio.TimeoutError:
+            yield None
+            continue
+
+        if message is None:
+            return
+        version, data = message
+        if version > after_version:
+            yield message
+
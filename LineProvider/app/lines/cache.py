@@ -0,0 +1,45 @@
+import gzip
+import hashlib
+from typing import Optional, Tuple
+
+from app.lines.data import EventRepository
+from app.lines.models import Event
+from app.lines.serialization import events_adapter
+
+
+GZIP_MIN_SIZE = 1024
+
+
+class ActiveEventsCache:
+    """Encoded body of the active events list, rebuilt only when it can have changed.
+
+    The body is dropped on any repository mutation and when the earliest
+    deadline in it passes.
+    """
+
+    def __init__(self, repository: EventRepository):
+        self.repository = repository
+        self._body: Optional[bytes] = None
+        self._gzip_body: Optional[bytes] = None
+        self._etag = ""
+        self._expires_at = 0
+
+    def invalidate(self, event: Optional[Event] = None) -> None:
+        self._body = None
+        self._gzip_body = None
+
+    async def get(self, current_time: int, accept_gzip: bool = False) -> Tuple[bytes, str, bool]:
+        """Return the encoded body, its ETag and whether the body is gzip-compressed."""
+        if self._body is None or current_time >= self._expires_at:
+            events = await self.repository.get_active_events(current_time)
+            self._body = events_adapter.dump_json(events)
+            self._gzip_body = None
+            self._etag = '"' + hashlib.blake2b(self._body, digest_size=16).hexdigest() + '"'
+            # Events are ordered by deadline, the first one to expire changes the list.
+            self._expires_at = events[0].deadline if events else float("inf")
+
+        if accept_gzip and len(self._body) >= GZIP_MIN_SIZE:
+            if self._gzip_body is None:
+                self._gzip_body = gzip.compress(self._body, compresslevel=5)
+            return self._gzip_body, self._etag[:-1] + '-gzip"', True
+        return self._body, self._etag, False
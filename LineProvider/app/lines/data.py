@@ -1,24 +1,341 @@
-from typing import Dict, Optional
-from app.lines.models import Event
+import os
+import time
+import uuid
+import heapq
+from collections import deque
+from operator import itemgetter
+from typing import Any, Callable, Collection, Deque, Dict, Iterable, Iterator, List, MutableMapping, Optional, Tuple
+from app.lines.index import SortedIndex
+from app.lines.models import Event, EventState
+from app.lines.store import EventStore
+
+
+CHANGE_LOG_SIZE = int(os.getenv("LINE_CHANGE_LOG_SIZE", "100000"))
+
+FINISHED_STATES = frozenset((EventState.FINISHED_WIN.value, EventState.FINISHED_LOSE.value))
+
+# (version, event_id, coefficient, deadline, state, finished_at) as kept in the journal.
+Row = Tuple[int, str, float, int, int, Optional[int]]
+# (sort key, event_id, stored row) as kept in the indexes.
+Entry = Tuple[int, str, Any]
+
+
+class VersionConflict(ValueError):
+    def __init__(self, event_id: str, expected_version: int, version: int):
+        super().__init__(f"Event {event_id} is at version {version}, not {expected_version}")
+        self.version = version
 
 
 class EventRepository:
-    def __init__(self):
-        self.events: Dict[str, Event] = {}
+    def __init__(self, change_log_size: int = CHANGE_LOG_SIZE, store: Optional[MutableMapping[str, Event]] = None):
+        self.events = EventStore() if store is None else store
+        # (deadline, event_id, row) entries, so active events are a suffix of the index.
+        self.deadline_index = SortedIndex()
+        # The same entries split by state value, and (finished_at, event_id, row) of finished events,
+        # so that lookups by state or finish time walk only the matching events.
+        self.state_indexes: Dict[int, SortedIndex] = {state.value: SortedIndex() for state in EventState}
+        self.finished_index = SortedIndex()
+        self.version = 0
+        # Identifies this history of versions: a book that starts over gets a new ID.
+        self.book_id = uuid.uuid4().hex
+        # (version, event_id) of the most recent mutations, oldest first.
+        self.change_log: Deque[Tuple[int, str]] = deque(maxlen=change_log_size)
+        self.listeners: List[Callable[[Event], None]] = []
+
+    def subscribe(self, listener: Callable[[Event], None]) -> None:
+        """Call ``listener`` with the event after every mutation."""
+        self.listeners.append(listener)
 
     async def create_event(self, event: Event):
         if event.event_id in self.events:
             raise ValueError("Event with this ID already exists")
+        self._stamp(event)
+        if event.state.value in FINISHED_STATES and event.finished_at is None:
+            event.finished_at = int(time.time())
         self.events[event.event_id] = event
+        self._index(event.event_id, event.deadline, event.state.value, event.finished_at)
+        self._record_change(event)
 
-    async def update_event(self, event_id: str, updates: dict):
+    async def create_events(self, events: List[Event]) -> None:
+        event_ids = {event.event_id for event in events}
+        if len(event_ids) != len(events) or any(event_id in self.events for event_id in event_ids):
+            raise ValueError("Event with this ID already exists")
+        for event in events:
+            await self.create_event(event)
+
+    async def update_event(self, event_id: str, updates: dict, expected_version: Optional[int] = None) -> Event:
+        """Apply ``updates`` to the event, only if it is still at ``expected_version`` when given."""
         if event_id not in self.events:
             raise ValueError("Event not found")
+        event = self.events[event_id]
+        if expected_version is not None and event.version != expected_version:
+            raise VersionConflict(event_id, expected_version, event.version)
+        deadline, state, finished_at = event.deadline, event.state.value, event.finished_at
         for field, value in updates.items():
-            setattr(self.events[event_id], field, value)
+            setattr(event, field, value)
+        # A closed event whose deadline is pushed into the future takes bets again.
+        if (
+            event.state == EventState.CLOSED and "state" not in updates
+            and event.deadline != deadline and event.deadline > time.time()
+        ):
+            event.state = EventState.NEW
+        if event.state.value not in FINISHED_STATES:
+            event.finished_at = None
+        elif state not in FINISHED_STATES:
+            event.finished_at = int(time.time())
+        self._stamp(event)
+        self.events[event_id] = event
+        if (event.deadline, event.state.value, event.finished_at) != (deadline, state, finished_at):
+            self._unindex(event_id, deadline, state, finished_at)
+            self._index(event_id, event.deadline, event.state.value, event.finished_at)
+        self._record_change(event)
+        return event
+
+    async def update_events(self, updates: List[Tuple[str, dict]]) -> List[Event]:
+        if any(event_id not in self.events for event_id, _ in updates):
+            raise ValueError("Event not found")
+        return [await self.update_event(event_id, event_updates) for event_id, event_updates in updates]
 
     async def get_event(self, event_id: str) -> Optional[Event]:
         return self.events.get(event_id)
 
-    async def get_active_events(self, current_time: int):
-        return [event for event in self.events.values() if event.deadline > current_time]
+    async def get_events(self, event_ids: Iterable[str]) -> List[Event]:
+        """Return the events with the given IDs in the order asked for, skipping unknown IDs."""
+        events = self.events
+        return [events[event_id] for event_id in event_ids if event_id in events]
+
+    async def get_active_events(self, current_time: int) -> List[Event]:
+        to_event = self.events.to_event
+        return [to_event(entry[2]) for entry in self.deadline_index.iter_after(current_time, key=itemgetter(0))]
+
+    async def query_events(
+        self,
+        current_time: int,
+        limit: int,
+        after: Optional[Tuple[int, str]] = None,
+        deadline_from: Optional[int] = None,
+        deadline_to: Optional[int] = None,
+        states: Optional[Collection[int]] = None,
+        min_coefficient: Optional[float] = None,
+        max_coefficient: Optional[float] = None,
+        include_expired: bool = False,
+    ) -> Tuple[List[Event], Optional[Tuple[int, str]]]:
+        """Return up to ``limit`` events in (deadline, event_id) order, starting after ``after``.
+
+        Only active events are considered unless ``include_expired`` is set.
+        With ``states`` only the indexes of those states are walked. The second
+        item is the (deadline, event_id) key to pass as ``after`` for the next
+        page, or None when there are no more matching events.
+        """
+        floor = None if include_expired else current_time
+        if deadline_from is not None:
+            floor = deadline_from - 1 if floor is None else max(floor, deadline_from - 1)
+        if states is None:
+            indexes = [self.deadline_index]
+        else:
+            indexes = [self.state_indexes[state] for state in sorted(states) if state in self.state_indexes]
+        entries = heapq.merge(*(self._iter_from(index, floor, after) for index in indexes))
+        return self._collect(entries, limit, deadline_to, None, min_coefficient, max_coefficient)
+
+    async def query_finished_events(
+        self,
+        limit: int,
+        after: Optional[Tuple[int, str]] = None,
+        finished_from: Optional[int] = None,
+        finished_to: Optional[int] = None,
+        states: Optional[Collection[int]] = None,
+        min_coefficient: Optional[float] = None,
+        max_coefficient: Optional[float] = None,
+    ) -> Tuple[List[Event], Optional[Tuple[int, str]]]:
+        """Return up to ``limit`` finished events in (finished_at, event_id) order, starting after ``after``.
+
+        The second item is the (finished_at, event_id) key of the next page, as
+        in ``query_events``.
+        """
+        floor = None if finished_from is None else finished_from - 1
+        entries = self._iter_from(self.finished_index, floor, after)
+        return self._collect(entries, limit, finished_to, states, min_coefficient, max_coefficient)
+
+    async def get_changes(self, since: int) -> Tuple[int, bool, List[Event]]:
+        """Return the current version and the events changed after ``since``.
+
+        When the change log no longer reaches back to ``since`` the whole book is
+        returned instead and the second item of the result is True.
+        """
+        oldest_version = self.change_log[0][0] if self.change_log else self.version + 1
+        if since > self.version or since < oldest_version - 1:
+            return self.version, True, list(self.events.values())
+
+        changed_events = []
+        for version, event_id in reversed(self.change_log):
+            if version <= since:
+                break
+            event = self.events.get(event_id)
+            # Only the latest change of an event is reported.
+            if event is not None and event.version == version:
+                changed_events.append(event)
+        changed_events.reverse()
+        return self.version, False, changed_events
+
+    def restore(self, rows: Iterable[Row]) -> int:
+        """Bulk-load (version, event_id, coefficient, deadline, state, finished_at) rows into an empty repository.
+
+        Rows must come in version order for each event, the last one wins.
+        Listeners are not notified and the change log is left empty, so delta
+        cursors taken before the restore fall back to a snapshot.
+        """
+        if self.events:
+            raise ValueError("Events can only be restored into an empty repository")
+
+        latest = {row[1]: row for row in rows}
+        load_row = self.events.load_row
+        for version, event_id, coefficient, deadline, state, finished_at in latest.values():
+            load_row(event_id, coefficient, deadline, state, version, finished_at)
+
+        self.version = max((row[0] for row in latest.values()), default=self.version)
+        self._rebuild_indexes()
+        return len(latest)
+
+    def reset(self) -> None:
+        """Drop every event and start versions over, e.g. to follow a primary that lost its book."""
+        self.events.clear()
+        self._rebuild_indexes()
+        self.change_log.clear()
+        self.version = 0
+        self.book_id = uuid.uuid4().hex
+
+    def apply_rows(self, rows: Iterable[Row]) -> int:
+        """Apply (version, event_id, coefficient, deadline, state, finished_at) rows written by another process.
+
+        Rows older than the stored event are skipped, so applying a row twice is
+        harmless. Applied rows are recorded and reported to listeners like local
+        mutations.
+        """
+        applied = 0
+        for version, event_id, coefficient, deadline, state, finished_at in rows:
+            if event_id in self.events:
+                _, _, previous_deadline, previous_state, previous_version, previous_finished_at = \
+                    self.events.dump_row(self.events.row(event_id))
+                if version <= previous_version:
+                    continue
+                self._unindex(event_id, previous_deadline, previous_state, previous_finished_at)
+
+            event = Event.model_construct(
+                event_id=event_id,
+                coefficient=coefficient,
+                deadline=deadline,
+                state=EventState(state),
+                version=version,
+                finished_at=finished_at,
+            )
+            self.events[event_id] = event
+            self._index(event_id, deadline, state, finished_at)
+            self.version = max(self.version, version)
+            self._record_change(event)
+            applied += 1
+        return applied
+
+    def evict(self, event_versions: Iterable[Tuple[str, int]]) -> int:
+        """Drop events from memory, e.g. once they are archived elsewhere.
+
+        An event is only dropped while it is still at the given version, so a
+        mutation made after it was copied is kept. Eviction is not a mutation:
+        listeners are not notified.
+        """
+        evicted = 0
+        for event_id, version in event_versions:
+            if event_id not in self.events:
+                continue
+            _, _, deadline, state, current_version, finished_at = self.events.dump_row(self.events.row(event_id))
+            if current_version != version:
+                continue
+            self._unindex(event_id, deadline, state, finished_at)
+            del self.events[event_id]
+            evicted += 1
+        return evicted
+
+    def _stamp(self, event: Event) -> None:
+        self.version += 1
+        event.version = self.version
+
+    def _record_change(self, event: Event) -> None:
+        self.change_log.append((event.version, event.event_id))
+        for listener in self.listeners:
+            listener(event)
+
+    def _index(self, event_id: str, deadline: int, state: int, finished_at: Optional[int]) -> None:
+        row = self.events.row(event_id)
+        entry = (deadline, event_id, row)
+        self.deadline_index.add(entry)
+        self.state_indexes[state].add(entry)
+        if finished_at is not None:
+            self.finished_index.add((finished_at, event_id, row))
+
+    def _unindex(self, event_id: str, deadline: int, state: int, finished_at: Optional[int]) -> None:
+        row = self.events.row(event_id)
+        entry = (deadline, event_id, row)
+        self.deadline_index.discard(entry)
+        self.state_indexes[state].discard(entry)
+        if finished_at is not None:
+            self.finished_index.discard((finished_at, event_id, row))
+
+    @staticmethod
+    def _iter_from(index: SortedIndex, floor: Optional[int], after: Optional[Tuple[int, str]]) -> Iterator[Entry]:
+        """Walk ``index`` from the first entry past both ``floor`` and the ``after`` key."""
+        if after is not None and (floor is None or after[0] > floor):
+            return index.iter_after(after, key=itemgetter(0, 1))
+        if floor is None:
+            return iter(index)
+        return index.iter_after(floor, key=itemgetter(0))
+
+    def _collect(
+        self,
+        entries: Iterator[Entry],
+        limit: int,
+        stop_after: Optional[int],
+        states: Optional[Collection[int]],
+        min_coefficient: Optional[float],
+        max_coefficient: Optional[float],
+    ) -> Tuple[List[Event], Optional[Tuple[int, str]]]:
+        dump_row = self.events.dump_row
+        page = []
+        for entry in entries:
+            if stop_after is not None and entry[0] > stop_after:
+                break
+            if states is not None or min_coefficient is not None or max_coefficient is not None:
+                _, coefficient, _, state, _, _ = dump_row(entry[2])
+                if states is not None and state not in states:
+                    continue
+                if min_coefficient is not None and coefficient < min_coefficient:
+                    continue
+                if max_coefficient is not None and coefficient > max_coefficient:
+                    continue
+            page.append(entry)
+            if len(page) > limit:
+                break
+
+        to_event = self.events.to_event
+        next_key = page[limit - 1][:2] if len(page) > limit else None
+        return [to_event(entry[2]) for entry in page[:limit]], next_key
+
+    def _rebuild_indexes(self) -> None:
+        dump_row = self.events.dump_row
+        entries = []
+        by_state: Dict[int, List[Entry]] = {state: [] for state in self.state_indexes}
+        finished = []
+        for event_id in self.events:
+            row = self.events.row(event_id)
+            _, _, deadline, state, _, finished_at = dump_row(row)
+            entry = (deadline, event_id, row)
+            entries.append(entry)
+            by_state[state].append(entry)
+            if finished_at is not None:
+                finished.append((finished_at, event_id, row))
+
+        self.deadline_index = SortedIndex()
+        self.deadline_index.update(entries)
+        for state, state_entries in by_state.items():
+            self.state_indexes[state] = SortedIndex()
+            self.state_indexes[state].update(state_entries)
+        self.finished_index = SortedIndex()
+        self.finished_index.update(finished)
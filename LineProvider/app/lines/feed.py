@@ -0,0 +1,114 @@
+import os
+import uuid
+import asyncio
+import logging
+from collections import deque
+from contextlib import suppress
+from typing import Awaitable, Callable, Deque, List, Optional
+
+from app.lines.data import EventRepository
+from app.lines.metrics import Counter
+from app.lines.models import Event
+
+
+FEED_EXCHANGE = os.getenv("LINE_FEED_EXCHANGE", "lines")
+FEED_HEARTBEAT_INTERVAL = float(os.getenv("LINE_FEED_HEARTBEAT_INTERVAL", "5"))
+FEED_QUEUE_SIZE = int(os.getenv("LINE_FEED_QUEUE_SIZE", "10000"))
+FEED_BATCH_SIZE = int(os.getenv("LINE_FEED_BATCH_SIZE", "500"))
+FEED_RETRY_DELAY = float(os.getenv("LINE_FEED_RETRY_DELAY", "1"))
+
+FEED_DROPPED = Counter("line_feed_dropped_total", "Line changes dropped for a full queue or a failed publish")
+
+logger = logging.getLogger(__name__)
+
+
+class LineFeed:
+    """Publishes every change of the line, so other services can keep a replica of it.
+
+    Each message carries the ID of this feed and the version of the change
+    published before it; a replica that sees ``previous`` ahead of what it
+    applied has missed a message and resyncs from the change log. While the
+    line is quiet, heartbeats repeat the latest version so replicas can tell
+    they are up to date.
+
+    Messages go to a fanout exchange, so every consumer binding its own queue
+    to it receives the whole feed. They wait in a bounded queue of their own, apart from the settlement
+    outbox. Since replicas recover from gaps, messages are dropped rather than
+    retried when the queue is full or the broker fails.
+    """
+
+    def __init__(
+        self,
+        repository: EventRepository,
+        publish_fanout: Callable[[List[dict], str], Awaitable[None]],
+        exchange: str = FEED_EXCHANGE,
+        heartbeat_interval: float = FEED_HEARTBEAT_INTERVAL,
+        max_size: int = FEED_QUEUE_SIZE,
+        batch_size: int = FEED_BATCH_SIZE,
+        retry_delay: float = FEED_RETRY_DELAY,
+    ):
+        self.repository = repository
+        self.publish_fanout = publish_fanout
+        self.exchange = exchange
+        self.heartbeat_interval = heartbeat_interval
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.feed_id = uuid.uuid4().hex
+        # Version of the last change published, None until the feed runs.
+        self.version: Optional[int] = None
+        self._messages: Deque[dict] = deque()
+        self._not_empty: Optional[asyncio.Event] = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._messages)
+
+    def publish(self, event: Event) -> None:
+        if self.version is None:
+            return
+        previous = self.version
+        self.version = event.version
+        self._offer({"feed": self.feed_id, "previous": previous, "event": event.model_dump(mode="json")})
+
+    def heartbeat(self) -> None:
+        if self.version is None:
+            # Replicas catch up on earlier changes from the change log.
+            self.version = self.repository.version
+        self._offer({"feed": self.feed_id, "previous": self.version})
+
+    def _offer(self, body: dict) -> None:
+        # Never blocks the mutation: a dropped change shows up as a gap in the chain.
+        if len(self._messages) >= self.max_size:
+            FEED_DROPPED.inc()
+            return
+        self._messages.append(body)
+        if self._not_empty is not None:
+            self._not_empty.set()
+
+    async def run(self) -> None:
+        self._not_empty = asyncio.Event()
+        dispatcher = asyncio.create_task(self._dispatch())
+        try:
+            while True:
+                self.heartbeat()
+                await asyncio.sleep(self.heartbeat_interval)
+        finally:
+            dispatcher.cancel()
+            with suppress(asyncio.CancelledError):
+                await dispatcher
+
+    async def _dispatch(self) -> None:
+        while True:
+            if not self._messages:
+                self._not_empty.clear()
+                await self._not_empty.wait()
+                continue
+
+            bodies = [self._messages.popleft() for _ in range(min(self.batch_size, len(self._messages)))]
+            try:
+                await self.publish_fanout(bodies, self.exchange)
+            except Exception as e:
+                FEED_DROPPED.inc(len(bodies))
+                logger.warning("Dropped %d line changes that failed to publish: %s", len(bodies), e)
+                await asyncio.sleep(self.retry_delay)
@@ -0,0 +1,84 @@
+from bisect import bisect_left, bisect_right, insort
+from itertools import chain, islice
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+
+class SortedIndex:
+    """Sorted collection of keys stored as a list of bounded, sorted buckets.
+
+    Inserts and removals only move items within one bucket, so they stay cheap
+    with millions of keys, while range scans are a bisect followed by a walk.
+    """
+
+    def __init__(self, load: int = 1000):
+        self._load = load
+        self._buckets: List[list] = []
+        self._maxes: list = []
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator:
+        return chain.from_iterable(self._buckets)
+
+    def add(self, key) -> None:
+        if not self._buckets:
+            self._buckets.append([key])
+            self._maxes.append(key)
+            self._len += 1
+            return
+
+        position = bisect_left(self._maxes, key)
+        if position == len(self._maxes):
+            position -= 1
+            self._buckets[position].append(key)
+            self._maxes[position] = key
+        else:
+            insort(self._buckets[position], key)
+        self._len += 1
+
+        bucket = self._buckets[position]
+        if len(bucket) > 2 * self._load:
+            tail = bucket[self._load:]
+            del bucket[self._load:]
+            self._buckets.insert(position + 1, tail)
+            self._maxes[position] = bucket[-1]
+            self._maxes.insert(position + 1, tail[-1])
+
+    def update(self, keys: Iterable) -> None:
+        """Add many keys at once, cheaper than calling ``add`` for each of them."""
+        items = sorted(chain(self, keys))
+        self._buckets = [items[i:i + self._load] for i in range(0, len(items), self._load)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._len = len(items)
+
+    def discard(self, key) -> bool:
+        position = bisect_left(self._maxes, key)
+        if position == len(self._maxes):
+            return False
+        bucket = self._buckets[position]
+        index = bisect_left(bucket, key)
+        if index == len(bucket) or bucket[index] != key:
+            return False
+
+        del bucket[index]
+        self._len -= 1
+        if bucket:
+            self._maxes[position] = bucket[-1]
+        else:
+            del self._buckets[position]
+            del self._maxes[position]
+        return True
+
+    def iter_after(self, value: Any, key: Optional[Callable] = None) -> Iterator:
+        """Yield keys in order, starting with the first one whose ``key(item)`` is greater than ``value``."""
+        position = bisect_right(self._maxes, value, key=key)
+        if position == len(self._maxes):
+            return iter(())
+        bucket = self._buckets[position]
+        index = bisect_right(bucket, value, key=key)
+        return chain(
+            islice(bucket, index, None),
+            chain.from_iterable(islice(self._buckets, position + 1, None)),
+        )
@@ -0,0 +1,56 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Iterable
+
+from app.lines.metrics import Counter
+
+
+LOCK_WAITS = Counter("line_event_lock_waits_total", "Mutations that waited for another one on the same event")
+
+
+class _Lock:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class KeyedLocks:
+    """One asyncio lock per key, created on demand and dropped once nobody holds or waits for it.
+
+    Holders of different keys never wait for each other. Several keys are
+    acquired in sorted order, so two holders of overlapping sets cannot deadlock.
+    """
+
+    def __init__(self):
+        self._locks: Dict[str, _Lock] = {}
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def hold(self, keys: Iterable[str]) -> AsyncIterator[None]:
+        entries = []
+        for key in sorted(set(keys)):
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = _Lock()
+            entry.users += 1
+            entries.append((key, entry))
+
+        acquired = []
+        try:
+            for _, entry in entries:
+                if entry.lock.locked():
+                    LOCK_WAITS.inc()
+                await entry.lock.acquire()
+                acquired.append(entry)
+            yield
+        finally:
+            for entry in reversed(acquired):
+                entry.lock.release()
+            for key, entry in entries:
+                entry.users -= 1
+                if not entry.users:
+                    del self._locks[key]
@@ -1,6 +1,6 @@
 import time
 import enum
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, Field, field_validator
 
 
@@ -8,6 +8,7 @@ class EventState(enum.Enum):
     NEW = 1
     FINISHED_WIN = 2
     FINISHED_LOSE = 3
+    CLOSED = 4
 
 
 class BaseEvent(BaseModel):
@@ -37,6 +38,9 @@ class Event(BaseEvent):
     coefficient: float = Field(..., gt=0)
     deadline: int = Field(...)
     state: EventState = Field(...)
+    version: int = Field(0)
+    # Set by the repository when the event reaches a finished state.
+    finished_at: Optional[int] = Field(None)
 
 
 class CreateEvent(BaseEvent):
@@ -46,4 +50,23 @@ class CreateEvent(BaseEvent):
 
 
 class UpdateEvent(BaseEvent):
-    pass
+    @field_validator("state")
+    @classmethod
+    def validate_state(cls, value):
+        if value == EventState.CLOSED:
+            raise ValueError("Events are closed when their deadline passes, not by an update")
+        return value
+
+
+class BatchUpdateEvent(UpdateEvent):
+    event_id: str = Field(...)
+    # Apply the update only if the event is still at this version.
+    version: Optional[int] = Field(None)
+
+
+class EventChanges(BaseModel):
+    version: int
+    snapshot: bool
+    events: List[Event]
+    # Versions only compare within one book.
+    book_id: str
@@ -0,0 +1,169 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Iterable, List, Optional, Tuple
+
+from app.lines.metrics import Gauge
+from app.lines.models import EventState
+from app.lines.publisher import publisher
+
+
+OUTBOX_SIZE = int(os.getenv("LINE_OUTBOX_SIZE", "10000"))
+OUTBOX_BATCH_SIZE = int(os.getenv("LINE_OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_RETRY_DELAY = float(os.getenv("LINE_OUTBOX_RETRY_DELAY", "0.5"))
+OUTBOX_MAX_RETRY_DELAY = float(os.getenv("LINE_OUTBOX_MAX_RETRY_DELAY", "30"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("LINE_OUTBOX_MAX_ATTEMPTS", "20"))
+
+logger = logging.getLogger(__name__)
+
+
+class Outbox:
+    """Bounded in-process queue of notifications drained by a background dispatcher.
+
+    Messages are published in the order they were added: a batch that fails is
+    retried before anything queued after it, so notifications of an event are
+    never reordered. A batch still failing after ``max_attempts`` tries is
+    logged and dropped, so one bad batch cannot stall the queue for good.
+    """
+
+    def __init__(
+        self,
+        publish_batch: Callable[[List[dict], str], Awaitable[None]],
+        max_size: int = OUTBOX_SIZE,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        retry_delay: float = OUTBOX_RETRY_DELAY,
+        max_retry_delay: float = OUTBOX_MAX_RETRY_DELAY,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+    ):
+        self.publish_batch = publish_batch
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_attempts = max_attempts
+        # (routing_key, body, enqueued_at)
+        self._messages: Deque[Tuple[str, dict, float]] = deque()
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.dispatched_count = 0
+        self.failed_attempts = 0
+        self.dropped_count = 0
+        self.last_dispatch_lag = 0.0
+
+    @property
+    def depth(self) -> int:
+        return len(self._messages)
+
+    @property
+    def lag(self) -> float:
+        """Seconds the oldest pending message has been waiting."""
+        if not self._messages:
+            return 0.0
+        return time.monotonic() - self._messages[0][2]
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        # Events and the dispatcher belong to the loop they were created in.
+        self._loop = loop
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._task = asyncio.create_task(self._dispatch())
+
+    async def stop(self, timeout: float = 5) -> None:
+        if self._task is None:
+            return
+        deadline = time.monotonic() + timeout
+        while self._messages and time.monotonic() < deadline and not self._task.done():
+            await asyncio.sleep(0.01)
+        if self._messages:
+            logger.warning("Outbox stopped with %d undelivered messages", len(self._messages))
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def put(self, routing_key: str, body: dict) -> None:
+        self.start()
+        while len(self._messages) >= self.max_size:
+            self._not_full.clear()
+            await self._not_full.wait()
+        self._messages.append((routing_key, body, time.monotonic()))
+        self._not_empty.set()
+
+    async def put_state_changes(self, statuses: Iterable[Tuple[str, EventState]], routing_key: str = "events") -> None:
+        for event_id, status in statuses:
+            await self.put(routing_key, {"event_id": event_id, "status": status.value})
+
+    def _next_batch(self) -> Tuple[str, List[dict]]:
+        routing_key = self._messages[0][0]
+        bodies = []
+        for message_routing_key, body, _ in self._messages:
+            if message_routing_key != routing_key or len(bodies) == self.batch_size:
+                break
+            bodies.append(body)
+        return routing_key, bodies
+
+    def _pop(self, count: int) -> None:
+        for _ in range(count):
+            self._messages.popleft()
+        self._not_full.set()
+
+    async def _dispatch(self) -> None:
+        retry_delay = self.retry_delay
+        attempts = 0
+        while True:
+            if not self._messages:
+                self._not_empty.clear()
+                await self._not_empty.wait()
+                continue
+
+            routing_key, bodies = self._next_batch()
+            try:
+                await self.publish_batch(bodies, routing_key)
+            except Exception as e:
+                self.failed_attempts += 1
+                attempts += 1
+                if attempts >= self.max_attempts:
+                    logger.error(
+                        "Dropped %d messages to %s after %d failed attempts: %s, messages: %s",
+                        len(bodies), routing_key, attempts, e, bodies,
+                    )
+                    self._pop(len(bodies))
+                    self.dropped_count += len(bodies)
+                    retry_delay = self.retry_delay
+                    attempts = 0
+                    continue
+                logger.warning("Failed to publish %d messages, retrying in %.1fs: %s", len(bodies), retry_delay, e)
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, self.max_retry_delay)
+                continue
+
+            retry_delay = self.retry_delay
+            attempts = 0
+            self.last_dispatch_lag = time.monotonic() - self._messages[len(bodies) - 1][2]
+            self._pop(len(bodies))
+            self.dispatched_count += len(bodies)
+
+
+outbox = Outbox(publisher.publish_batch)
+
+Gauge("line_outbox_depth", "Notifications waiting to be published", lambda: outbox.depth)
+Gauge("line_outbox_lag_seconds", "Age of the oldest pending notification", lambda: outbox.lag)
+Gauge(
+    "line_outbox_dispatch_lag_seconds", "Queueing time of the last published notification",
+    lambda: outbox.last_dispatch_lag,
+)
+Gauge("line_outbox_dispatched_total", "Notifications published", lambda: outbox.dispatched_count, kind="counter")
+Gauge("line_outbox_failed_attempts_total", "Failed publish attempts", lambda: outbox.failed_attempts, kind="counter")
+Gauge(
+    "line_outbox_dropped_total", "Notifications dropped after too many failed attempts",
+    lambda: outbox.dropped_count, kind="counter",
+)
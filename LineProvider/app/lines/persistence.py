@@ -0,0 +1,228 @@
+import os
+import mmap
+import time
+import uuid
+import struct
+import asyncio
+import logging
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+from app.lines.data import EventRepository
+from app.lines.models import Event
+
+
+DATA_DIR = os.getenv("LINE_DATA_DIR")
+SNAPSHOT_INTERVAL = float(os.getenv("LINE_SNAPSHOT_INTERVAL", "300"))
+JOURNAL_FSYNC = os.getenv("LINE_JOURNAL_FSYNC", "0") == "1"
+
+# Bumped with the record layout; segments of another format are named differently and never read.
+SNAPSHOT_MAGIC = b"LINESNP2"
+SEGMENT_SUFFIX = ".v2.log"
+# magic, repository version, first journal segment to replay, number of records
+SNAPSHOT_HEADER = struct.Struct("<8sQQQ")
+# version, deadline, coefficient, state, finished_at (0 when unfinished), length of the utf-8 event_id that follows
+RECORD = struct.Struct("<QqdBqH")
+SNAPSHOT_CHUNK_SIZE = 10000
+
+logger = logging.getLogger(__name__)
+
+Row = Tuple[int, str, float, int, int, Optional[int]]
+
+
+def encode_row(
+    version: int, event_id: str, coefficient: float, deadline: int, state: int, finished_at: Optional[int],
+) -> bytes:
+    encoded_id = event_id.encode()
+    return RECORD.pack(version, deadline, coefficient, state, finished_at or 0, len(encoded_id)) + encoded_id
+
+
+def encode_event(event: Event) -> bytes:
+    return encode_row(
+        event.version, event.event_id, event.coefficient, event.deadline, event.state.value, event.finished_at,
+    )
+
+
+def iter_rows(buffer, offset: int = 0, count: Optional[int] = None) -> Iterator[Row]:
+    """Decode (version, event_id, coefficient, deadline, state, finished_at) rows, stopping at a torn tail record."""
+    unpack_from = RECORD.unpack_from
+    record_size = RECORD.size
+    end = len(buffer)
+    decoded = 0
+    while offset + record_size <= end and (count is None or decoded < count):
+        version, deadline, coefficient, state, finished_at, id_length = unpack_from(buffer, offset)
+        offset += record_size
+        if offset + id_length > end:
+            return
+        event_id = str(buffer[offset:offset + id_length], "utf-8")
+        offset += id_length
+        decoded += 1
+        yield version, event_id, coefficient, deadline, state, finished_at or None
+
+
+def decode_rows(buffer) -> Tuple[List[Row], int]:
+    """Decode the complete rows of ``buffer`` and return them with the number of bytes they span."""
+    rows = []
+    offset = 0
+    for row in iter_rows(buffer):
+        offset += RECORD.size + len(row[1].encode())
+        rows.append(row)
+    return rows, offset
+
+
+def read_file_rows(path: str) -> Iterator[Row]:
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield from iter_rows(buffer)
+
+
+class EventJournal:
+    """Append-only log of repository mutations with periodic compact snapshots.
+
+    The log is split in numbered segments. A snapshot records the first segment
+    written after it was started, so a restore loads the snapshot and replays
+    that segment and the following ones; older segments are deleted.
+    """
+
+    def __init__(self, directory: str, fsync: bool = JOURNAL_FSYNC):
+        self.directory = directory
+        self.fsync = fsync
+        self.segment = 0
+        self._file: Optional[BinaryIO] = None
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.directory, "snapshot.bin")
+
+    def segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"journal-{segment:08d}{SEGMENT_SUFFIX}")
+
+    def segments(self) -> List[int]:
+        return sorted(
+            int(name[len("journal-"):-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.startswith("journal-") and name.endswith(SEGMENT_SUFFIX)
+        )
+
+    @property
+    def book_id_path(self) -> str:
+        return os.path.join(self.directory, "book.id")
+
+    def read_book_id(self) -> str:
+        """Return the ID of the book kept in this directory, created by whichever process asks first."""
+        os.makedirs(self.directory, exist_ok=True)
+        if not os.path.exists(self.book_id_path):
+            temporary_path = f"{self.book_id_path}.{os.getpid()}.tmp"
+            with open(temporary_path, "w") as file:
+                file.write(uuid.uuid4().hex)
+            try:
+                # Fails if another process linked its ID first.
+                os.link(temporary_path, self.book_id_path)
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(temporary_path)
+        with open(self.book_id_path) as file:
+            return file.read().strip()
+
+    def attach(self, repository: EventRepository) -> int:
+        """Restore ``repository`` from disk and journal its mutations from now on."""
+        os.makedirs(self.directory, exist_ok=True)
+        repository.book_id = self.read_book_id()
+        started = time.perf_counter()
+        restored = repository.restore(self.read_rows())
+        logger.info("Restored %d events in %.2fs", restored, time.perf_counter() - started)
+
+        segments = self.segments()
+        self._open_segment(segments[-1] + 1 if segments else 1)
+        repository.subscribe(self.append)
+        return restored
+
+    def read_rows(self) -> Iterator[Row]:
+        first_segment = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "rb") as file, \
+                    mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                magic, _, first_segment, count = SNAPSHOT_HEADER.unpack_from(buffer)
+                if magic != SNAPSHOT_MAGIC:
+                    raise ValueError(f"{self.snapshot_path} is not a line snapshot")
+                yield from iter_rows(buffer, SNAPSHOT_HEADER.size, count)
+
+        for segment in self.segments():
+            if segment >= first_segment:
+                yield from read_file_rows(self.segment_path(segment))
+
+    def append(self, event: Event) -> None:
+        self._file.write(encode_event(event))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    async def snapshot(self, repository: EventRepository) -> None:
+        # Mutations made while the rows are being copied also land in the new
+        # segment, which is replayed on top of the snapshot.
+        first_segment = self.segment + 1
+        self._open_segment(first_segment)
+        await self.write_snapshot(repository, first_segment)
+
+    async def write_snapshot(self, repository: EventRepository, first_segment: int) -> None:
+        """Write the rows of ``repository`` as a snapshot that is replayed from ``first_segment`` on."""
+        version = repository.version
+
+        store = repository.events
+        event_ids = list(store)
+        chunks = []
+        count = 0
+        for start in range(0, len(event_ids), SNAPSHOT_CHUNK_SIZE):
+            chunk = bytearray()
+            for event_id in event_ids[start:start + SNAPSHOT_CHUNK_SIZE]:
+                if event_id in store:
+                    event_id, coefficient, deadline, state, row_version, finished_at = store.dump_row(
+                        store.row(event_id)
+                    )
+                    chunk += encode_row(row_version, event_id, coefficient, deadline, state, finished_at)
+                    count += 1
+            chunks.append(chunk)
+            await asyncio.sleep(0)
+
+        header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, version, first_segment, count)
+        await asyncio.to_thread(self._write_snapshot, header, chunks, first_segment)
+
+    async def run_snapshots(self, repository: EventRepository, interval: float = SNAPSHOT_INTERVAL) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.snapshot(repository)
+            except Exception as e:
+                logger.error("Snapshot failed: %s", e)
+
+    def _open_segment(self, segment: int) -> None:
+        self.close()
+        self.segment = segment
+        self._file = open(self.segment_path(segment), "ab")
+
+    def _write_snapshot(self, header: bytes, chunks: List[bytearray], first_segment: int) -> None:
+        temporary_path = f"{self.snapshot_path}.{first_segment}.tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(header)
+            for chunk in chunks:
+                file.write(chunk)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, self.snapshot_path)
+
+        for segment in self.segments():
+            if segment < first_segment:
+                os.remove(self.segment_path(segment))
+
+
+def create_journal() -> Optional[EventJournal]:
+    if not DATA_DIR:
+        return None
+    return EventJournal(DATA_DIR)
@@ -1,23 +1,122 @@
 import os
-import json
+import time
+import asyncio
+from typing import List, Optional, Set
+
 import aio_pika
+from aio_pika.abc import AbstractChannel, AbstractExchange, AbstractRobustConnection
+from aio_pika.pool import Pool
 
-from app.lines.models import EventState
+from app.lines.metrics import Counter, Histogram
+from app.lines.serialization import dumps
 
 
 RABBITMQ_URL = os.getenv("RABBITMQ_URL")
+CHANNEL_POOL_SIZE = int(os.getenv("RABBITMQ_CHANNEL_POOL_SIZE", "10"))
+PUBLISH_TIMEOUT = float(os.getenv("RABBITMQ_PUBLISH_TIMEOUT", "5"))
+
+PUBLISH_DURATION = Histogram(
+    "line_publish_duration_seconds", "Time to publish a batch and receive its confirms", ("routing_key",),
+)
+PUBLISHED_MESSAGES = Counter("line_published_messages_total", "Messages confirmed by RabbitMQ", ("routing_key",))
+PUBLISH_ERRORS = Counter("line_publish_errors_total", "Batches that failed to publish", ("routing_key",))
+
 
+class EventPublisher:
+    def __init__(self, url: Optional[str], pool_size: int = CHANNEL_POOL_SIZE):
+        self.url = url
+        self.pool_size = pool_size
+        self._connection: Optional[AbstractRobustConnection] = None
+        self._channel_pool: Optional[Pool] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = asyncio.Lock()
+        self._declared_exchanges: Set[str] = set()
 
-async def publish_event(event_id: str, status: EventState):
-    connection = await aio_pika.connect_robust(RABBITMQ_URL)
-    async with connection:
-        channel = await connection.channel()
-        await channel.default_exchange.publish(
-            aio_pika.Message(
-                body=json.dumps({
-                    "event_id": event_id,
-                    "status": status.value,
-                }).encode()
-            ),
-            routing_key="events",
+    @property
+    def is_connected(self) -> bool:
+        return (
+            self._connection is not None
+            and not self._connection.is_closed
+            and self._loop is asyncio.get_running_loop()
         )
+
+    async def connect(self) -> None:
+        if self._loop is not asyncio.get_running_loop():
+            # The connection and the pool are bound to the loop they were created in.
+            self._connection = None
+            self._channel_pool = None
+            self._lock = asyncio.Lock()
+            self._loop = asyncio.get_running_loop()
+
+        async with self._lock:
+            if self.is_connected:
+                return
+            self._connection = await aio_pika.connect_robust(self.url)
+            self._declared_exchanges = set()
+            self._channel_pool = Pool(self._get_channel, max_size=self.pool_size)
+
+    async def close(self) -> None:
+        channel_pool, connection = self._channel_pool, self._connection
+        self._channel_pool = None
+        self._connection = None
+        self._loop = None
+
+        if channel_pool is not None:
+            await channel_pool.close()
+        if connection is not None:
+            await connection.close()
+
+    async def _get_channel(self) -> AbstractChannel:
+        return await self._connection.channel(publisher_confirms=True)
+
+    async def publish(self, body: dict, routing_key: str = "events") -> None:
+        await self.publish_batch([body], routing_key=routing_key)
+
+    async def publish_batch(self, bodies: List[dict], routing_key: str = "events") -> None:
+        await self._publish_batch(bodies, routing_key, None)
+
+    async def publish_fanout(self, bodies: List[dict], exchange: str) -> None:
+        """Publish to a durable fanout exchange, declared on first use: every queue bound to it gets a copy."""
+        await self._publish_batch(bodies, "", exchange)
+
+    async def _publish_batch(self, bodies: List[dict], routing_key: str, exchange_name: Optional[str]) -> None:
+        if not bodies:
+            return
+        labels = (routing_key if exchange_name is None else exchange_name,)
+        started = time.perf_counter()
+        try:
+            if not self.is_connected:
+                await self.connect()
+
+            async with self._channel_pool.acquire() as channel:
+                if channel.is_closed:
+                    await channel.reopen()
+                if exchange_name is None:
+                    exchange = channel.default_exchange
+                else:
+                    exchange = await self._get_fanout_exchange(channel, exchange_name)
+                # Messages are written in order and their confirms are awaited together.
+                headers = {"x-published-at": time.time()}
+                await asyncio.gather(*(
+                    exchange.publish(
+                        aio_pika.Message(body=dumps(body), headers=headers),
+                        routing_key=routing_key,
+                        timeout=PUBLISH_TIMEOUT,
+                    )
+                    for body in bodies
+                ))
+        except Exception:
+            PUBLISH_ERRORS.inc(labels=labels)
+            raise
+        PUBLISH_DURATION.observe(time.perf_counter() - started, labels)
+        PUBLISHED_MESSAGES.inc(len(bodies), labels)
+
+    async def _get_fanout_exchange(self, channel: AbstractChannel, name: str) -> AbstractExchange:
+        if name not in self._declared_exchanges:
+            await channel.declare_exchange(name, aio_pika.ExchangeType.FANOUT, durable=True)
+            self._declared_exchanges.add(name)
+        return await channel.get_exchange(name, ensure=False)
+
+
+publisher = EventPublisher(RABBITMQ_URL)
+
@@ -0,0 +1,118 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Optional
+
+import httpx
+
+from app.lines.data import EventRepository
+from app.lines.serialization import loads
+
+
+REPLICA_OF = os.getenv("LINE_REPLICA_OF")
+REPLICA_POLL_INTERVAL = float(os.getenv("LINE_REPLICA_POLL_INTERVAL", "0.2"))
+REPLICA_TIMEOUT = float(os.getenv("LINE_REPLICA_TIMEOUT", "10"))
+
+logger = logging.getLogger(__name__)
+
+
+class Replicator:
+    """Keeps a follower's repository in sync with the primary's change feed.
+
+    The follower polls ``GET /events/?since=<version>`` on the primary and
+    applies the returned events in version order. A feed that no longer reaches
+    back to the follower's version returns the whole book, which is applied the
+    same way, and events missing from it are dropped. The follower adopts the primary's book ID; when the primary
+    answers with another one, it started a new book whose versions say nothing
+    about ours, so the follower starts over from a snapshot.
+    """
+
+    def __init__(self, primary_url: str, repository: EventRepository, poll_interval: float = REPLICA_POLL_INTERVAL):
+        self.primary_url = primary_url
+        self.repository = repository
+        self.poll_interval = poll_interval
+        self.primary_version = 0
+        self.applied_count = 0
+        self.last_error: Optional[str] = None
+        self._caught_up_at: Optional[float] = None
+
+    @property
+    def lag_versions(self) -> int:
+        return max(self.primary_version - self.repository.version, 0)
+
+    @property
+    def lag_seconds(self) -> Optional[float]:
+        """Seconds since the follower last confirmed it had every change of the primary."""
+        if self._caught_up_at is None:
+            return None
+        return time.monotonic() - self._caught_up_at
+
+    def status(self) -> dict:
+        return {
+            "role": "follower",
+            "primary": self.primary_url,
+            "version": self.repository.version,
+            "primary_version": self.primary_version,
+            "lag_versions": self.lag_versions,
+            "lag_seconds": self.lag_seconds,
+            "applied_count": self.applied_count,
+            "last_error": self.last_error,
+        }
+
+    async def sync(self, client: httpx.AsyncClient) -> int:
+        """Fetch and apply the changes made on the primary since our version."""
+        polled_at = time.monotonic()
+        changes = await self.fetch_changes(client)
+        if changes["book_id"] != self.repository.book_id:
+            if self.repository.version:
+                logger.warning("Primary serves another book than ours: reloading it")
+                self.repository.reset()
+                changes = await self.fetch_changes(client)
+            self.repository.book_id = changes["book_id"]
+
+        if changes["snapshot"]:
+            # The snapshot holds every event of the primary: ours that it lacks were evicted there.
+            kept = {event["event_id"] for event in changes["events"]}
+            self.repository.evict([
+                (event_id, self.repository.events[event_id].version)
+                for event_id in list(self.repository.events) if event_id not in kept
+            ])
+        applied = self.repository.apply_rows(
+            (
+                event["version"], event["event_id"], event["coefficient"], event["deadline"], event["state"],
+                event.get("finished_at"),
+            )
+            for event in changes["events"]
+        )
+        self.primary_version = changes["version"]
+        self.applied_count += applied
+        if self.repository.version >= self.primary_version:
+            self._caught_up_at = polled_at
+        return applied
+
+    async def fetch_changes(self, client: httpx.AsyncClient) -> dict:
+        response = await client.get(self.primary_url, params={"since": self.repository.version})
+        response.raise_for_status()
+        return loads(response.content)
+
+    async def run(self) -> None:
+        async with httpx.AsyncClient(timeout=REPLICA_TIMEOUT) as client:
+            while True:
+                try:
+                    applied = await self.sync(client)
+                    self.last_error = None
+                except Exception as e:
+                    applied = 0
+                    if self.last_error is None:
+                        logger.warning("Replication from %s failed: %s", self.primary_url, e)
+                    self.last_error = str(e)
+                # Keep polling without a pause while the primary has more changes for us.
+                if not applied:
+                    await asyncio.sleep(self.poll_interval)
+
+
+def create_replicator(repository: EventRepository) -> Optional[Replicator]:
+    if not REPLICA_OF:
+        return None
+    return Replicator(REPLICA_OF, repository)
@@ -1,12 +1,72 @@
-from fastapi import APIRouter, HTTPException
-from app.lines.models import CreateEvent, UpdateEvent, Event
-from app.lines.services import create_event, process_event, get_event, get_active_events
+from contextlib import aclosing
+from typing import AsyncIterator, List, Optional, Union
+
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from app.lines.data import VersionConflict
+from app.lines.models import CreateEvent, UpdateEvent, BatchUpdateEvent, Event, EventChanges
+from app.lines.serialization import events_adapter
+from app.lines.services import (
+    BatchError,
+    create_event,
+    create_events,
+    process_event,
+    process_events,
+    get_event,
+    get_events,
+    get_active_events_body,
+    query_events,
+    get_archive_stats,
+    get_event_changes,
+    get_replication_status,
+    is_read_only,
+    stream_event_changes,
+)
 
 
 router = APIRouter()
 
+BATCH_SIZE_LIMIT = 1000
+DEFAULT_PAGE_SIZE = 100
+PAGE_SIZE_LIMIT = 1000
+
+
+def event_etag(event: Event) -> str:
+    return f'"{event.version}"'
+
+
+def parse_etags(header: str) -> List[str]:
+    """Split an If-Match or If-None-Match header into its entity tags, weak ones (``W/"3"``) without the ``W/``."""
+    tags = []
+    for tag in header.split(","):
+        tag = tag.strip()
+        tags.append(tag[2:] if tag.startswith("W/") else tag)
+    return tags
+
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """Return the version an If-Match header expects, None when it accepts any.
+
+    ``*`` skips the version check; a weak ETag counts as its version.
+    """
+    if if_match is None:
+        return None
+    tags = parse_etags(if_match)
+    if "*" in tags:
+        return None
+    try:
+        [etag] = tags
+        return int(etag.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be the ETag of the event")
+
 
-@router.post("/", response_model=Event)
+def require_primary() -> None:
+    if is_read_only():
+        raise HTTPException(status_code=403, detail="This replica is read-only, send writes to the primary")
+
+
+@router.post("/", response_model=Event, dependencies=[Depends(require_primary)])
 async def create_event_endpoint(event_request: CreateEvent):
     try:
         event = await create_event(event_request)
@@ -15,23 +75,158 @@ async def create_event_endpoint(event_request: CreateEvent):
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.put("/{event_id}", response_model=Event)
-async def update_event_endpoint(event_id: str, updates: UpdateEvent):
+@router.post("/batch", response_model=List[Event], dependencies=[Depends(require_primary)])
+async def create_events_endpoint(
+    events_request: List[CreateEvent] = Body(..., min_length=1, max_length=BATCH_SIZE_LIMIT),
+):
     try:
-        updated_event = await process_event(event_id, updates)
+        events = await create_events(events_request)
+        return Response(content=events_adapter.dump_json(events), media_type="application/json")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.patch("/batch", response_model=List[Event], dependencies=[Depends(require_primary)])
+async def update_events_endpoint(
+    updates: List[BatchUpdateEvent] = Body(..., min_length=1, max_length=BATCH_SIZE_LIMIT),
+):
+    try:
+        events = await process_events(updates)
+        return Response(content=events_adapter.dump_json(events), media_type="application/json")
+    except BatchError as e:
+        raise HTTPException(status_code=400, detail=e.errors)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/lookup", response_model=List[Event])
+async def lookup_events_endpoint(event_ids: List[str] = Body(..., min_length=1, max_length=BATCH_SIZE_LIMIT)):
+    events = await get_events(event_ids)
+    return Response(content=events_adapter.dump_json(events), media_type="application/json")
+
+
+@router.put("/{event_id}", response_model=Event, dependencies=[Depends(require_primary)])
+async def update_event_endpoint(
+    event_id: str,
+    updates: UpdateEvent,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+):
+    try:
+        updated_event = await process_event(event_id, updates, expected_version=parse_if_match(if_match))
+        response.headers["ETag"] = event_etag(updated_event)
         return updated_event
+    except VersionConflict as e:
+        raise HTTPException(status_code=412, detail=str(e), headers={"ETag": f'"{e.version}"'})
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.get("/stream")
+async def stream_events_endpoint(
+    since: Optional[int] = Query(None, ge=0),
+    last_event_id: Optional[int] = Header(None, ge=0),
+):
+    if since is None:
+        since = last_event_id
+    return StreamingResponse(
+        sse_stream(stream_event_changes(since)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/ws")
+async def events_websocket(websocket: WebSocket, since: Optional[int] = Query(None, ge=0)):
+    await websocket.accept()
+    try:
+        async with aclosing(stream_event_changes(since)) as messages:
+            async for message in messages:
+                if message is not None:
+                    await websocket.send_text(message[1])
+    except WebSocketDisconnect:
+        return
+    # The subscriber was dropped for falling behind.
+    await websocket.close(code=1013)
+
+
+async def sse_stream(messages: AsyncIterator) -> AsyncIterator[str]:
+    async for message in messages:
+        if message is None:
+            yield ": keepalive\n\n"
+        else:
+            version, data = message
+            yield f"id: {version}\nevent: event\ndata: {data}\n\n"
+
+
+@router.get("/archive")
+async def get_archive_stats_endpoint():
+    return get_archive_stats()
+
+
+@router.get("/replication")
+async def get_replication_status_endpoint():
+    return get_replication_status()
+
+
 @router.get("/{event_id}")
-async def get_event_endpoint(event_id: str):
+async def get_event_endpoint(event_id: str, response: Response):
     try:
-        return await get_event(event_id)
+        event = await get_event(event_id)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    response.headers["ETag"] = event_etag(event)
+    return event
+
+
+@router.get("/", response_model=Union[List[Event], EventChanges])
+async def get_active_events_endpoint(
+    since: Optional[int] = Query(None, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_LIMIT),
+    cursor: Optional[str] = Query(None),
+    deadline_from: Optional[int] = Query(None),
+    deadline_to: Optional[int] = Query(None),
+    state: Optional[List[int]] = Query(None),
+    min_coefficient: Optional[float] = Query(None),
+    max_coefficient: Optional[float] = Query(None),
+    include_expired: Optional[bool] = Query(None),
+    finished_from: Optional[int] = Query(None),
+    finished_to: Optional[int] = Query(None),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+):
+    if since is not None:
+        changes = await get_event_changes(since)
+        return Response(content=changes.model_dump_json(), media_type="application/json")
 
+    query = (
+        limit, cursor, deadline_from, deadline_to, state, min_coefficient, max_coefficient,
+        include_expired, finished_from, finished_to,
+    )
+    if any(param is not None for param in query):
+        try:
+            events, next_cursor = await query_events(
+                limit or DEFAULT_PAGE_SIZE,
+                cursor=cursor,
+                deadline_from=deadline_from,
+                deadline_to=deadline_to,
+                states=state,
+                min_coefficient=min_coefficient,
+                max_coefficient=max_coefficient,
+                include_expired=bool(include_expired),
+                finished_from=finished_from,
+                finished_to=finished_to,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return Response(content=events_adapter.dump_json(events), media_type="application/json", headers=headers)
 
-@router.get("/")
-async def get_active_events_endpoint():
-    return await get_active_events()
+    body, etag, gzipped = await get_active_events_body(accept_gzip="gzip" in (accept_encoding or ""))
+    headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+    # If-None-Match compares weakly: W/"<etag>" matches as well.
+    if if_none_match is not None and {"*", etag} & set(parse_etags(if_none_match)):
+        return Response(status_code=304, headers=headers)
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,104 @@
+import os
+import time
+import asyncio
+import logging
+from operator import itemgetter
+from typing import Awaitable, Callable, List, Optional
+
+from app.lines.data import EventRepository
+from app.lines.index import SortedIndex
+from app.lines.metrics import Counter
+from app.lines.models import Event, EventState
+
+
+CLOSE_EXPIRED_EVENTS = os.getenv("LINE_CLOSE_EXPIRED_EVENTS", "1") == "1"
+CLOSE_BATCH_SIZE = int(os.getenv("LINE_CLOSE_BATCH_SIZE", "1000"))
+CLOSE_RETRY_DELAY = 1
+
+CLOSED_EVENTS = Counter("line_closed_events_total", "Events closed by the deadline scheduler")
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineScheduler:
+    """Closes open events when their deadline passes, from a single task.
+
+    There are no timers per event: the task walks the repository's index of
+    open events from the last deadline it handled up to now, then sleeps until
+    the next deadline in the index. Mutations that bring a deadline forward
+    wake it up early.
+    """
+
+    def __init__(
+        self,
+        repository: EventRepository,
+        close_events: Callable[[List[str]], Awaitable[List[Event]]],
+        batch_size: int = CLOSE_BATCH_SIZE,
+    ):
+        self.repository = repository
+        self.close_events = close_events
+        self.batch_size = batch_size
+        # Deadlines up to this one have been handled, None before the first run.
+        self.closed_until: Optional[int] = None
+        self._wake_at = float("inf")
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def notify(self, event: Event) -> None:
+        if event.state == EventState.NEW and event.deadline < self._wake_at and self._wakeup is not None:
+            self._wakeup.set()
+
+    @property
+    def open_events(self) -> SortedIndex:
+        return self.repository.state_indexes[EventState.NEW.value]
+
+    def due_event_ids(self, now: int) -> List[str]:
+        """Return the open events whose deadline passed since the last run."""
+        if self.closed_until is None:
+            entries = iter(self.open_events)
+        else:
+            entries = self.open_events.iter_after(self.closed_until, key=itemgetter(0))
+
+        due = []
+        for deadline, event_id, _ in entries:
+            if deadline > now:
+                break
+            due.append(event_id)
+        return due
+
+    def next_deadline(self, now: int) -> Optional[int]:
+        for deadline, _, _ in self.open_events.iter_after(now, key=itemgetter(0)):
+            return deadline
+        return None
+
+    async def close_due_events(self, now: int) -> int:
+        due = self.due_event_ids(now)
+        closed = 0
+        for start in range(0, len(due), self.batch_size):
+            closed += len(await self.close_events(due[start:start + self.batch_size]))
+            # A burst of deadlines must not hold up the requests in between.
+            await asyncio.sleep(0)
+        self.closed_until = now
+        CLOSED_EVENTS.inc(closed)
+        return closed
+
+    async def run(self) -> None:
+        self._wakeup = asyncio.Event()
+        while True:
+            now = int(time.time())
+            try:
+                await self.close_due_events(now)
+                failed = False
+            except Exception as e:
+                logger.error("Closing expired events failed: %s", e)
+                failed = True
+
+            next_deadline = self.next_deadline(now)
+            self._wake_at = float("inf") if next_deadline is None else next_deadline
+            self._wakeup.clear()
+            timeout = None if next_deadline is None else max(next_deadline - time.time(), 0)
+            if failed:
+                timeout = CLOSE_RETRY_DELAY if timeout is None else min(timeout, CLOSE_RETRY_DELAY)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,36 @@
+import os
+import json
+from typing import Any, List, Type
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+from app.lines.models import Event
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Opt-in: orjson for AMQP bodies and as the default response class.
+FAST_JSON = os.getenv("FAST_JSON", "0") == "1" and orjson is not None
+
+# Encodes event lists straight to JSON bytes in pydantic-core, skipping jsonable_encoder.
+events_adapter = TypeAdapter(List[Event])
+
+
+def dumps(value: Any) -> bytes:
+    if FAST_JSON:
+        return orjson.dumps(value)
+    return json.dumps(value).encode()
+
+
+def loads(data: bytes) -> Any:
+    if FAST_JSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def response_class() -> Type[JSONResponse]:
+    return ORJSONResponse if FAST_JSON else JSONResponse
@@ -1,57 +1,323 @@
 import time
 import uuid
+import base64
+import binascii
+from contextlib import nullcontext
+from typing import AsyncIterator, List, Optional, Tuple
 
-from app.lines.data import EventRepository
-from app.lines.models import CreateEvent, UpdateEvent, Event
-from app.lines.publisher import publish_event
+from app.lines.archive import EventArchiver, create_archive
+from app.lines.broadcast import EventBroadcaster, event_messages
+from app.lines.cache import ActiveEventsCache
+from app.lines.data import FINISHED_STATES, EventRepository, VersionConflict
+from app.lines.feed import FEED_EXCHANGE, LineFeed
+from app.lines.locks import KeyedLocks
+from app.lines.metrics import Gauge
+from app.lines.models import CreateEvent, UpdateEvent, BatchUpdateEvent, Event, EventChanges, EventState
+from app.lines.outbox import outbox
+from app.lines.persistence import create_journal
+from app.lines.publisher import publisher
+from app.lines.replication import create_replicator
+from app.lines.scheduler import CLOSE_EXPIRED_EVENTS, DeadlineScheduler
+from app.lines.shared import create_shared_book
+from app.lines.store import create_store
 
 
-repository = EventRepository()
+repository = EventRepository(store=create_store())
+event_locks = KeyedLocks()
+broadcaster = EventBroadcaster()
+repository.subscribe(broadcaster.publish)
+journal = create_journal()
+shared_book = create_shared_book(journal)
+replicator = create_replicator(repository)
+if replicator is not None and shared_book is not None:
+    raise RuntimeError("LINE_REPLICA_OF cannot be combined with LINE_SHARED_BOOK")
+active_events_cache = ActiveEventsCache(repository)
+repository.subscribe(active_events_cache.invalidate)
+archive = create_archive()
+archiver = EventArchiver(repository, archive) if archive is not None else None
+# Workers sharing a book each see every change, and followers only repeat the primary's.
+line_feed = None
+if FEED_EXCHANGE and replicator is None and shared_book is None:
+    line_feed = LineFeed(repository, publisher.publish_fanout)
+    repository.subscribe(line_feed.publish)
 
+# Queue of closure notifications, declared and consumed by BetMaker like "events".
+CLOSED_ROUTING_KEY = "events.closed"
 
-async def create_event(event_data: CreateEvent) -> Event:
-    event_id = str(uuid.uuid4())
-    event = Event(
-        event_id=event_id,
+Gauge("line_events", "Events held in the repository", lambda: len(repository.events))
+Gauge("line_repository_version", "Version of the latest mutation", lambda: repository.version)
+Gauge("line_stream_subscribers", "Open SSE and WebSocket subscriptions", lambda: len(broadcaster.subscribers))
+Gauge(
+    "line_stream_dropped_total", "Subscriptions dropped for falling behind",
+    lambda: broadcaster.dropped_count, kind="counter",
+)
+if line_feed is not None:
+    Gauge("line_feed_depth", "Line changes waiting to be published", lambda: line_feed.depth)
+if archive is not None:
+    Gauge("line_archived_events", "Events held in the archive", lambda: archive.count)
+if replicator is not None:
+    Gauge("line_replica_lag_versions", "Versions the follower is behind the primary", lambda: replicator.lag_versions)
+    Gauge("line_replica_lag_seconds", "Seconds since the follower was last caught up", lambda: replicator.lag_seconds)
+
+
+class BatchError(ValueError):
+    def __init__(self, errors: List[dict]):
+        super().__init__("Batch rejected")
+        self.errors = errors
+
+
+def exclusive():
+    """Serialize a mutation with the other workers when the book is shared."""
+    return shared_book.write() if shared_book is not None else nullcontext()
+
+
+def synced() -> None:
+    if shared_book is not None:
+        shared_book.catch_up()
+
+
+async def close_events(event_ids: List[str]) -> List[Event]:
+    """Close the given events that are still open after their deadline and announce it."""
+    async with event_locks.hold(event_ids):
+        current_time = int(time.time())
+        closed = []
+        with exclusive():
+            for event_id in event_ids:
+                event = await repository.get_event(event_id)
+                if event is not None and event.state == EventState.NEW and event.deadline <= current_time:
+                    closed.append(await repository.update_event(event_id, {"state": EventState.CLOSED}))
+        await outbox.put_state_changes(
+            [(event.event_id, EventState.CLOSED) for event in closed], routing_key=CLOSED_ROUTING_KEY,
+        )
+    return closed
+
+
+scheduler = None
+if CLOSE_EXPIRED_EVENTS and replicator is None:
+    scheduler = DeadlineScheduler(repository, close_events)
+    repository.subscribe(scheduler.notify)
+
+
+def build_event(event_data: CreateEvent) -> Event:
+    return Event(
+        event_id=str(uuid.uuid4()),
         coefficient=event_data.coefficient,
         deadline=event_data.deadline,
         state=event_data.state,
     )
-    await repository.create_event(event)
+
+
+async def create_event(event_data: CreateEvent) -> Event:
+    event = build_event(event_data)
+    with exclusive():
+        await repository.create_event(event)
     return event
 
 
-async def process_event(event_id: str, updates: UpdateEvent) -> Event:
-    event = await get_event(event_id)
-    updates_dict = updates.model_dump(exclude_unset=True)
+async def create_events(events_data: List[CreateEvent]) -> List[Event]:
+    events = [build_event(event_data) for event_data in events_data]
+    with exclusive():
+        await repository.create_events(events)
+    return events
 
-    if event.state != updates.state:
-        await publish_event(
-            event_id=event_id,
-            status=updates.state,
-        )
 
-    await update_event(event, updates_dict)
-    return event
+def is_settlement(previous_state: EventState, state: Optional[EventState]) -> bool:
+    """Only a change to a finished state settles bets, so only those are sent to the events queue."""
+    return state is not None and state != previous_state and state.value in FINISHED_STATES
+
+
+async def process_event(event_id: str, updates: UpdateEvent, expected_version: Optional[int] = None) -> Event:
+    # The event lock also covers queueing the notification, so the state changes
+    # of one event reach the outbox in the order they were made.
+    async with event_locks.hold([event_id]):
+        with exclusive():
+            event = await get_live_event(event_id)
+            updates_dict = updates.model_dump(exclude_unset=True)
+            previous_state = event.state
+            updated_event = await update_event(event, updates_dict, expected_version)
+
+        if is_settlement(previous_state, updates.state):
+            await outbox.put_state_changes([(event_id, updates.state)])
+    return updated_event
+
+
+async def process_events(batch: List[BatchUpdateEvent]) -> List[Event]:
+    async with event_locks.hold(item.event_id for item in batch):
+        with exclusive():
+            current_time = int(time.time())
+            errors = []
+            updates = []
+            seen = set()
+
+            for index, item in enumerate(batch):
+                try:
+                    if item.event_id in seen:
+                        raise ValueError("Duplicate event_id in batch")
+                    seen.add(item.event_id)
+                    event = await get_live_event(item.event_id)
+                    if item.version is not None and event.version != item.version:
+                        raise VersionConflict(item.event_id, item.version, event.version)
+                    updates_dict = item.model_dump(exclude_unset=True, exclude={"event_id", "version"})
+                    validate_update(event, updates_dict, current_time)
+                    updates.append((event, updates_dict))
+                except ValueError as e:
+                    errors.append({"index": index, "event_id": item.event_id, "error": str(e)})
+
+            if errors:
+                raise BatchError(errors)
+
+            state_changes = [
+                (event.event_id, updates_dict["state"])
+                for event, updates_dict in updates
+                if is_settlement(event.state, updates_dict.get("state"))
+            ]
+            updated_events = await repository.update_events(
+                [(event.event_id, updates_dict) for event, updates_dict in updates]
+            )
+
+        await outbox.put_state_changes(state_changes)
+    return updated_events
+
 
+async def update_event(event: Event, updates: dict, expected_version: Optional[int] = None) -> Event:
+    validate_update(event, updates, int(time.time()))
+    return await repository.update_event(event.event_id, updates, expected_version)
 
-async def update_event(event: Event, updates: dict) -> None:
-    current_time = int(time.time())
 
+def validate_update(event: Event, updates: dict, current_time: int) -> None:
     if "deadline" not in updates and event.deadline <= current_time:
         raise ValueError("Current deadline has passed. A new deadline must be provided explicitly.")
     elif "deadline" in updates and updates["deadline"] < event.deadline:
         raise ValueError("A new deadline must be equal or greater than the previous one.")
 
-    await repository.update_event(event.event_id, updates)
-
 
 async def get_event(event_id: str) -> Event:
+    synced()
+    event = await repository.get_event(event_id)
+    if not event and archive is not None:
+        event = archive.get(event_id)
+    if not event:
+        raise ValueError("Event not found")
+    return event
+
+
+async def get_live_event(event_id: str) -> Event:
+    """Return an event held in memory, the only ones that can be updated."""
+    synced()
     event = await repository.get_event(event_id)
     if not event:
+        if archive is not None and event_id in archive:
+            raise ValueError("Event is archived and can no longer be updated")
         raise ValueError("Event not found")
     return event
 
 
+async def get_events(event_ids: List[str]) -> List[Event]:
+    synced()
+    event_ids = list(dict.fromkeys(event_ids))
+    events = await repository.get_events(event_ids)
+    if archive is None or len(events) == len(event_ids):
+        return events
+    found = {event.event_id: event for event in events}
+    found.update(archive.get_many([event_id for event_id in event_ids if event_id not in found]))
+    return [found[event_id] for event_id in event_ids if event_id in found]
+
+
 async def get_active_events():
+    synced()
     return await repository.get_active_events(current_time=int(time.time()))
+
+
+async def get_active_events_body(accept_gzip: bool = False) -> Tuple[bytes, str, bool]:
+    synced()
+    return await active_events_cache.get(int(time.time()), accept_gzip)
+
+
+def encode_cursor(key: Tuple[int, str]) -> str:
+    return base64.urlsafe_b64encode(f"{key[0]}:{key[1]}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[int, str]:
+    try:
+        deadline, event_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":", 1)
+        return int(deadline), event_id
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+async def query_events(
+    limit: int,
+    cursor: Optional[str] = None,
+    deadline_from: Optional[int] = None,
+    deadline_to: Optional[int] = None,
+    states: Optional[List[int]] = None,
+    min_coefficient: Optional[float] = None,
+    max_coefficient: Optional[float] = None,
+    include_expired: bool = False,
+    finished_from: Optional[int] = None,
+    finished_to: Optional[int] = None,
+) -> Tuple[List[Event], Optional[str]]:
+    synced()
+    after = decode_cursor(cursor) if cursor else None
+    state_values = None if states is None else {EventState(state).value for state in states}
+    if finished_from is not None or finished_to is not None:
+        if deadline_from is not None or deadline_to is not None:
+            raise ValueError("Deadline filters cannot be combined with finish time filters")
+        events, next_key = await repository.query_finished_events(
+            limit,
+            after=after,
+            finished_from=finished_from,
+            finished_to=finished_to,
+            states=state_values,
+            min_coefficient=min_coefficient,
+            max_coefficient=max_coefficient,
+        )
+    else:
+        events, next_key = await repository.query_events(
+            int(time.time()),
+            limit,
+            after=after,
+            deadline_from=deadline_from,
+            deadline_to=deadline_to,
+            states=state_values,
+            min_coefficient=min_coefficient,
+            max_coefficient=max_coefficient,
+            include_expired=include_expired,
+        )
+    return events, encode_cursor(next_key) if next_key else None
+
+
+async def get_event_changes(since: int) -> EventChanges:
+    synced()
+    version, snapshot, events = await repository.get_changes(since)
+    return EventChanges(version=version, snapshot=snapshot, events=events, book_id=repository.book_id)
+
+
+def is_read_only() -> bool:
+    return replicator is not None
+
+
+def get_archive_stats() -> dict:
+    if archiver is None:
+        return {"hot": len(repository.events), "archived": 0}
+    return archiver.stats()
+
+
+def get_replication_status() -> dict:
+    if replicator is not None:
+        return replicator.status()
+    return {"role": "primary", "version": repository.version}
+
+
+async def stream_event_changes(since: Optional[int] = None) -> AsyncIterator[Optional[Tuple[int, str]]]:
+    synced()
+    subscription = broadcaster.subscribe()
+    try:
+        if since is None:
+            version, backlog = repository.version, []
+        else:
+            version, _, backlog = await repository.get_changes(since)
+        async for message in event_messages(subscription, backlog, version):
+            yield message
+    finally:
+        broadcaster.unsubscribe(subscription)
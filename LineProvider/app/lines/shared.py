@@ -0,0 +1,198 @@
+import os
+import time
+import fcntl
+import asyncio
+import logging
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from app.lines.data import EventRepository
+from app.lines.models import Event
+from app.lines.persistence import EventJournal, SNAPSHOT_INTERVAL, decode_rows, encode_event
+
+
+SHARED_BOOK = os.getenv("LINE_SHARED_BOOK", "0") == "1"
+SHARED_POLL_INTERVAL = float(os.getenv("LINE_SHARED_POLL_INTERVAL", "0.05"))
+
+logger = logging.getLogger(__name__)
+
+
+class SharedEventBook:
+    """Keeps the repositories of several worker processes in sync through one journal.
+
+    Every worker holds the whole book in memory and tails the journal segments
+    written by the others. Writes take an exclusive lock on the data directory,
+    catch up with the journal and append their rows before releasing it, so
+    versions form a single sequence across workers. Reads catch up without the
+    lock and see every write that completed before them.
+    """
+
+    def __init__(self, journal: EventJournal):
+        self.journal = journal
+        self.repository: Optional[EventRepository] = None
+        self.segment = 0
+        self.offset = 0
+        self._fd: Optional[int] = None
+        self._lock_fd: Optional[int] = None
+        self._snapshot_mtime = 0
+        self._applying = False
+
+    @property
+    def lock_path(self) -> str:
+        return os.path.join(self.journal.directory, "book.lock")
+
+    def attach(self, repository: EventRepository) -> int:
+        """Load ``repository`` from disk, then follow the journal and append its mutations to it."""
+        os.makedirs(self.journal.directory, exist_ok=True)
+        self.repository = repository
+        repository.book_id = self.journal.read_book_id()
+        self._lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        with self._locked():
+            started = time.perf_counter()
+            restored = repository.restore(self.journal.read_rows())
+            logger.info("Restored %d events in %.2fs", restored, time.perf_counter() - started)
+            segments = self.journal.segments()
+            self._open_segment(segments[-1] if segments else 1)
+            self.offset = os.fstat(self._fd).st_size
+            self._snapshot_mtime = self._get_snapshot_mtime()
+        repository.subscribe(self.append)
+        return restored
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """Hold the book lock, caught up with the journal, while mutating the repository.
+
+        flock is taken per open file, not per coroutine: the body must not
+        suspend, or another coroutine of this process could enter it as well.
+        """
+        with self._locked():
+            self.catch_up()
+            yield
+
+    def catch_up(self) -> int:
+        """Apply the rows other workers appended since the last call."""
+        applied = 0
+        while True:
+            applied += self._read_segment()
+
+            if os.path.exists(self.journal.segment_path(self.segment + 1)):
+                # Nothing is appended to a segment once the next one exists, but rows may
+                # have landed in it since the read above: finish it before moving on.
+                applied += self._read_segment()
+                try:
+                    self._open_segment(self.segment + 1, create=False)
+                    self.offset = 0
+                    continue
+                except FileNotFoundError:
+                    pass
+
+            snapshot_mtime = self._get_snapshot_mtime()
+            if snapshot_mtime != self._snapshot_mtime:
+                self._snapshot_mtime = snapshot_mtime
+                if any(segment > self.segment for segment in self.journal.segments()):
+                    # The segments following ours were compacted into a snapshot before we read them.
+                    applied += self._resync()
+                    continue
+            return applied
+
+    def append(self, event: Event) -> None:
+        if self._applying:
+            return
+        record = encode_event(event)
+        os.write(self._fd, record)
+        if self.journal.fsync:
+            os.fsync(self._fd)
+        self.offset += len(record)
+
+    async def snapshot(self, repository: EventRepository, min_age: float = 0) -> None:
+        """Snapshot the book unless another worker is at it or did so less than ``min_age`` seconds ago."""
+        snapshot_lock_fd = os.open(self.lock_path + ".snapshot", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(snapshot_lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            if time.time() - self._get_snapshot_mtime() / 1e9 < min_age:
+                return
+            with self.write():
+                first_segment = self.journal.segments()[-1] + 1
+                self._open_segment(first_segment)
+                self.offset = 0
+            await self.journal.write_snapshot(repository, first_segment)
+            self._snapshot_mtime = self._get_snapshot_mtime()
+        finally:
+            os.close(snapshot_lock_fd)
+
+    async def run(self, repository: EventRepository, interval: float = SNAPSHOT_INTERVAL) -> None:
+        """Follow the other workers' writes and take turns taking snapshots."""
+        next_snapshot = time.monotonic() + interval
+        while True:
+            await asyncio.sleep(SHARED_POLL_INTERVAL)
+            try:
+                self.catch_up()
+                if time.monotonic() >= next_snapshot:
+                    next_snapshot = time.monotonic() + interval
+                    await self.snapshot(repository, min_age=interval / 2)
+            except Exception as e:
+                logger.error("Shared book sync failed: %s", e)
+
+    def close(self) -> None:
+        for fd in (self._fd, self._lock_fd):
+            if fd is not None:
+                os.close(fd)
+        self._fd = None
+        self._lock_fd = None
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _apply(self, rows) -> int:
+        self._applying = True
+        try:
+            return self.repository.apply_rows(rows)
+        finally:
+            self._applying = False
+
+    def _read_segment(self) -> int:
+        size = os.fstat(self._fd).st_size
+        if size <= self.offset:
+            return 0
+        rows, length = decode_rows(os.pread(self._fd, size - self.offset, self.offset))
+        self.offset += length
+        return self._apply(rows)
+
+    def _resync(self) -> int:
+        # Only the newest segment grows, so re-reading it from the start afterwards
+        # covers whatever was appended while the rows were loaded; duplicates are skipped.
+        latest_segment = self.journal.segments()[-1]
+        applied = self._apply(self.journal.read_rows())
+        self._open_segment(latest_segment)
+        self.offset = 0
+        return applied
+
+    def _open_segment(self, segment: int, create: bool = True) -> None:
+        flags = os.O_RDWR | os.O_APPEND | (os.O_CREAT if create else 0)
+        fd = os.open(self.journal.segment_path(segment), flags, 0o644)
+        if self._fd is not None:
+            os.close(self._fd)
+        self.segment = segment
+        self._fd = fd
+
+    def _get_snapshot_mtime(self) -> int:
+        try:
+            return os.stat(self.journal.snapshot_path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+
+def create_shared_book(journal: Optional[EventJournal]) -> Optional[SharedEventBook]:
+    if not SHARED_BOOK:
+        return None
+    if journal is None:
+        raise RuntimeError("LINE_SHARED_BOOK requires LINE_DATA_DIR")
+    return SharedEventBook(journal)
@@ -0,0 +1,133 @@
+import os
+import sys
+from typing import Dict, Iterator, MutableMapping, Optional, Tuple
+
+from app.lines.models import Event, EventState
+
+
+EVENT_STORE = os.getenv("LINE_EVENT_STORE", "models")
+
+_STATES = {state.value: state for state in EventState}
+
+
+class EventStore(dict):
+    """Default storage: event_id -> Event model.
+
+    Stores expose ``row`` and ``to_event`` so indexes can keep references to the
+    stored rows and materialize events only when they are returned, and
+    ``load_row``/``dump_row`` to move rows in and out as plain tuples.
+    """
+
+    def row(self, event_id: str) -> Event:
+        return self[event_id]
+
+    @staticmethod
+    def to_event(row: Event) -> Event:
+        return row
+
+    def load_row(
+        self, event_id: str, coefficient: float, deadline: int, state: int, version: int, finished_at: Optional[int],
+    ) -> Event:
+        row = Event.model_construct(
+            event_id=event_id,
+            coefficient=coefficient,
+            deadline=deadline,
+            state=_STATES[state],
+            version=version,
+            finished_at=finished_at,
+        )
+        self[event_id] = row
+        return row
+
+    @staticmethod
+    def dump_row(row: Event) -> Tuple[str, float, int, int, int, Optional[int]]:
+        return row.event_id, row.coefficient, row.deadline, row.state.value, row.version, row.finished_at
+
+
+class EventRecord:
+    __slots__ = ("event_id", "coefficient", "deadline", "state", "version", "finished_at")
+
+    def __init__(
+        self, event_id: str, coefficient: float, deadline: int, state: int, version: int, finished_at: Optional[int],
+    ):
+        self.event_id = event_id
+        self.coefficient = coefficient
+        self.deadline = deadline
+        self.state = state
+        self.version = version
+        self.finished_at = finished_at
+
+
+class CompactEventStore(MutableMapping):
+    """Storage keeping events as ``__slots__`` records instead of Event models.
+
+    Reads return a fresh Event, so changes have to be written back with
+    ``store[event_id] = event``. Records are updated in place, which keeps rows
+    referenced from indexes valid.
+    """
+
+    def __init__(self):
+        self._records: Dict[str, EventRecord] = {}
+
+    def __getitem__(self, event_id: str) -> Event:
+        return self.to_event(self._records[event_id])
+
+    def __setitem__(self, event_id: str, event: Event) -> None:
+        record = self._records.get(event_id)
+        if record is None:
+            event_id = sys.intern(event_id)
+            self._records[event_id] = EventRecord(
+                event_id, event.coefficient, event.deadline, event.state.value, event.version, event.finished_at,
+            )
+        else:
+            record.coefficient = event.coefficient
+            record.deadline = event.deadline
+            record.state = event.state.value
+            record.version = event.version
+            record.finished_at = event.finished_at
+
+    def __delitem__(self, event_id: str) -> None:
+        del self._records[event_id]
+
+    def __contains__(self, event_id) -> bool:
+        return event_id in self._records
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def clear(self) -> None:
+        self._records.clear()
+
+    def row(self, event_id: str) -> EventRecord:
+        return self._records[event_id]
+
+    @staticmethod
+    def to_event(record: EventRecord) -> Event:
+        return Event.model_construct(
+            event_id=record.event_id,
+            coefficient=record.coefficient,
+            deadline=record.deadline,
+            state=_STATES[record.state],
+            version=record.version,
+            finished_at=record.finished_at,
+        )
+
+    def load_row(
+        self, event_id: str, coefficient: float, deadline: int, state: int, version: int, finished_at: Optional[int],
+    ) -> EventRecord:
+        record = EventRecord(event_id, coefficient, deadline, state, version, finished_at)
+        self._records[event_id] = record
+        return record
+
+    @staticmethod
+    def dump_row(record: EventRecord) -> Tuple[str, float, int, int, int, Optional[int]]:
+        return record.event_id, record.coefficient, record.deadline, record.state, record.version, record.finished_at
+
+
+def create_store() -> MutableMapping:
+    if EVENT_STORE == "compact":
+        return CompactEventStore()
+    return EventStore()
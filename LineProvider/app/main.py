@@ -1,7 +1,76 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+from contextlib import asynccontextmanager, suppress
+
+from fastapi import FastAPI, Response
+from app.lines import metrics
+from app.lines.outbox import outbox
+from app.lines.publisher import publisher
 from app.lines.router import router as lines_router
+from app.lines.serialization import response_class
+from app.lines.services import archive, archiver, journal, line_feed, replicator, repository, scheduler, shared_book
+
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        await publisher.connect()
+    except Exception as e:
+        logger.warning("RabbitMQ is unavailable, publisher will connect on first use: %s", e)
+    outbox.start()
+    snapshot_task = None
+    if shared_book is not None:
+        shared_book.attach(repository)
+        snapshot_task = asyncio.create_task(shared_book.run(repository))
+    elif journal is not None:
+        journal.attach(repository)
+        snapshot_task = asyncio.create_task(journal.run_snapshots(repository))
+    if archiver is not None:
+        # Evictions are not journaled: a restore brings archived events back into memory.
+        dropped = archiver.drop_archived()
+        if dropped:
+            logger.info("Dropped %d restored events that are already archived", dropped)
+    background_tasks = []
+    if replicator is not None:
+        background_tasks.append(asyncio.create_task(replicator.run()))
+    if scheduler is not None:
+        background_tasks.append(asyncio.create_task(scheduler.run()))
+    if archiver is not None:
+        background_tasks.append(asyncio.create_task(archiver.run()))
+    if line_feed is not None:
+        background_tasks.append(asyncio.create_task(line_feed.run()))
+    yield
+    for task in background_tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    if shared_book is not None:
+        snapshot_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await snapshot_task
+        shared_book.close()
+    elif snapshot_task is not None:
+        snapshot_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await snapshot_task
+        await journal.snapshot(repository)
+        journal.close()
+    if archive is not None:
+        archive.close()
+    await outbox.stop()
+    await publisher.close()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=response_class())
+app.add_middleware(metrics.MetricsMiddleware)
+
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
 
-app = FastAPI()
 
 app.include_router(lines_router, prefix="/events", tags=["Events"])
@@ -0,0 +1,58 @@
+"""Compare the deadline index of EventRepository.get_active_events with a full scan.
+
+Run from the LineProvider directory:
+
+    python -m benchmarks.bench_active_events
+"""
+import asyncio
+import random
+import time
+import timeit
+
+from app.lines.data import EventRepository
+from app.lines.models import Event, EventState
+
+
+SIZES = (10 ** 5, 10 ** 6)
+ACTIVE_SHARES = (0.01, 0.1, 0.5)
+REPEAT = 5
+
+
+def linear_scan(repository: EventRepository, current_time: int):
+    return [event for event in repository.events.values() if event.deadline > current_time]
+
+
+async def fill(size: int, now: int) -> EventRepository:
+    repository = EventRepository()
+    for i in range(size):
+        deadline = now - 86400 + random.randrange(0, 2 * 86400)
+        event = Event.model_construct(event_id=str(i), coefficient=1.5, deadline=deadline, state=EventState.NEW)
+        await repository.create_event(event)
+    return repository
+
+
+def best_ms(function) -> float:
+    return min(timeit.repeat(function, number=1, repeat=REPEAT)) * 1000
+
+
+def main():
+    loop = asyncio.new_event_loop()
+    random.seed(42)
+    now = int(time.time())
+    print(f"{'events':>10} {'active':>8} {'scan ms':>10} {'index ms':>10} {'speedup':>8}")
+    for size in SIZES:
+        started = time.perf_counter()
+        repository = loop.run_until_complete(fill(size, now))
+        fill_seconds = time.perf_counter() - started
+        deadlines = [entry[0] for entry in repository.deadline_index]
+        for share in ACTIVE_SHARES:
+            current_time = deadlines[int(size * (1 - share))]
+            scan = best_ms(lambda: linear_scan(repository, current_time))
+            index = best_ms(lambda: loop.run_until_complete(repository.get_active_events(current_time)))
+            print(f"{size:>10} {share:>8.0%} {scan:>10.2f} {index:>10.2f} {scan / index:>7.1f}x")
+        print(f"{size:>10} filled in {fill_seconds:.2f}s")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Measure archiving ended events: the time it takes, the memory it frees and lookups in the archive.
+
+Run from the LineProvider directory:
+
+    python -m benchmarks.bench_archive [events]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+from app.lines.archive import EventArchive, EventArchiver
+from app.lines.data import EventRepository
+from app.lines.models import Event, EventState
+from app.lines.store import CompactEventStore
+
+
+DEFAULT_EVENTS = 200000
+ENDED_SHARE = 0.9
+LOOKUPS = 10000
+
+
+async def fill(repository: EventRepository, size: int, now: int) -> None:
+    for i in range(size):
+        ended = i < size * ENDED_SHARE
+        event = Event.model_construct(
+            event_id=f"event-{i}",
+            coefficient=1.5,
+            deadline=now - 7 * 86400 + i if ended else now + 3600 + i,
+            state=EventState.FINISHED_WIN if ended else EventState.NEW,
+            finished_at=now - 7 * 86400 + i if ended else None,
+        )
+        await repository.create_event(event)
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_EVENTS
+    now = int(time.time())
+    loop = asyncio.new_event_loop()
+    with tempfile.TemporaryDirectory() as directory:
+        tracemalloc.start()
+        repository = EventRepository(change_log_size=0, store=CompactEventStore())
+        loop.run_until_complete(fill(repository, size, now))
+        before = tracemalloc.get_traced_memory()[0]
+        archive = EventArchive(os.path.join(directory, "archive.db"))
+        archiver = EventArchiver(repository, archive, retention=86400)
+
+        started = time.perf_counter()
+        archived = loop.run_until_complete(archiver.archive_once(now))
+        elapsed = time.perf_counter() - started
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        archived_ids = [f"event-{i}" for i in random.sample(range(archived), LOOKUPS)]
+        hot_ids = random.sample(list(repository.events), LOOKUPS)
+        archive_us = min(timeit.repeat(lambda: [archive.get(event_id) for event_id in archived_ids], number=1, repeat=3))
+        hot_us = min(timeit.repeat(lambda: [repository.events[event_id] for event_id in hot_ids], number=1, repeat=3))
+        archive.close()
+        loop.close()
+
+    print(f"archived {archived} of {size} events in {elapsed:.2f}s")
+    print(f"traced memory: {before / 2 ** 20:.1f} MB before, {after / 2 ** 20:.1f} MB after")
+    print(f"lookup: {hot_us / LOOKUPS * 1e6:.2f} us in memory, {archive_us / LOOKUPS * 1e6:.2f} us from the archive")
+
+
+if __name__ == "__main__":
+    main()
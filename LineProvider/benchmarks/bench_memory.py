@@ -0,0 +1,55 @@
+"""Compare the memory held by the model-based and the compact event store.
+
+Run from the LineProvider directory:
+
+    python -m benchmarks.bench_memory [events]
+"""
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+import uuid
+
+from app.lines.data import EventRepository
+from app.lines.models import Event, EventState
+from app.lines.store import CompactEventStore, EventStore
+
+
+DEFAULT_EVENTS = 10 ** 6
+
+
+async def fill(repository: EventRepository, size: int, now: int) -> None:
+    for i in range(size):
+        event = Event(
+            event_id=str(uuid.uuid4()),
+            coefficient=1.5 + (i % 100) / 100,
+            deadline=now + 3600 + i,
+            state=EventState.NEW,
+        )
+        await repository.create_event(event)
+
+
+def measure(store, size: int, now: int) -> int:
+    gc.collect()
+    tracemalloc.start()
+    repository = EventRepository(change_log_size=0, store=store)
+    asyncio.run(fill(repository, size, now))
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del repository
+    return current
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_EVENTS
+    now = int(time.time())
+    print(f"{'store':>10} {'events':>10} {'total MB':>10} {'bytes/event':>12}")
+    for name, store_class in (("models", EventStore), ("compact", CompactEventStore)):
+        used = measure(store_class(), size, now)
+        print(f"{name:>10} {size:>10} {used / 2 ** 20:>10.1f} {used / size:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Measure the cost of recording metrics.
+
+Times Counter.inc and Histogram.observe, then the overhead MetricsMiddleware
+adds to a request, by wrapping a trivial ASGI app so that only the middleware
+is measured. Run from the LineProvider directory:
+
+    python -m benchmarks.bench_metrics
+"""
+import asyncio
+import time
+import timeit
+from types import SimpleNamespace
+
+from app.lines.metrics import Counter, Histogram, MetricsMiddleware
+
+
+CALLS = 10 ** 6
+REQUESTS = 200000
+REPEAT = 5
+
+ROUTE = SimpleNamespace(path="/events/{event_id}")
+
+
+async def endpoint(scope, receive, send):
+    scope["route"] = ROUTE
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+async def request_us(app) -> float:
+    """Average time of one request, in microseconds."""
+    scope = {"type": "http", "method": "GET"}
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        await app(scope, receive, send)
+    return (time.perf_counter() - started) / REQUESTS * 1e6
+
+
+def main():
+    counter = Counter("bench_total", "Benchmark", ("status",))
+    histogram = Histogram("bench_seconds", "Benchmark", ("route",))
+    labels = ("/events/{event_id}",)
+    inc = min(timeit.repeat(lambda: counter.inc(labels=("won",)), number=CALLS, repeat=REPEAT)) / CALLS
+    observe = min(timeit.repeat(lambda: histogram.observe(0.003, labels), number=CALLS, repeat=REPEAT)) / CALLS
+    print(f"Counter.inc:         {inc * 1e9:8.0f} ns")
+    print(f"Histogram.observe:   {observe * 1e9:8.0f} ns")
+
+    loop = asyncio.new_event_loop()
+    measured_app = MetricsMiddleware(endpoint)
+    plain = measured = float("inf")
+    # Alternate the two apps so that drifts of the machine affect both alike.
+    for _ in range(REPEAT):
+        plain = min(plain, loop.run_until_complete(request_us(endpoint)))
+        measured = min(measured, loop.run_until_complete(request_us(measured_app)))
+    loop.close()
+    print(f"middleware overhead: {(measured - plain) * 1000:8.0f} ns per request")
+
+
+if __name__ == "__main__":
+    main()
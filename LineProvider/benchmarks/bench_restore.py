@@ -0,0 +1,57 @@
+"""Measure how long LineProvider takes to restore its book from a snapshot and journal.
+
+Run from the LineProvider directory:
+
+    python -m benchmarks.bench_restore [events]
+"""
+import asyncio
+import sys
+import tempfile
+import time
+import uuid
+
+from app.lines.data import EventRepository
+from app.lines.models import EventState
+from app.lines.persistence import EventJournal
+from app.lines.store import CompactEventStore, EventStore
+
+
+DEFAULT_EVENTS = 10 ** 6
+JOURNAL_SHARE = 0.1
+
+
+async def prepare(directory: str, size: int, now: int) -> None:
+    repository = EventRepository(change_log_size=0, store=CompactEventStore())
+    journal = EventJournal(directory)
+    journal.attach(repository)
+    snapshot_size = int(size * (1 - JOURNAL_SHARE))
+    repository.restore(
+        (1, str(uuid.uuid4()), 1.5, now + 3600 + i, EventState.NEW.value, None) for i in range(snapshot_size)
+    )
+    await journal.snapshot(repository)
+
+    # The rest goes through the journal, as it would between two snapshots.
+    event_ids = list(repository.events)
+    for event_id in event_ids[:size - snapshot_size]:
+        await repository.update_event(event_id, {"state": EventState.FINISHED_WIN})
+    journal.close()
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_EVENTS
+    now = int(time.time())
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(prepare(directory, size, now))
+        print(f"{'store':>10} {'events':>10} {'journal':>10} {'restore s':>10}")
+        for name, store_class in (("models", EventStore), ("compact", CompactEventStore)):
+            repository = EventRepository(change_log_size=0, store=store_class())
+            journal = EventJournal(directory)
+            started = time.perf_counter()
+            restored = journal.attach(repository)
+            elapsed = time.perf_counter() - started
+            journal.close()
+            print(f"{name:>10} {restored:>10} {int(size * JOURNAL_SHARE):>10} {elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Measure the deadline scheduler with many pending deadlines.
+
+Fills a repository with events whose deadlines are spread over the next
+DEADLINE_SPREAD seconds, then times one scheduler tick (finding and closing the
+events due in one second) and a burst where a large share is due at once. Run
+from the LineProvider directory:
+
+    python -m benchmarks.bench_scheduler [events]
+"""
+import asyncio
+import sys
+import time
+
+from app.lines.data import EventRepository
+from app.lines.models import Event, EventState
+from app.lines.scheduler import DeadlineScheduler
+from app.lines.store import CompactEventStore
+
+
+DEFAULT_EVENTS = 5 * 10 ** 5
+DEADLINE_SPREAD = 3600
+
+
+async def fill(repository: EventRepository, size: int, now: int) -> None:
+    events = [
+        Event.model_construct(event_id=f"event{i}", coefficient=1.5, deadline=now + i % DEADLINE_SPREAD, state=EventState.NEW)
+        for i in range(size)
+    ]
+    await repository.create_events(events)
+
+
+async def bench(size: int) -> None:
+    now = int(time.time())
+    repository = EventRepository(store=CompactEventStore())
+    await fill(repository, size, now)
+
+    async def close_events(event_ids):
+        return [await repository.update_event(event_id, {"state": EventState.CLOSED}) for event_id in event_ids]
+
+    scheduler = DeadlineScheduler(repository, close_events)
+    scheduler.closed_until = now
+
+    started = time.perf_counter()
+    closed = await scheduler.close_due_events(now + 1)
+    tick = time.perf_counter() - started
+    print(f"{size} pending deadlines, one tick closed {closed} events in {tick * 1000:.2f} ms")
+
+    started = time.perf_counter()
+    idle = await scheduler.close_due_events(now + 1)
+    print(f"tick with nothing due: {(time.perf_counter() - started) * 1e6:.1f} us ({idle} closed)")
+
+    burst_until = now + DEADLINE_SPREAD // 5
+    started = time.perf_counter()
+    closed = await scheduler.close_due_events(burst_until)
+    burst = time.perf_counter() - started
+    print(f"burst closed {closed} events in {burst:.2f}s, {burst / closed * 1e6:.1f} us per event")
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_EVENTS
+    asyncio.run(bench(size))
+
+
+if __name__ == "__main__":
+    main()
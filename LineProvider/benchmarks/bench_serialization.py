@@ -0,0 +1,67 @@
+"""Compare the response pipelines for a list of 10k events.
+
+Run from the LineProvider directory:
+
+    python -m benchmarks.bench_serialization
+"""
+import asyncio
+import time
+from typing import List
+
+import httpx
+from fastapi import FastAPI, Response
+from fastapi.responses import ORJSONResponse
+
+from app.lines.models import Event, EventState
+from app.lines.serialization import events_adapter
+
+
+EVENTS = 10 ** 4
+REQUESTS = 50
+
+
+def build_apps(events: list) -> dict:
+    default = FastAPI()
+
+    @default.get("/events", response_model=List[Event])
+    async def default_events():
+        return events
+
+    fast = FastAPI(default_response_class=ORJSONResponse)
+
+    @fast.get("/events", response_model=List[Event])
+    async def orjson_events():
+        return events
+
+    adapter = FastAPI()
+
+    @adapter.get("/events", response_model=List[Event])
+    async def adapter_events():
+        return Response(content=events_adapter.dump_json(events), media_type="application/json")
+
+    return {"response_model + json": default, "response_model + orjson": fast, "TypeAdapter": adapter}
+
+
+async def requests_per_second(app: FastAPI) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/events")
+        started = time.perf_counter()
+        for _ in range(REQUESTS):
+            response = await client.get("/events")
+            assert len(response.content) > EVENTS
+        return REQUESTS / (time.perf_counter() - started)
+
+
+async def main():
+    now = int(time.time())
+    events = [
+        Event(event_id=f"event{i}", coefficient=1.5 + i % 50 / 10, deadline=now + 3600 + i, state=EventState.NEW)
+        for i in range(EVENTS)
+    ]
+    for name, app in build_apps(events).items():
+        print(f"{name:>26}: {await requests_per_second(app):8.1f} req/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
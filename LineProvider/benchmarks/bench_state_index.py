@@ -0,0 +1,77 @@
+"""Compare lookups by state and finish time through the secondary indexes with a full scan.
+
+Also reports what keeping the indexes costs a state change. Run from the
+LineProvider directory:
+
+    python -m benchmarks.bench_state_index
+"""
+import asyncio
+import random
+import time
+import timeit
+
+from app.lines.data import EventRepository
+from app.lines.models import Event, EventState
+
+
+SIZES = (10 ** 5, 10 ** 6)
+FINISHED_SHARE = 0.01
+UPDATES = 10000
+REPEAT = 5
+
+
+def scan_finished(repository: EventRepository, since: int):
+    return [
+        event for event in repository.events.values()
+        if event.state in (EventState.FINISHED_WIN, EventState.FINISHED_LOSE) and event.finished_at >= since
+    ]
+
+
+async def fill(size: int, now: int) -> EventRepository:
+    repository = EventRepository(change_log_size=0)
+    for i in range(size):
+        event = Event.model_construct(
+            event_id=str(i), coefficient=1.5, deadline=now + random.randrange(86400), state=EventState.NEW,
+        )
+        await repository.create_event(event)
+    for event_id in random.sample(list(repository.events), int(size * FINISHED_SHARE)):
+        await repository.update_event(event_id, {"state": EventState.FINISHED_WIN})
+    return repository
+
+
+def best_ms(function) -> float:
+    return min(timeit.repeat(function, number=1, repeat=REPEAT)) * 1000
+
+
+def main():
+    loop = asyncio.new_event_loop()
+    random.seed(42)
+    now = int(time.time())
+    print(f"{'events':>10} {'finished':>9} {'scan ms':>10} {'index ms':>10} {'speedup':>8} {'update us':>10}")
+    for size in SIZES:
+        repository = loop.run_until_complete(fill(size, now))
+        since = now - 3600
+
+        def query():
+            return loop.run_until_complete(repository.query_finished_events(size, finished_from=since))
+
+        assert len(query()[0]) == len(scan_finished(repository, since))
+        scan = best_ms(lambda: scan_finished(repository, since))
+        index = best_ms(query)
+
+        open_events = [entry[1] for entry in repository.state_indexes[EventState.NEW.value]]
+        event_ids = random.sample(open_events, UPDATES)
+
+        async def toggle():
+            for event_id in event_ids:
+                await repository.update_event(event_id, {"state": EventState.FINISHED_LOSE})
+                await repository.update_event(event_id, {"state": EventState.NEW})
+
+        update = best_ms(lambda: loop.run_until_complete(toggle())) * 1000 / (2 * UPDATES)
+        finished = len(repository.finished_index)
+        print(f"{size:>10} {finished:>9} {scan:>10.2f} {index:>10.2f} {scan / index:>7.1f}x {update:>10.2f}")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""Load test LineProvider with a configurable mix of requests.
+
+Drives the ASGI app in-process through httpx with a stubbed publisher, or a
+running server over a real socket with --url, and reports throughput,
+p50/p95/p99 latency per request type and memory. Run from the LineProvider
+directory:
+
+    python -m benchmarks.load_test --requests 20000 --concurrency 32 --preload 100000 \\
+        --mix post=1,put=2,get=1,page=4,event=2 --save report.json
+    python -m benchmarks.load_test --baseline report.json --max-regression 0.2
+
+Request types: post (POST /events/), put (PUT /events/{id}), get (GET /events/,
+the whole active line), page (GET /events/?limit=100) and event
+(GET /events/{id}). With --baseline the run fails when throughput drops or a
+p95 latency grows by more than --max-regression compared with a saved report.
+"""
+import argparse
+import asyncio
+import json
+import random
+import resource
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from app.lines.models import CreateEvent, EventState
+
+
+DEFAULT_MIX = "post=1,put=2,get=1,page=4,event=2"
+PRELOAD_BATCH_SIZE = 1000
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        if name not in REQUESTS:
+            raise ValueError(f"Unknown request type {name!r}, expected one of {', '.join(REQUESTS)}")
+        weights[name] = int(weight or 1)
+    return weights
+
+
+def percentile(sorted_values: List[float], share: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * share), len(sorted_values) - 1)]
+
+
+def max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def event_payload(rng: random.Random, now: int) -> dict:
+    return {
+        "coefficient": round(rng.uniform(1.1, 5), 2),
+        "deadline": now + 3600 + rng.randrange(86400),
+        "state": EventState.NEW.value,
+    }
+
+
+async def post_event(client: httpx.AsyncClient, rng: random.Random, event_ids: List[str], now: int) -> httpx.Response:
+    response = await client.post("/events/", json=event_payload(rng, now))
+    if response.status_code == 200:
+        event_ids.append(response.json()["event_id"])
+    return response
+
+
+async def put_event(client: httpx.AsyncClient, rng: random.Random, event_ids: List[str], now: int) -> httpx.Response:
+    updates = {"coefficient": round(rng.uniform(1.1, 5), 2)}
+    if rng.random() < 0.1:
+        updates["state"] = rng.choice((EventState.FINISHED_WIN.value, EventState.FINISHED_LOSE.value))
+    return await client.put(f"/events/{rng.choice(event_ids)}", json=updates)
+
+
+async def get_events(client: httpx.AsyncClient, rng: random.Random, event_ids: List[str], now: int) -> httpx.Response:
+    return await client.get("/events/", headers={"Accept-Encoding": "identity"})
+
+
+async def get_page(client: httpx.AsyncClient, rng: random.Random, event_ids: List[str], now: int) -> httpx.Response:
+    return await client.get("/events/", params={"limit": 100})
+
+
+async def get_event(client: httpx.AsyncClient, rng: random.Random, event_ids: List[str], now: int) -> httpx.Response:
+    return await client.get(f"/events/{rng.choice(event_ids)}")
+
+
+REQUESTS = {"post": post_event, "put": put_event, "get": get_events, "page": get_page, "event": get_event}
+
+
+async def preload(client: Optional[httpx.AsyncClient], count: int, rng: random.Random, now: int) -> List[str]:
+    if client is not None:
+        event_ids = []
+        for start in range(0, count, PRELOAD_BATCH_SIZE):
+            batch = [event_payload(rng, now) for _ in range(min(PRELOAD_BATCH_SIZE, count - start))]
+            response = await client.post("/events/batch", json=batch)
+            response.raise_for_status()
+            event_ids.extend(event["event_id"] for event in response.json())
+        return event_ids
+
+    from app.lines.services import build_event, repository
+
+    events = [build_event(CreateEvent(**event_payload(rng, now))) for _ in range(count)]
+    await repository.create_events(events)
+    return [event.event_id for event in events]
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    remote: bool,
+    requests: int,
+    concurrency: int,
+    weights: Dict[str, int],
+    preload_events: int,
+    rng: random.Random,
+    now: int,
+) -> Tuple[Dict[str, List[float]], Dict[str, int], float, float]:
+    rss_before = max_rss_mb()
+    event_ids = await preload(client if remote else None, preload_events, rng, now)
+    if not event_ids:
+        await post_event(client, rng, event_ids, now)
+
+    names = list(weights)
+    plan = rng.choices(names, weights=[weights[name] for name in names], k=requests)
+    latencies: Dict[str, List[float]] = {name: [] for name in names}
+    errors: Dict[str, int] = {name: 0 for name in names}
+    position = 0
+
+    async def worker(worker_rng: random.Random):
+        nonlocal position
+        while position < len(plan):
+            name = plan[position]
+            position += 1
+            started = time.perf_counter()
+            response = await REQUESTS[name](client, worker_rng, event_ids, now)
+            latencies[name].append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors[name] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(random.Random(rng.random())) for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started, max_rss_mb() - rss_before
+
+
+async def run_load_test(
+    requests: int,
+    concurrency: int = 16,
+    mix: str = DEFAULT_MIX,
+    preload_events: int = 1000,
+    url: Optional[str] = None,
+    seed: int = 42,
+) -> dict:
+    weights = parse_mix(mix)
+    rng = random.Random(seed)
+    now = int(time.time())
+
+    publish_batch = None
+    if url is None:
+        from app.main import app
+        from app.lines.outbox import outbox
+
+        async def discard(bodies, routing_key):
+            pass
+
+        publish_batch, outbox.publish_batch = outbox.publish_batch, discard
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://load-test")
+    else:
+        client = httpx.AsyncClient(base_url=url, timeout=60)
+
+    try:
+        async with client:
+            latencies, errors, elapsed, rss_growth = await drive(
+                client, url is not None, requests, concurrency, weights, preload_events, rng, now,
+            )
+    finally:
+        if publish_batch is not None:
+            await outbox.stop()
+            outbox.publish_batch = publish_batch
+
+    report = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "mix": mix,
+        "preload": preload_events,
+        "target": url or "in-process",
+        "seconds": elapsed,
+        "throughput": requests / elapsed,
+        "max_rss_mb": max_rss_mb(),
+        "rss_growth_mb": rss_growth,
+        "latency_ms": {},
+    }
+    for name, values in latencies.items():
+        values.sort()
+        report["latency_ms"][name] = {
+            "count": len(values),
+            "errors": errors[name],
+            "p50": percentile(values, 0.50) * 1000,
+            "p95": percentile(values, 0.95) * 1000,
+            "p99": percentile(values, 0.99) * 1000,
+        }
+    return report
+
+
+def format_report(report: dict) -> str:
+    lines = [
+        f"{report['requests']} requests to {report['target']} with concurrency {report['concurrency']}, "
+        f"{report['preload']} preloaded events",
+        f"throughput: {report['throughput']:.1f} req/s in {report['seconds']:.2f}s",
+        f"memory: max RSS {report['max_rss_mb']:.1f} MB, grew {report['rss_growth_mb']:.1f} MB",
+        f"{'request':>8} {'count':>8} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}",
+    ]
+    for name, stats in report["latency_ms"].items():
+        lines.append(
+            f"{name:>8} {stats['count']:>8} {stats['errors']:>7} "
+            f"{stats['p50']:>9.2f} {stats['p95']:>9.2f} {stats['p99']:>9.2f}"
+        )
+    return "\n".join(lines)
+
+
+def find_regressions(report: dict, baseline: dict, max_regression: float) -> List[str]:
+    regressions = []
+    if report["throughput"] < baseline["throughput"] * (1 - max_regression):
+        regressions.append(f"throughput {report['throughput']:.1f} req/s, baseline {baseline['throughput']:.1f}")
+    for name, stats in report["latency_ms"].items():
+        baseline_stats = baseline["latency_ms"].get(name)
+        if baseline_stats and stats["p95"] > baseline_stats["p95"] * (1 + max_regression):
+            regressions.append(f"{name} p95 {stats['p95']:.2f} ms, baseline {baseline_stats['p95']:.2f} ms")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--preload", type=int, default=10000)
+    parser.add_argument("--url", help="base URL of a running LineProvider, in-process when omitted")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", help="write the report as JSON to this file")
+    parser.add_argument("--baseline", help="compare with a report saved by --save")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run_load_test(args.requests, args.concurrency, args.mix, args.preload, args.url, args.seed))
+    print(format_report(report))
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = find_regressions(report, json.load(file), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
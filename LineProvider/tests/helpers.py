@@ -0,0 +1,10 @@
+from app.lines.data import EventRepository
+from app.lines.models import Event, EventState
+
+
+def make_event(event_id: str, deadline: int, state: EventState = EventState.NEW, **fields) -> Event:
+    return Event.model_construct(event_id=event_id, coefficient=1.5, deadline=deadline, state=state, **fields)
+
+
+def dump(repository: EventRepository) -> dict:
+    return {event_id: event.model_dump() for event_id, event in repository.events.items()}
@@ -0,0 +1,108 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from app.lines.archive import EventArchive, EventArchiver
+from app.lines.data import EventRepository
+from app.lines.models import EventState
+from helpers import make_event
+
+
+def test_archive_keeps_newest_version(tmp_path):
+    archive = EventArchive(str(tmp_path / "archive.db"))
+    archive.write([(2, "event1", 1.5, 200, EventState.FINISHED_WIN.value, 300), (1, "event2", 1.7, 200, 1, None)])
+    archive.write([(1, "event1", 9.9, 200, EventState.NEW.value, None), (3, "event2", 2.0, 250, 4, None)])
+
+    assert archive.count == 2
+    assert archive.get("event1").model_dump() == {
+        "event_id": "event1",
+        "coefficient": 1.5,
+        "deadline": 200,
+        "state": EventState.FINISHED_WIN,
+        "version": 2,
+        "finished_at": 300,
+    }
+    assert archive.get("event2").state == EventState.CLOSED
+    assert archive.get("missing") is None
+    assert sorted(archive.get_many(["event2", "missing", "event1"])) == ["event1", "event2"]
+    assert "event1" in archive and "missing" not in archive
+    archive.close()
+    assert EventArchive(str(tmp_path / "archive.db")).count == 2
+
+
+@pytest.mark.asyncio
+async def test_archiver_moves_finished_events_after_retention(tmp_path):
+    repository = EventRepository()
+    await repository.create_event(make_event("active", 2000))
+    await repository.create_event(make_event("expired", 100))
+    await repository.create_event(make_event("closed", 100, EventState.CLOSED))
+    await repository.create_event(make_event("finished", 100, EventState.FINISHED_WIN, finished_at=500))
+    await repository.create_event(make_event("finished_recently", 100, EventState.FINISHED_LOSE, finished_at=950))
+    await repository.create_event(make_event("finished_early", 950, EventState.FINISHED_WIN, finished_at=100))
+    archive = EventArchive(str(tmp_path / "archive.db"))
+    archiver = EventArchiver(repository, archive, retention=100)
+
+    assert await archiver.archive_once(now=1000) == 1
+    assert sorted(repository.events) == ["active", "closed", "expired", "finished_early", "finished_recently"]
+    assert archive.get("finished").finished_at == 500
+    assert len(repository.deadline_index) == 5
+    assert [entry[1] for entry in repository.finished_index] == ["finished_early", "finished_recently"]
+
+    # Over the memory cap, finished events past their deadline go early; unsettled ones stay.
+    archiver.max_hot_events = 1
+    assert await archiver.archive_once(now=1000) == 2
+    assert sorted(repository.events) == ["active", "closed", "expired"]
+    assert archiver.stats()["hot"] == 3
+    assert archiver.stats()["archived"] == 3
+
+
+@pytest.mark.asyncio
+async def test_archiver_drops_restored_events_already_archived(tmp_path):
+    archive = EventArchive(str(tmp_path / "archive.db"))
+    archive.write([(2, "archived", 1.5, 100, EventState.FINISHED_WIN.value, 200)])
+    repository = EventRepository()
+    repository.restore([
+        (2, "archived", 1.5, 100, EventState.FINISHED_WIN.value, 200),
+        (3, "changed", 1.5, 100, EventState.FINISHED_LOSE.value, 200),
+        (4, "open", 1.5, 2000, EventState.NEW.value, None),
+    ])
+    archive.write([(1, "changed", 1.5, 100, EventState.NEW.value, None)])
+
+    assert EventArchiver(repository, archive).drop_archived() == 1
+    assert sorted(repository.events) == ["changed", "open"]
+
+
+@pytest.mark.asyncio
+async def test_evict_keeps_events_changed_since_they_were_copied():
+    repository = EventRepository()
+    await repository.create_event(make_event("event1", 100))
+    version = repository.events["event1"].version
+    await repository.update_event("event1", {"coefficient": 2.0})
+
+    assert repository.evict([("event1", version)]) == 0
+    assert repository.evict([("event1", version + 1), ("missing", 1)]) == 1
+    assert not repository.events and not repository.deadline_index
+
+
+@pytest.mark.asyncio
+async def test_archived_events_are_served_but_not_updated(tmp_path, monkeypatch, test_client: TestClient):
+    from app.lines import services
+    archive = EventArchive(str(tmp_path / "archive.db"))
+    monkeypatch.setattr(services, "archive", archive)
+    monkeypatch.setattr(services, "archiver", EventArchiver(services.repository, archive))
+    payload = {"coefficient": 1.5, "deadline": int(time.time()) + 3600, "state": EventState.NEW.value}
+    hot_id = test_client.post("/events/", json=payload).json()["event_id"]
+    archive.write([(1, "archived", 1.5, 100, EventState.FINISHED_WIN.value, 200)])
+
+    response = test_client.get("/events/archived")
+    assert response.status_code == 200
+    assert response.json()["finished_at"] == 200
+
+    response = test_client.post("/events/lookup", json=["archived", hot_id])
+    assert [event["event_id"] for event in response.json()] == ["archived", hot_id]
+
+    response = test_client.put("/events/archived", json={"deadline": int(time.time()) + 3600})
+    assert response.status_code == 400
+    assert "archived" in response.json()["detail"]
+
+    assert test_client.get("/events/archive").json()["archived"] == 1
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+from app.lines.broadcast import EventBroadcaster, event_messages
+from app.lines.models import Event, EventState
+
+
+def make_event(event_id: str, version: int) -> Event:
+    return Event.model_construct(
+        event_id=event_id,
+        coefficient=1.5,
+        deadline=2000000000,
+        state=EventState.NEW,
+        version=version,
+    )
+
+
+@pytest.mark.asyncio
+async def test_broadcaster_fans_out_to_every_subscriber():
+    broadcaster = EventBroadcaster(buffer_size=10)
+    first = broadcaster.subscribe()
+    second = broadcaster.subscribe()
+
+    broadcaster.publish(make_event("event1", 1))
+
+    for subscription in (first, second):
+        version, data = await subscription.get()
+        assert version == 1
+        assert json.loads(data)["event_id"] == "event1"
+
+
+@pytest.mark.asyncio
+async def test_broadcaster_drops_slow_subscriber():
+    broadcaster = EventBroadcaster(buffer_size=2)
+    slow = broadcaster.subscribe()
+    fast = broadcaster.subscribe()
+
+    for version in (1, 2):
+        broadcaster.publish(make_event("event1", version))
+    await fast.get()
+    await fast.get()
+    broadcaster.publish(make_event("event1", 3))
+
+    assert slow.dropped
+    assert broadcaster.subscribers == {fast}
+    assert broadcaster.dropped_count == 1
+    assert await slow.get() is None
+    assert (await fast.get())[0] == 3
+
+
+@pytest.mark.asyncio
+async def test_event_messages_yields_backlog_then_newer_changes():
+    broadcaster = EventBroadcaster(buffer_size=10)
+    subscription = broadcaster.subscribe()
+    broadcaster.publish(make_event("event1", 2))
+    broadcaster.publish(make_event("event2", 3))
+    broadcaster.publish(make_event("event3", 4))
+
+    messages = event_messages(subscription, [make_event("event1", 2), make_event("event2", 3)], after_version=3)
+
+    assert [(await anext(messages))[0] for _ in range(3)] == [2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_event_messages_keepalive():
+    subscription = EventBroadcaster().subscribe()
+    messages = event_messages(subscription, [], after_version=0, keepalive_interval=0.01)
+
+    assert await anext(messages) is None
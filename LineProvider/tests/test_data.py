@@ -0,0 +1,250 @@
+import json
+
+import pytest
+from app.lines.cache import ActiveEventsCache
+from app.lines.data import EventRepository
+from app.lines.index import SortedIndex
+from app.lines.models import Event, EventState
+from helpers import make_event
+
+
+@pytest.mark.asyncio
+async def test_get_active_events_ordered_by_deadline():
+    repository = EventRepository()
+    await repository.create_event(make_event("late", 300))
+    await repository.create_event(make_event("expired", 50))
+    await repository.create_event(make_event("early", 200))
+
+    active_events = await repository.get_active_events(current_time=100)
+
+    assert [event.event_id for event in active_events] == ["early", "late"]
+
+
+@pytest.mark.asyncio
+async def test_get_active_events_skips_event_deadline_equal_to_current_time():
+    repository = EventRepository()
+    await repository.create_event(make_event("event1", 100))
+
+    assert await repository.get_active_events(current_time=100) == []
+
+
+@pytest.mark.asyncio
+async def test_query_events_pages_with_keyset_cursor():
+    repository = EventRepository()
+    for event_id, deadline in [("a", 200), ("b", 200), ("c", 300), ("d", 400), ("expired", 50)]:
+        await repository.create_event(make_event(event_id, deadline))
+
+    first_page, after = await repository.query_events(current_time=100, limit=2)
+    assert [event.event_id for event in first_page] == ["a", "b"]
+    assert after == (200, "b")
+
+    second_page, after = await repository.query_events(current_time=100, limit=2, after=after)
+    assert [event.event_id for event in second_page] == ["c", "d"]
+    assert after is None
+
+
+@pytest.mark.asyncio
+async def test_query_events_filters():
+    repository = EventRepository()
+    await repository.create_event(make_event("a", 200))
+    await repository.create_event(make_event("b", 300))
+    await repository.create_event(make_event("c", 400))
+    await repository.update_event("b", {"coefficient": 3.0})
+    await repository.update_event("c", {"state": EventState.FINISHED_WIN})
+
+    async def query(**filters):
+        events, _ = await repository.query_events(current_time=100, limit=10, **filters)
+        return [event.event_id for event in events]
+
+    assert await query(deadline_from=300) == ["b", "c"]
+    assert await query(deadline_to=300) == ["a", "b"]
+    assert await query(states={EventState.NEW.value}) == ["a", "b"]
+    assert await query(min_coefficient=2.0) == ["b"]
+    assert await query(max_coefficient=2.0) == ["a", "c"]
+
+
+@pytest.mark.asyncio
+async def test_query_events_walks_state_indexes():
+    repository = EventRepository()
+    for event_id, deadline in [("a", 200), ("b", 300), ("c", 400), ("d", 500), ("expired", 50)]:
+        await repository.create_event(make_event(event_id, deadline))
+    await repository.update_event("b", {"state": EventState.FINISHED_WIN})
+    await repository.update_event("d", {"state": EventState.FINISHED_LOSE})
+    await repository.update_event("expired", {"state": EventState.CLOSED})
+
+    async def query(states, **params):
+        events, after = await repository.query_events(current_time=100, limit=1, states=states, **params)
+        return [event.event_id for event in events], after
+
+    assert [entry[1] for entry in repository.state_indexes[EventState.NEW.value]] == ["a", "c"]
+    assert await query({EventState.NEW.value}) == (["a"], (200, "a"))
+    assert await query({EventState.NEW.value}, after=(200, "a")) == (["c"], None)
+    finished = {EventState.FINISHED_WIN.value, EventState.FINISHED_LOSE.value}
+    assert await query(finished, after=(300, "b")) == (["d"], None)
+    assert await query({EventState.CLOSED.value}) == ([], None)
+    assert await query({EventState.CLOSED.value}, include_expired=True) == (["expired"], None)
+
+
+@pytest.mark.asyncio
+async def test_query_finished_events_by_finish_time(monkeypatch):
+    repository = EventRepository()
+    for event_id in ("a", "b", "c"):
+        await repository.create_event(make_event(event_id, 200))
+    for finished_at, event_id, state in [(1000, "c", EventState.FINISHED_WIN), (2000, "a", EventState.FINISHED_LOSE)]:
+        monkeypatch.setattr("app.lines.data.time.time", lambda: finished_at)
+        await repository.update_event(event_id, {"state": state})
+
+    async def query(**params):
+        events, _ = await repository.query_finished_events(limit=10, **params)
+        return [(event.event_id, event.finished_at) for event in events]
+
+    assert await query() == [("c", 1000), ("a", 2000)]
+    assert await query(finished_from=1500) == [("a", 2000)]
+    assert await query(finished_to=1500) == [("c", 1000)]
+    assert await query(states={EventState.FINISHED_WIN.value}) == [("c", 1000)]
+
+    # Reopening an event drops it from the finished index, finishing it again restamps it.
+    await repository.update_event("c", {"state": EventState.NEW})
+    assert repository.events["c"].finished_at is None
+    assert await query() == [("a", 2000)]
+    await repository.update_event("a", {"state": EventState.FINISHED_WIN})
+    assert await query() == [("a", 2000)]
+
+
+@pytest.mark.asyncio
+async def test_state_indexes_follow_restore_and_applied_rows():
+    repository = EventRepository()
+    repository.restore([
+        (1, "a", 1.5, 200, EventState.NEW.value, None),
+        (2, "b", 1.5, 300, EventState.FINISHED_WIN.value, 1000),
+    ])
+    repository.apply_rows([
+        (3, "a", 1.5, 200, EventState.FINISHED_LOSE.value, 2000),
+        (4, "b", 1.5, 300, EventState.NEW.value, None),
+    ])
+
+    assert [entry[1] for entry in repository.state_indexes[EventState.NEW.value]] == ["b"]
+    assert [entry[1] for entry in repository.state_indexes[EventState.FINISHED_LOSE.value]] == ["a"]
+    assert not repository.state_indexes[EventState.FINISHED_WIN.value]
+    assert [entry[:2] for entry in repository.finished_index] == [(2000, "a")]
+
+
+@pytest.mark.asyncio
+async def test_update_event_reindexes_deadline():
+    repository = EventRepository()
+    await repository.create_event(make_event("event1", 50))
+    await repository.create_event(make_event("event2", 200))
+
+    await repository.update_event("event1", {"deadline": 300})
+
+    active_events = await repository.get_active_events(current_time=100)
+    assert [event.event_id for event in active_events] == ["event2", "event1"]
+    assert [entry[:2] for entry in repository.deadline_index] == [(200, "event2"), (300, "event1")]
+
+
+@pytest.mark.asyncio
+async def test_get_active_events_ignores_removed_events():
+    repository = EventRepository()
+    await repository.create_event(make_event("event1", 200))
+    repository.reset()
+    await repository.create_event(make_event("event2", 300))
+
+    active_events = await repository.get_active_events(current_time=100)
+    assert [event.event_id for event in active_events] == ["event2"]
+
+
+def test_sorted_index_keeps_order_across_buckets():
+    index = SortedIndex(load=2)
+    for key in [5, 1, 9, 3, 7, 2, 8, 6, 4]:
+        index.add(key)
+
+    assert list(index) == [1, 2, 3, 4, 5, 6, 7, 8, 9]
+    assert list(index.iter_after(4)) == [5, 6, 7, 8, 9]
+    assert list(index.iter_after(9)) == []
+
+    assert index.discard(5)
+    assert not index.discard(5)
+    for key in [1, 2, 3]:
+        index.discard(key)
+    assert list(index) == [4, 6, 7, 8, 9]
+    assert list(index.iter_after(0)) == [4, 6, 7, 8, 9]
+    assert len(index) == 5
+
+
+@pytest.mark.asyncio
+async def test_get_changes_returns_latest_change_of_each_event():
+    repository = EventRepository()
+    await repository.create_event(make_event("event1", 200))
+    await repository.create_event(make_event("event2", 200))
+    await repository.update_event("event1", {"coefficient": 1.7})
+
+    version, snapshot, events = await repository.get_changes(since=1)
+
+    assert version == 3
+    assert not snapshot
+    assert [(event.event_id, event.version) for event in events] == [("event2", 2), ("event1", 3)]
+    assert await repository.get_changes(since=3) == (3, False, [])
+
+
+@pytest.mark.asyncio
+async def test_get_changes_falls_back_to_snapshot():
+    repository = EventRepository(change_log_size=2)
+    for event_id in ("event1", "event2", "event3"):
+        await repository.create_event(make_event(event_id, 200))
+
+    version, snapshot, events = await repository.get_changes(since=1)
+    assert (version, snapshot, len(events)) == (3, False, 2)
+
+    version, snapshot, events = await repository.get_changes(since=0)
+    assert (version, snapshot, len(events)) == (3, True, 3)
+
+    version, snapshot, events = await repository.get_changes(since=10)
+    assert (version, snapshot, len(events)) == (3, True, 3)
+
+
+@pytest.mark.asyncio
+async def test_create_events_is_atomic():
+    repository = EventRepository()
+    await repository.create_event(make_event("event1", 200))
+
+    with pytest.raises(ValueError, match="Event with this ID already exists"):
+        await repository.create_events([make_event("event2", 200), make_event("event1", 200)])
+    with pytest.raises(ValueError, match="Event with this ID already exists"):
+        await repository.create_events([make_event("event3", 200), make_event("event3", 200)])
+
+    assert list(repository.events) == ["event1"]
+    assert repository.version == 1
+
+
+@pytest.mark.asyncio
+async def test_update_events_is_atomic():
+    repository = EventRepository()
+    await repository.create_event(make_event("event1", 200))
+
+    with pytest.raises(ValueError, match="Event not found"):
+        await repository.update_events([("event1", {"coefficient": 2.0}), ("event2", {"coefficient": 2.0})])
+    assert repository.events["event1"].coefficient == 1.5
+
+    events = await repository.update_events([("event1", {"coefficient": 2.0})])
+    assert events[0].coefficient == 2.0
+
+
+@pytest.mark.asyncio
+async def test_active_events_cache_expires_with_earliest_deadline():
+    repository = EventRepository()
+    cache = ActiveEventsCache(repository)
+    repository.subscribe(cache.invalidate)
+    await repository.create_event(make_event("event1", 200))
+    await repository.create_event(make_event("event2", 300))
+
+    body, etag, gzipped = await cache.get(current_time=100)
+    assert [event["event_id"] for event in json.loads(body)] == ["event1", "event2"]
+    assert not gzipped
+    assert await cache.get(current_time=199) == (body, etag, False)
+
+    body, _, _ = await cache.get(current_time=200)
+    assert [event["event_id"] for event in json.loads(body)] == ["event2"]
+
+    await repository.update_event("event2", {"coefficient": 2.0})
+    body, _, _ = await cache.get(current_time=200)
+    assert json.loads(body)[0]["coefficient"] == 2.0
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock
+
+from app.lines.data import EventRepository
+from app.lines.feed import LineFeed
+from app.lines.models import Event, EventState
+
+
+@pytest.mark.asyncio
+async def test_feed_chains_changes_and_heartbeats():
+    repository = EventRepository()
+    feed = LineFeed(repository, AsyncMock(), max_size=3)
+    repository.subscribe(feed.publish)
+
+    # Changes made before the feed runs are left to the change log.
+    await repository.create_event(Event.model_construct(
+        event_id="event1", coefficient=1.5, deadline=2000, state=EventState.NEW, finished_at=None,
+    ))
+    assert feed.depth == 0
+    feed.heartbeat()
+    await repository.update_event("event1", {"state": EventState.FINISHED_WIN})
+    await repository.update_event("event1", {"coefficient": 1.7})
+
+    heartbeat, first, second = feed._messages
+    assert heartbeat == {"feed": feed.feed_id, "previous": 1}
+    assert first["previous"] == 1 and first["event"]["state"] == EventState.FINISHED_WIN.value
+    assert second["previous"] == 2 and second["event"]["version"] == 3
+
+    # A full queue drops the change, and the next message reveals the gap.
+    await repository.update_event("event1", {"coefficient": 2.0})
+    assert feed.depth == 3
+    feed._messages.clear()
+    feed.heartbeat()
+    assert list(feed._messages) == [{"feed": feed.feed_id, "previous": 4}]
+
+
+@pytest.mark.asyncio
+async def test_feed_drops_batches_that_fail_to_publish():
+    publish_fanout = AsyncMock(side_effect=[ConnectionError("broker is down"), None])
+    feed = LineFeed(EventRepository(), publish_fanout, heartbeat_interval=0.01, retry_delay=0)
+
+    task = asyncio.create_task(feed.run())
+    for _ in range(100):
+        if publish_fanout.await_count >= 2:
+            break
+        await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert publish_fanout.await_count >= 2
+    assert [call.args[1] for call in publish_fanout.await_args_list] == ["lines"] * publish_fanout.await_count
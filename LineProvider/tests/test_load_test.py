@@ -0,0 +1,26 @@
+import pytest
+from app.lines.outbox import outbox
+from benchmarks.load_test import find_regressions, parse_mix, run_load_test
+
+
+@pytest.mark.asyncio
+async def test_load_test_smoke():
+    publish_batch = outbox.publish_batch
+    report = await run_load_test(requests=60, concurrency=4, mix="post=1,put=1,get=1,page=1,event=1", preload_events=20)
+
+    assert outbox.publish_batch == publish_batch
+    assert sum(stats["count"] for stats in report["latency_ms"].values()) == 60
+    assert all(stats["errors"] == 0 for stats in report["latency_ms"].values())
+    assert all(stats["p50"] <= stats["p95"] <= stats["p99"] for stats in report["latency_ms"].values())
+    assert report["throughput"] > 0
+    assert report["max_rss_mb"] > 0
+
+    assert find_regressions(report, report, 0.2) == []
+    slower = {**report, "throughput": report["throughput"] / 2}
+    assert find_regressions(slower, report, 0.2)
+
+
+def test_parse_mix_rejects_unknown_requests():
+    assert parse_mix("post=2,get") == {"post": 2, "get": 1}
+    with pytest.raises(ValueError):
+        parse_mix("delete=1")
@@ -0,0 +1,46 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.lines.metrics import Counter, Histogram, _metrics
+
+
+@pytest.fixture
+def unregistered():
+    count = len(_metrics)
+    yield
+    del _metrics[count:]
+
+
+def test_histogram_renders_cumulative_buckets(unregistered):
+    histogram = Histogram("test_duration_seconds", "Test", ("route",), buckets=(0.1, 1))
+    histogram.observe(0.05, ("/a",))
+    histogram.observe(0.1, ("/a",))
+    histogram.observe(5, ("/a",))
+
+    assert histogram.samples() == [
+        'test_duration_seconds_bucket{route="/a",le="0.1"} 2',
+        'test_duration_seconds_bucket{route="/a",le="1"} 2',
+        'test_duration_seconds_bucket{route="/a",le="+Inf"} 3',
+        'test_duration_seconds_sum{route="/a"} 5.15',
+        'test_duration_seconds_count{route="/a"} 3',
+    ]
+
+
+def test_counter_renders_labelled_values(unregistered):
+    counter = Counter("test_total", "Test", ("status",))
+    counter.inc(labels=("won",))
+    counter.inc(2, ("won",))
+
+    assert counter.render() == '# HELP test_total Test\n# TYPE test_total counter\ntest_total{status="won"} 3'
+
+
+def test_metrics_endpoint_reports_requests_by_route(test_client: TestClient):
+    test_client.get("/events/missing")
+
+    response = test_client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/events/{event_id}",status="404"}' in body
+    assert "line_events " in body
+    assert "line_outbox_depth " in body
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock
+
+from app.lines.models import EventState
+from app.lines.outbox import Outbox
+
+
+async def wait_until_empty(outbox: Outbox) -> None:
+    for _ in range(100):
+        if not outbox.depth:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("Outbox was not drained")
+
+
+@pytest.mark.asyncio
+async def test_outbox_dispatches_in_batches():
+    publish_batch = AsyncMock()
+    outbox = Outbox(publish_batch, batch_size=2)
+
+    await outbox.put_state_changes([(f"event{i}", EventState.FINISHED_WIN) for i in range(3)])
+    await outbox.put("events.closed", {"event_id": "event3"})
+    await wait_until_empty(outbox)
+    await outbox.stop()
+
+    assert [call.args for call in publish_batch.await_args_list] == [
+        ([{"event_id": "event0", "status": 2}, {"event_id": "event1", "status": 2}], "events"),
+        ([{"event_id": "event2", "status": 2}], "events"),
+        ([{"event_id": "event3"}], "events.closed"),
+    ]
+    assert outbox.dispatched_count == 4
+
+
+@pytest.mark.asyncio
+async def test_outbox_retries_failed_batch_in_order():
+    published = []
+
+    async def publish_batch(bodies, routing_key):
+        if len(published) == 0 and publish_batch.failures < 2:
+            publish_batch.failures += 1
+            raise ConnectionError("broker is down")
+        published.extend(body["event_id"] for body in bodies)
+
+    publish_batch.failures = 0
+    outbox = Outbox(publish_batch, batch_size=1, retry_delay=0.01)
+
+    await outbox.put_state_changes([
+        ("event1", EventState.FINISHED_WIN),
+        ("event1", EventState.FINISHED_LOSE),
+        ("event2", EventState.FINISHED_WIN),
+    ])
+    await wait_until_empty(outbox)
+    await outbox.stop()
+
+    assert published == ["event1", "event1", "event2"]
+    assert outbox.failed_attempts == 2
+
+
+@pytest.mark.asyncio
+async def test_outbox_drops_batch_after_max_attempts():
+    published = []
+
+    async def publish_batch(bodies, routing_key):
+        if bodies[0]["event_id"] == "poison":
+            raise ValueError("cannot publish")
+        published.extend(body["event_id"] for body in bodies)
+
+    outbox = Outbox(publish_batch, batch_size=1, retry_delay=0.001, max_attempts=3)
+    await outbox.put("events", {"event_id": "poison"})
+    await outbox.put("events", {"event_id": "event1"})
+    await wait_until_empty(outbox)
+    await outbox.stop()
+
+    assert published == ["event1"]
+    assert outbox.failed_attempts == 3
+    assert outbox.dropped_count == 1
+
+
+@pytest.mark.asyncio
+async def test_outbox_applies_backpressure_when_full():
+    release = asyncio.Event()
+
+    async def publish_batch(bodies, routing_key):
+        await release.wait()
+
+    outbox = Outbox(publish_batch, max_size=2, batch_size=1)
+    await outbox.put("events", {"event_id": "event1"})
+    await outbox.put("events", {"event_id": "event2"})
+
+    blocked_put = asyncio.create_task(outbox.put("events", {"event_id": "event3"}))
+    await asyncio.sleep(0.01)
+    assert not blocked_put.done()
+    assert outbox.depth == 2
+    assert outbox.lag > 0
+
+    release.set()
+    await asyncio.wait_for(blocked_put, 1)
+    await wait_until_empty(outbox)
+    await outbox.stop()
+    assert outbox.lag == 0
+
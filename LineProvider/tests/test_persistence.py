@@ -0,0 +1,55 @@
+import os
+
+import pytest
+from app.lines.data import EventRepository
+from app.lines.models import EventState
+from app.lines.persistence import EventJournal, encode_event, iter_rows
+from app.lines.store import CompactEventStore
+from helpers import dump, make_event
+
+
+@pytest.mark.asyncio
+async def test_journal_restores_repository(tmp_path):
+    repository = EventRepository()
+    EventJournal(str(tmp_path)).attach(repository)
+    await repository.create_event(make_event("event1", 200))
+    await repository.create_event(make_event("event2", 300))
+    await repository.update_event("event1", {"state": EventState.FINISHED_WIN, "deadline": 400})
+
+    restored = EventRepository()
+    assert EventJournal(str(tmp_path)).attach(restored) == 2
+    assert dump(restored) == dump(repository)
+    assert restored.version == 3
+    assert restored.book_id == repository.book_id
+    assert restored.events["event1"].finished_at is not None
+    assert [entry[1] for entry in restored.finished_index] == ["event1"]
+    active_events = await restored.get_active_events(current_time=250)
+    assert [event.event_id for event in active_events] == ["event2", "event1"]
+
+    await restored.create_event(make_event("event3", 500))
+    assert restored.events["event3"].version == 4
+
+
+@pytest.mark.asyncio
+async def test_snapshot_compacts_journal(tmp_path):
+    repository = EventRepository()
+    journal = EventJournal(str(tmp_path))
+    journal.attach(repository)
+    for i in range(5):
+        await repository.create_event(make_event(f"event{i}", 200 + i))
+    await journal.snapshot(repository)
+    await repository.update_event("event0", {"coefficient": 2.5})
+    journal.close()
+
+    assert sorted(os.listdir(tmp_path)) == ["book.id", "journal-00000002.v2.log", "snapshot.bin"]
+
+    restored = EventRepository(store=CompactEventStore())
+    assert EventJournal(str(tmp_path)).attach(restored) == 5
+    assert dump(restored) == dump(repository)
+    assert restored.version == 6
+
+
+def test_iter_rows_stops_at_torn_record():
+    buffer = encode_event(make_event("event1", 200)) + encode_event(make_event("event2", 300))[:-3]
+
+    assert [row[1] for row in iter_rows(buffer)] == ["event1"]
@@ -0,0 +1,108 @@
+import json
+
+import aio_pika
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.lines.models import EventState
+from app.lines.publisher import EventPublisher
+
+
+def make_connection():
+    channel = MagicMock()
+    channel.is_closed = False
+    channel.default_exchange.publish = AsyncMock()
+
+    connection = MagicMock()
+    connection.is_closed = False
+    connection.channel = AsyncMock(return_value=channel)
+    connection.close = AsyncMock()
+    return connection, channel
+
+
+@pytest.mark.asyncio
+@patch("app.lines.publisher.aio_pika.connect_robust", new_callable=AsyncMock)
+async def test_publisher_reuses_connection_and_channel(mock_connect):
+    connection, channel = make_connection()
+    mock_connect.return_value = connection
+    publisher = EventPublisher("amqp://test")
+
+    await publisher.publish({"event_id": "event1", "status": EventState.FINISHED_WIN.value})
+    await publisher.publish({"event_id": "event2", "status": EventState.FINISHED_LOSE.value})
+
+    assert mock_connect.await_count == 1
+    assert connection.channel.await_count == 1
+    connection.channel.assert_awaited_with(publisher_confirms=True)
+    assert channel.default_exchange.publish.await_count == 2
+
+    message = channel.default_exchange.publish.await_args.args[0]
+    assert json.loads(message.body) == {"event_id": "event2", "status": 3}
+    assert channel.default_exchange.publish.await_args.kwargs["routing_key"] == "events"
+
+    await publisher.close()
+    connection.close.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+@patch("app.lines.publisher.aio_pika.connect_robust", new_callable=AsyncMock)
+async def test_publisher_reconnects_closed_connection(mock_connect):
+    first_connection, _ = make_connection()
+    second_connection, second_channel = make_connection()
+    mock_connect.side_effect = [first_connection, second_connection]
+    publisher = EventPublisher("amqp://test")
+
+    await publisher.connect()
+    first_connection.is_closed = True
+    await publisher.publish({"event_id": "event1", "status": EventState.FINISHED_WIN.value})
+
+    assert mock_connect.await_count == 2
+    second_channel.default_exchange.publish.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+@patch("app.lines.publisher.aio_pika.connect_robust", new_callable=AsyncMock)
+async def test_publisher_reopens_closed_channel(mock_connect):
+    connection, channel = make_connection()
+    channel.reopen = AsyncMock()
+    mock_connect.return_value = connection
+    publisher = EventPublisher("amqp://test")
+
+    await publisher.publish({"event_id": "event1", "status": EventState.FINISHED_WIN.value})
+    channel.is_closed = True
+    await publisher.publish({"event_id": "event1", "status": EventState.FINISHED_LOSE.value})
+
+    channel.reopen.assert_awaited_once()
+    assert channel.default_exchange.publish.await_count == 2
+
+
+@pytest.mark.asyncio
+@patch("app.lines.publisher.aio_pika.connect_robust", new_callable=AsyncMock)
+async def test_publisher_batch_uses_one_channel(mock_connect):
+    connection, channel = make_connection()
+    mock_connect.return_value = connection
+    publisher = EventPublisher("amqp://test")
+
+    await publisher.publish_batch([{"event_id": f"event{i}", "status": 2} for i in range(5)])
+
+    assert connection.channel.await_count == 1
+    bodies = [json.loads(call.args[0].body) for call in channel.default_exchange.publish.await_args_list]
+    assert [body["event_id"] for body in bodies] == [f"event{i}" for i in range(5)]
+
+
+@pytest.mark.asyncio
+@patch("app.lines.publisher.aio_pika.connect_robust", new_callable=AsyncMock)
+async def test_publisher_fanout_declares_exchange_once(mock_connect):
+    connection, channel = make_connection()
+    exchange = MagicMock()
+    exchange.publish = AsyncMock()
+    channel.declare_exchange = AsyncMock(return_value=exchange)
+    channel.get_exchange = AsyncMock(return_value=exchange)
+    mock_connect.return_value = connection
+    publisher = EventPublisher("amqp://test")
+
+    await publisher.publish_fanout([{"previous": 1}], "lines")
+    await publisher.publish_fanout([{"previous": 2}], "lines")
+
+    channel.declare_exchange.assert_awaited_once_with("lines", aio_pika.ExchangeType.FANOUT, durable=True)
+    assert exchange.publish.await_count == 2
+    channel.default_exchange.publish.assert_not_awaited()
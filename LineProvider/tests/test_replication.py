@@ -0,0 +1,94 @@
+import httpx
+import pytest
+from app.lines.data import EventRepository
+from app.lines.models import EventChanges, EventState
+from app.lines.replication import Replicator
+from app.lines.store import CompactEventStore
+from helpers import dump, make_event
+
+
+def primary_client(primary: EventRepository) -> httpx.AsyncClient:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        version, snapshot, events = await primary.get_changes(int(request.url.params["since"]))
+        changes = EventChanges.model_construct(
+            version=version, snapshot=snapshot, events=events, book_id=primary.book_id,
+        )
+        return httpx.Response(200, content=changes.model_dump_json())
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+@pytest.mark.asyncio
+async def test_follower_applies_primary_changes():
+    primary = EventRepository()
+    follower = EventRepository(store=CompactEventStore())
+    replicator = Replicator("http://primary/events/", follower)
+    await primary.create_event(make_event("event1", 200))
+    await primary.create_event(make_event("event2", 300))
+
+    async with primary_client(primary) as client:
+        assert await replicator.sync(client) == 2
+        await primary.update_event("event1", {"state": EventState.FINISHED_WIN, "deadline": 400})
+        assert replicator.lag_versions == 0
+        assert await replicator.sync(client) == 1
+        assert await replicator.sync(client) == 0
+
+    assert dump(follower) == dump(primary)
+    assert follower.version == primary.version == 3
+    assert [event.event_id for event in await follower.get_active_events(current_time=250)] == ["event2", "event1"]
+    assert replicator.status()["lag_versions"] == 0
+    assert replicator.lag_seconds is not None
+
+
+@pytest.mark.asyncio
+async def test_follower_reloads_when_primary_lost_its_book():
+    primary = EventRepository()
+    follower = EventRepository()
+    replicator = Replicator("http://primary/events/", follower)
+    await primary.create_event(make_event("event1", 200))
+    await primary.create_event(make_event("event2", 300))
+
+    async with primary_client(primary) as client:
+        await replicator.sync(client)
+        primary = EventRepository()
+        # The new book is already past the follower's version when it polls again.
+        for event_id in ("event3", "event4", "event5"):
+            await primary.create_event(make_event(event_id, 400))
+
+    async with primary_client(primary) as client:
+        await replicator.sync(client)
+
+    assert dump(follower) == dump(primary)
+    assert follower.book_id == primary.book_id
+
+
+@pytest.mark.asyncio
+async def test_follower_drops_events_missing_from_a_snapshot():
+    primary = EventRepository()
+    follower = EventRepository(store=CompactEventStore())
+    replicator = Replicator("http://primary/events/", follower)
+    await primary.create_event(make_event("event1", 200))
+    await primary.create_event(make_event("event2", 300))
+
+    async with primary_client(primary) as client:
+        await replicator.sync(client)
+        primary.evict([("event1", 1)])
+        await primary.create_event(make_event("event3", 400))
+        # The change log no longer reaches back to the follower: it gets a snapshot.
+        primary.change_log.clear()
+        await replicator.sync(client)
+
+    assert sorted(follower.events) == ["event2", "event3"]
+    assert dump(follower) == dump(primary)
+    assert [event.event_id for event in await follower.get_active_events(current_time=100)] == ["event2", "event3"]
+
+
+@pytest.mark.asyncio
+async def test_follower_rejects_writes(test_client):
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr("app.lines.services.replicator", Replicator("http://primary/events/", EventRepository()))
+        response = test_client.post("/events/", json={"coefficient": 1.5, "deadline": 9999999999, "state": 1})
+        assert response.status_code == 403
+        assert test_client.get("/events/replication").json()["role"] == "follower"
+
+    assert test_client.get("/events/replication").json()["role"] == "primary"
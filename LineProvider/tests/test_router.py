@@ -1,5 +1,6 @@
 import pytest
 import time
+from unittest.mock import AsyncMock, patch
 from fastapi.testclient import TestClient
 from app.lines.models import EventState
 
@@ -62,6 +63,35 @@ async def test_update_event_success(test_client: TestClient):
     assert data["state"] == update_payload["state"]
 
 
+@pytest.mark.asyncio
+async def test_update_event_if_match(test_client: TestClient):
+    payload = {"coefficient": 1.5, "deadline": int(time.time()) + 3600, "state": EventState.NEW.value}
+    event_id = test_client.post("/events/", json=payload).json()["event_id"]
+    etag = test_client.get(f"/events/{event_id}").headers["ETag"]
+
+    response = test_client.put(f"/events/{event_id}", json={"coefficient": 1.7}, headers={"If-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == f'"{response.json()["version"]}"'
+
+    response = test_client.put(f"/events/{event_id}", json={"coefficient": 1.9}, headers={"If-Match": etag})
+    assert response.status_code == 412
+    assert test_client.get(f"/events/{event_id}").json()["coefficient"] == 1.7
+
+    response = test_client.put(f"/events/{event_id}", json={"coefficient": 1.9}, headers={"If-Match": "latest"})
+    assert response.status_code == 400
+
+    version = test_client.get(f"/events/{event_id}").json()["version"]
+    response = test_client.put(f"/events/{event_id}", json={"coefficient": 1.8}, headers={"If-Match": f'W/"{version}"'})
+    assert response.status_code == 200
+
+    response = test_client.put(f"/events/{event_id}", json={"coefficient": 1.9}, headers={"If-Match": "*"})
+    assert response.status_code == 200
+
+    response = test_client.patch("/events/batch", json=[{"event_id": event_id, "coefficient": 1.9, "version": 1}])
+    assert response.status_code == 400
+    assert "not 1" in response.json()["detail"][0]["error"]
+
+
 @pytest.mark.asyncio
 async def test_update_event_invalid_id(test_client: TestClient):
     update_payload = {"state": EventState.FINISHED_WIN.value}
@@ -87,6 +117,17 @@ async def test_get_event_success(test_client: TestClient):
     assert data["coefficient"] == payload["coefficient"]
 
 
+@pytest.mark.asyncio
+async def test_lookup_events(test_client: TestClient):
+    payload = {"coefficient": 1.5, "deadline": int(time.time()) + 3600, "state": EventState.NEW.value}
+    event_ids = [test_client.post("/events/", json=payload).json()["event_id"] for _ in range(2)]
+
+    response = test_client.post("/events/lookup", json=[event_ids[1], "unknown", event_ids[0], event_ids[1]])
+    assert response.status_code == 200
+    assert [event["event_id"] for event in response.json()] == [event_ids[1], event_ids[0]]
+    assert test_client.post("/events/lookup", json=[]).status_code == 422
+
+
 @pytest.mark.asyncio
 async def test_get_event_not_found(test_client: TestClient):
     response = test_client.get("/events/nonexistent_id")
@@ -98,7 +139,7 @@ async def test_get_event_not_found(test_client: TestClient):
 async def test_get_active_events(test_client: TestClient):
     current_time = int(time.time())
     from app.lines.services import repository
-    repository.events.clear()
+    repository.reset()
     payload1 = {
         "coefficient": 1.5,
         "deadline": current_time + 3600,
@@ -118,3 +159,245 @@ async def test_get_active_events(test_client: TestClient):
     assert len(data) == 2
     assert data[0]["coefficient"] == payload1["coefficient"]
     assert data[1]["coefficient"] == payload2["coefficient"]
+
+
+@pytest.mark.asyncio
+async def test_get_active_events_paginated(test_client: TestClient):
+    current_time = int(time.time())
+    from app.lines.services import repository
+    repository.reset()
+    for offset in range(5):
+        payload = {
+            "coefficient": 1.5 + offset,
+            "deadline": current_time + 3600 * (offset + 1),
+            "state": EventState.NEW.value,
+        }
+        test_client.post("/events/", json=payload)
+
+    coefficients = []
+    cursor = None
+    while True:
+        params = {"limit": 2, "max_coefficient": 5}
+        if cursor:
+            params["cursor"] = cursor
+        response = test_client.get("/events/", params=params)
+        assert response.status_code == 200
+        coefficients += [event["coefficient"] for event in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert coefficients == [1.5, 2.5, 3.5, 4.5]
+
+
+@pytest.mark.asyncio
+async def test_get_active_events_invalid_cursor(test_client: TestClient):
+    response = test_client.get("/events/", params={"cursor": "not a cursor"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_get_active_events_by_state(test_client: TestClient):
+    current_time = int(time.time())
+    from app.lines.services import repository
+    repository.reset()
+    event_ids = []
+    for offset in range(3):
+        payload = {"coefficient": 1.5, "deadline": current_time + 3600 * (offset + 1), "state": EventState.NEW.value}
+        event_ids.append(test_client.post("/events/", json=payload).json()["event_id"])
+    test_client.put(f"/events/{event_ids[1]}", json={"state": EventState.FINISHED_WIN.value})
+
+    response = test_client.get("/events/", params={"state": EventState.NEW.value})
+    assert response.status_code == 200
+    assert [event["event_id"] for event in response.json()] == [event_ids[0], event_ids[2]]
+
+    response = test_client.get("/events/", params={"state": 99})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_get_events_by_finish_time(test_client: TestClient):
+    current_time = int(time.time())
+    from app.lines.services import repository
+    repository.reset()
+    event_ids = []
+    for offset in range(3):
+        payload = {"coefficient": 1.5, "deadline": current_time + 3600 * (offset + 1), "state": EventState.NEW.value}
+        event_ids.append(test_client.post("/events/", json=payload).json()["event_id"])
+    test_client.put(f"/events/{event_ids[1]}", json={"state": EventState.FINISHED_WIN.value})
+
+    response = test_client.get("/events/", params={"finished_from": current_time - 60})
+    assert response.status_code == 200
+    data = response.json()
+    assert [event["event_id"] for event in data] == [event_ids[1]]
+    assert data[0]["finished_at"] >= current_time
+
+    response = test_client.get("/events/", params={"finished_from": current_time, "deadline_to": current_time})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_get_event_changes_since_version(test_client: TestClient):
+    payload = {
+        "coefficient": 1.5,
+        "deadline": int(time.time()) + 3600,
+        "state": EventState.NEW.value,
+    }
+    first = test_client.post("/events/", json=payload).json()
+    version = test_client.get(f"/events/?since={first['version']}").json()["version"]
+    assert version == first["version"]
+
+    second = test_client.post("/events/", json=payload).json()
+    test_client.put(f"/events/{first['event_id']}", json={"coefficient": 1.9})
+
+    response = test_client.get(f"/events/?since={version}")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["snapshot"] is False
+    assert data["version"] == version + 2
+    assert [event["event_id"] for event in data["events"]] == [second["event_id"], first["event_id"]]
+    assert data["events"][1]["coefficient"] == 1.9
+
+    response = test_client.get(f"/events/?since={data['version']}")
+    assert response.json()["events"] == []
+
+
+@pytest.mark.asyncio
+async def test_get_event_changes_negative_since(test_client: TestClient):
+    response = test_client.get("/events/?since=-1")
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_events_websocket_sends_changes_since_version(test_client: TestClient):
+    payload = {
+        "coefficient": 1.5,
+        "deadline": int(time.time()) + 3600,
+        "state": EventState.NEW.value,
+    }
+    event = test_client.post("/events/", json=payload).json()
+
+    with test_client.websocket_connect(f"/events/ws?since={event['version'] - 1}") as websocket:
+        data = websocket.receive_json()
+
+    assert data["event_id"] == event["event_id"]
+    assert data["version"] == event["version"]
+
+
+@pytest.mark.asyncio
+async def test_create_events_batch(test_client: TestClient):
+    deadline = int(time.time()) + 3600
+    payload = [
+        {"coefficient": 1.5, "deadline": deadline, "state": EventState.NEW.value},
+        {"coefficient": 2.5, "deadline": deadline, "state": EventState.NEW.value},
+    ]
+    response = test_client.post("/events/batch", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert [event["coefficient"] for event in data] == [1.5, 2.5]
+    assert data[0]["event_id"] != data[1]["event_id"]
+
+
+@pytest.mark.asyncio
+async def test_create_events_batch_invalid_item(test_client: TestClient):
+    deadline = int(time.time()) + 3600
+    payload = [
+        {"coefficient": 1.5, "deadline": deadline, "state": EventState.NEW.value},
+        {"coefficient": -1.0, "deadline": deadline, "state": EventState.NEW.value},
+    ]
+    response = test_client.post("/events/batch", json=payload)
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", 1, "coefficient"]
+
+    assert test_client.post("/events/batch", json=[]).status_code == 422
+
+
+@pytest.mark.asyncio
+@patch("app.lines.services.outbox.put_state_changes", new_callable=AsyncMock)
+async def test_update_events_batch(mock_put_state_changes, test_client: TestClient):
+    deadline = int(time.time()) + 3600
+    created = test_client.post("/events/batch", json=[
+        {"coefficient": 1.5, "deadline": deadline, "state": EventState.NEW.value},
+        {"coefficient": 2.5, "deadline": deadline, "state": EventState.NEW.value},
+    ]).json()
+
+    response = test_client.patch("/events/batch", json=[
+        {"event_id": created[0]["event_id"], "state": EventState.FINISHED_WIN.value},
+        {"event_id": created[1]["event_id"], "coefficient": 3.0},
+    ])
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data[0]["state"] == EventState.FINISHED_WIN.value
+    assert data[1]["coefficient"] == 3.0
+    mock_put_state_changes.assert_awaited_once_with([(created[0]["event_id"], EventState.FINISHED_WIN)])
+
+
+@pytest.mark.asyncio
+@patch("app.lines.services.outbox.put_state_changes", new_callable=AsyncMock)
+async def test_update_events_batch_is_atomic(mock_put_state_changes, test_client: TestClient):
+    deadline = int(time.time()) + 3600
+    created = test_client.post("/events/", json={
+        "coefficient": 1.5, "deadline": deadline, "state": EventState.NEW.value,
+    }).json()
+
+    response = test_client.patch("/events/batch", json=[
+        {"event_id": created["event_id"], "coefficient": 3.0},
+        {"event_id": "nonexistent_id", "coefficient": 3.0},
+        {"event_id": created["event_id"], "deadline": deadline - 10},
+    ])
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == [
+        {"index": 1, "event_id": "nonexistent_id", "error": "Event not found"},
+        {"index": 2, "event_id": created["event_id"], "error": "Duplicate event_id in batch"},
+    ]
+    assert test_client.get(f"/events/{created['event_id']}").json()["coefficient"] == 1.5
+    mock_put_state_changes.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_get_active_events_etag(test_client: TestClient):
+    payload = {
+        "coefficient": 1.5,
+        "deadline": int(time.time()) + 3600,
+        "state": EventState.NEW.value,
+    }
+    test_client.post("/events/", json=payload)
+
+    response = test_client.get("/events/", headers={"Accept-Encoding": "identity"})
+    etag = response.headers["ETag"]
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+
+    response = test_client.get("/events/", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+    weak_etags = f'"other", W/{etag}'
+    response = test_client.get("/events/", headers={"Accept-Encoding": "identity", "If-None-Match": weak_etags})
+    assert response.status_code == 304
+
+    test_client.post("/events/", json=payload)
+    response = test_client.get("/events/", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_get_active_events_gzip(test_client: TestClient):
+    payload = {
+        "coefficient": 1.5,
+        "deadline": int(time.time()) + 3600,
+        "state": EventState.NEW.value,
+    }
+    for _ in range(20):
+        test_client.post("/events/", json=payload)
+
+    plain = test_client.get("/events/", headers={"Accept-Encoding": "identity"})
+    compressed = test_client.get("/events/", headers={"Accept-Encoding": "gzip"})
+
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert compressed.json() == plain.json()
+    assert compressed.headers["ETag"] != plain.headers["ETag"]
@@ -0,0 +1,71 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from app.lines.data import EventRepository
+from app.lines.models import EventState
+from app.lines.scheduler import DeadlineScheduler
+from app.lines.store import CompactEventStore
+from helpers import make_event
+
+
+def closing(repository: EventRepository):
+    async def close_events(event_ids):
+        return [await repository.update_event(event_id, {"state": EventState.CLOSED}) for event_id in event_ids]
+
+    return close_events
+
+
+@pytest.mark.asyncio
+async def test_scheduler_closes_open_events_once_their_deadline_passed():
+    repository = EventRepository(store=CompactEventStore())
+    for event_id, deadline in [("early", 100), ("finished", 150), ("late", 300)]:
+        await repository.create_event(make_event(event_id, deadline))
+    await repository.update_event("finished", {"state": EventState.FINISHED_WIN})
+    scheduler = DeadlineScheduler(repository, closing(repository), batch_size=1)
+
+    assert await scheduler.close_due_events(250) == 1
+    assert repository.events["early"].state == EventState.CLOSED
+    assert repository.events["finished"].state == EventState.FINISHED_WIN
+    assert repository.events["late"].state == EventState.NEW
+    assert scheduler.next_deadline(250) == 300
+
+    assert await scheduler.close_due_events(260) == 0
+    assert await scheduler.close_due_events(300) == 1
+    assert repository.events["late"].state == EventState.CLOSED
+    assert scheduler.next_deadline(300) is None
+
+
+@pytest.mark.asyncio
+async def test_scheduler_wakes_up_for_new_deadlines():
+    repository = EventRepository()
+    scheduler = DeadlineScheduler(repository, closing(repository))
+    repository.subscribe(scheduler.notify)
+    task = asyncio.create_task(scheduler.run())
+    try:
+        await asyncio.sleep(0.01)
+        await repository.create_event(make_event("event1", int(time.time()) + 1))
+        for _ in range(300):
+            if repository.events["event1"].state == EventState.CLOSED:
+                break
+            await asyncio.sleep(0.01)
+        assert repository.events["event1"].state == EventState.CLOSED
+    finally:
+        task.cancel()
+
+
+@pytest.mark.asyncio
+@patch("app.lines.services.outbox.put_state_changes", new_callable=AsyncMock)
+async def test_close_events_announces_closures(mock_put_state_changes):
+    from app.lines.services import close_events, repository
+
+    event = make_event("expired-event", int(time.time()) - 1)
+    await repository.create_event(event)
+    closed = await close_events(["expired-event", "missing-event"])
+
+    assert [event.event_id for event in closed] == ["expired-event"]
+    assert (await repository.get_event("expired-event")).state == EventState.CLOSED
+    mock_put_state_changes.assert_awaited_once_with(
+        [("expired-event", EventState.CLOSED)], routing_key="events.closed",
+    )
@@ -0,0 +1,23 @@
+import json
+from unittest.mock import patch
+
+from app.lines import serialization
+from app.lines.models import Event, EventState
+from app.lines.serialization import dumps, events_adapter, loads
+
+
+def test_events_adapter_matches_model_json():
+    events = [Event.model_construct(event_id="event1", coefficient=1.5, deadline=100, state=EventState.NEW, version=3)]
+
+    assert json.loads(events_adapter.dump_json(events)) == [json.loads(events[0].model_dump_json())]
+
+
+def test_dumps_loads_round_trip():
+    body = {"event_id": "event1", "status": 2}
+
+    with patch.object(serialization, "FAST_JSON", False):
+        assert loads(dumps(body)) == body
+    if serialization.orjson is not None:
+        with patch.object(serialization, "FAST_JSON", True):
+            assert loads(dumps(body)) == body
+            assert json.loads(dumps(body)) == body
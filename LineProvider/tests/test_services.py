@@ -3,6 +3,7 @@ import asyncio
 import pytest
 import pydantic
 import time
+from unittest.mock import AsyncMock, patch
 from app.lines.services import (
     create_event,
     process_event,
@@ -10,6 +11,8 @@ from app.lines.services import (
     get_event,
     get_active_events,
 )
+from app.lines.data import VersionConflict
+from app.lines.locks import KeyedLocks
 from app.lines.models import CreateEvent, UpdateEvent, EventState
 
 
@@ -145,7 +148,7 @@ async def test_get_event_not_found():
 async def test_get_active_events():
     current_time = int(time.time())
     from app.lines.services import repository
-    repository.events.clear()
+    repository.reset()
 
     await create_event(
         CreateEvent(
@@ -164,3 +167,107 @@ async def test_get_active_events():
 
     active_events = await get_active_events()
     assert len(active_events) == 2
+
+
+@pytest.mark.asyncio
+@patch("app.lines.services.outbox.put_state_changes", new_callable=AsyncMock)
+async def test_process_event_applies_update_before_notification(mock_put_state_changes):
+    from app.lines.services import repository
+    event = await create_event(
+        CreateEvent(
+            coefficient=1.5,
+            deadline=int(time.time()) + 3600,
+            state=EventState.NEW,
+        )
+    )
+
+    async def check_applied(statuses):
+        assert repository.events[event.event_id].state == EventState.FINISHED_LOSE
+
+    mock_put_state_changes.side_effect = check_applied
+    await process_event(event.event_id, UpdateEvent(state=EventState.FINISHED_LOSE))
+
+    mock_put_state_changes.assert_awaited_once_with([(event.event_id, EventState.FINISHED_LOSE)])
+
+
+@pytest.mark.asyncio
+@patch("app.lines.services.outbox.put_state_changes", new_callable=AsyncMock)
+async def test_only_finished_states_are_sent_to_events(mock_put_state_changes):
+    from app.lines.services import repository
+    event = await create_event(CreateEvent(coefficient=1.5, deadline=int(time.time()) + 3600, state=EventState.NEW))
+    await process_event(event.event_id, UpdateEvent(state=EventState.FINISHED_WIN))
+    await process_event(event.event_id, UpdateEvent(state=EventState.NEW))
+
+    mock_put_state_changes.assert_awaited_once_with([(event.event_id, EventState.FINISHED_WIN)])
+    with pytest.raises(pydantic.ValidationError):
+        UpdateEvent(state=EventState.CLOSED)
+
+    # Pushing the deadline of a closed event back into the future reopens it.
+    await repository.update_event(event.event_id, {"state": EventState.CLOSED})
+    reopened = await process_event(event.event_id, UpdateEvent(deadline=int(time.time()) + 7200))
+    assert reopened.state == EventState.NEW
+    assert event.event_id in {entry[1] for entry in repository.state_indexes[EventState.NEW.value]}
+
+
+@pytest.mark.asyncio
+async def test_process_event_compares_versions():
+    event = await create_event(
+        CreateEvent(
+            coefficient=1.5,
+            deadline=int(time.time()) + 3600,
+            state=EventState.NEW,
+        )
+    )
+
+    updated_event = await process_event(event.event_id, UpdateEvent(coefficient=1.7), expected_version=event.version)
+    with pytest.raises(VersionConflict) as e:
+        await process_event(event.event_id, UpdateEvent(coefficient=1.9), expected_version=event.version - 1)
+
+    assert e.value.version == updated_event.version
+    assert (await get_event(event.event_id)).coefficient == 1.7
+
+
+@pytest.mark.asyncio
+@patch("app.lines.services.outbox.put_state_changes", new_callable=AsyncMock)
+async def test_concurrent_updates_notify_in_version_order(mock_put_state_changes):
+    from app.lines.services import repository
+    event = await create_event(
+        CreateEvent(
+            coefficient=1.5,
+            deadline=int(time.time()) + 3600,
+            state=EventState.NEW,
+        )
+    )
+    notified = []
+
+    async def slow_first_notification(statuses):
+        if mock_put_state_changes.await_count == 1:
+            # The outbox is full: the first notification waits for room.
+            await asyncio.sleep(0.01)
+        notified.extend(status for _, status in statuses)
+
+    mock_put_state_changes.side_effect = slow_first_notification
+    await asyncio.gather(
+        process_event(event.event_id, UpdateEvent(state=EventState.FINISHED_WIN)),
+        process_event(event.event_id, UpdateEvent(state=EventState.FINISHED_LOSE)),
+    )
+
+    assert notified == [EventState.FINISHED_WIN, EventState.FINISHED_LOSE]
+    assert repository.events[event.event_id].state == EventState.FINISHED_LOSE
+
+
+@pytest.mark.asyncio
+async def test_keyed_locks_only_serialize_the_same_key():
+    locks = KeyedLocks()
+    order = []
+
+    async def hold(keys, name, delay):
+        async with locks.hold(keys):
+            order.append(f"{name} start")
+            await asyncio.sleep(delay)
+            order.append(f"{name} end")
+
+    await asyncio.gather(hold(["a"], "first", 0.02), hold(["b"], "other", 0), hold(["b", "a"], "both", 0))
+
+    assert order == ["first start", "other start", "other end", "first end", "both start", "both end"]
+    assert len(locks) == 0
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import multiprocessing
+from unittest.mock import patch
+
+import pytest
+from app.lines.data import EventRepository
+from app.lines.persistence import EventJournal
+from app.lines import shared
+from app.lines.shared import SharedEventBook
+from app.lines.store import CompactEventStore
+from helpers import dump, make_event
+
+
+def attach(directory, store=None):
+    repository = EventRepository(store=store)
+    book = SharedEventBook(EventJournal(str(directory)))
+    book.attach(repository)
+    return repository, book
+
+
+@pytest.mark.asyncio
+async def test_workers_share_writes(tmp_path):
+    first, first_book = attach(tmp_path)
+    second, second_book = attach(tmp_path, CompactEventStore())
+    received = []
+    second.subscribe(received.append)
+
+    with first_book.write():
+        await first.create_event(make_event("event1", 200))
+    second_book.catch_up()
+    assert dump(second) == dump(first)
+    assert [event.event_id for event in received] == ["event1"]
+
+    with second_book.write():
+        await second.update_event("event1", {"deadline": 300})
+    assert second.events["event1"].version == 2
+
+    first_book.catch_up()
+    assert dump(first) == dump(second)
+    assert first.version == 2
+    assert [event.deadline for event in await first.get_active_events(current_time=250)] == [300]
+
+
+@pytest.mark.asyncio
+async def test_worker_catches_up_after_missed_snapshots(tmp_path):
+    first, first_book = attach(tmp_path)
+    second, second_book = attach(tmp_path)
+
+    with first_book.write():
+        await first.create_event(make_event("event1", 200))
+    await first_book.snapshot(first)
+    with first_book.write():
+        await first.create_event(make_event("event2", 300))
+    # The segments holding event1 and event2 are gone before the second worker read them.
+    await first_book.snapshot(first)
+    with first_book.write():
+        await first.create_event(make_event("event3", 400))
+
+    second_book.catch_up()
+    assert dump(second) == dump(first)
+
+    third, _ = attach(tmp_path)
+    assert dump(third) == dump(first)
+
+
+@pytest.mark.asyncio
+async def test_reader_finishes_segment_written_to_while_moving_on(tmp_path):
+    first, first_book = attach(tmp_path)
+    second, second_book = attach(tmp_path)
+    with first_book.write():
+        await first.create_event(make_event("a", 200))
+
+    read, resume = threading.Event(), threading.Event()
+    decode_rows = shared.decode_rows
+
+    def decode_and_pause(data):
+        decoded = decode_rows(data)
+        if not read.is_set():
+            read.set()
+            resume.wait(5)
+        return decoded
+
+    with patch("app.lines.shared.decode_rows", decode_and_pause):
+        reader = asyncio.create_task(asyncio.to_thread(second_book.catch_up))
+        await asyncio.to_thread(read.wait, 5)
+        # The first worker appends to the segment the reader just read, then starts the next one
+        # the way a snapshot does.
+        with first_book.write():
+            await first.create_event(make_event("b", 300))
+        with first_book.write():
+            first_book._open_segment(first_book.segment + 1)
+            first_book.offset = 0
+        resume.set()
+        await reader
+
+    assert dump(second) == dump(first)
+
+
+def create_events(directory: str, worker: int, count: int) -> None:
+    async def run():
+        repository, book = attach(directory)
+        for i in range(count):
+            with book.write():
+                await repository.create_event(make_event(f"worker{worker}-{i}", 200 + i))
+        book.close()
+
+    asyncio.run(run())
+
+
+def test_concurrent_workers_produce_one_version_sequence(tmp_path):
+    attach(tmp_path)[1].close()
+    workers = [
+        multiprocessing.get_context("fork").Process(target=create_events, args=(str(tmp_path), worker, 200))
+        for worker in range(2)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    repository, _ = attach(tmp_path)
+    assert len(repository.events) == 400
+    assert sorted(event.version for event in repository.events.values()) == list(range(1, 401))
@@ -0,0 +1,59 @@
+import pytest
+from app.lines.data import EventRepository
+from app.lines.models import Event, EventState
+from app.lines.store import CompactEventStore, EventRecord
+from helpers import make_event
+
+
+def test_compact_store_materializes_events():
+    store = CompactEventStore()
+    store["event1"] = make_event("event1", 200)
+
+    event = store["event1"]
+    assert isinstance(event, Event)
+    assert event.model_dump() == {
+        "event_id": "event1",
+        "coefficient": 1.5,
+        "deadline": 200,
+        "state": EventState.NEW,
+        "version": 0,
+        "finished_at": None,
+    }
+    assert isinstance(store.row("event1"), EventRecord)
+    assert "event1" in store
+    assert list(store) == ["event1"]
+
+
+def test_compact_store_updates_record_in_place():
+    store = CompactEventStore()
+    store["event1"] = make_event("event1", 200)
+    record = store.row("event1")
+
+    event = store["event1"]
+    event.state = EventState.FINISHED_WIN
+    event.deadline = 300
+    store["event1"] = event
+
+    assert store.row("event1") is record
+    assert (record.state, record.deadline) == (EventState.FINISHED_WIN.value, 300)
+    assert store["event1"].state == EventState.FINISHED_WIN
+
+
+@pytest.mark.asyncio
+async def test_repository_with_compact_store():
+    repository = EventRepository(store=CompactEventStore())
+    await repository.create_event(make_event("event1", 50))
+    await repository.create_event(make_event("event2", 200))
+
+    updated = await repository.update_event("event1", {"deadline": 300, "state": EventState.FINISHED_LOSE})
+    assert updated.version == 3
+
+    active_events = await repository.get_active_events(current_time=100)
+    assert [(event.event_id, event.state) for event in active_events] == [
+        ("event2", EventState.NEW),
+        ("event1", EventState.FINISHED_LOSE),
+    ]
+    assert (await repository.get_event("event1")).deadline == 300
+
+    version, snapshot, events = await repository.get_changes(since=2)
+    assert (version, snapshot, [event.event_id for event in events]) == (3, False, ["event1"])